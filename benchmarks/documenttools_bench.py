@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmark the text extraction backends of documenttools for throughput and peak memory.
+
+Each backend runs in its own process so the peak RSS is not shared between them.
+With --memory-check N each backend reads synthetic PDFs of N and 4 * N pages, the
+peak RSS must not grow by more than MAX_GROWTH_MB (the exit status is 1 otherwise).
+
+Usage: python benchmarks/documenttools_bench.py [pdf_or_dir ...] [--repeat N] [--memory-check N]
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+import multiprocessing
+
+# Add path to the directory containing wit_pytools
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from wit_pytools.documenttools import document_iter_pages
+from wit_pytools.tests.pdffixtures import write_text_pdf
+
+BACKENDS = ('pdfplumber', 'pypdf', 'pdfminer')
+DEFAULT_PDFS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'documenttools')
+MAX_GROWTH_MB = 8
+
+def collect_pdfs(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            for root, _, files in os.walk(arg):
+                paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith('.pdf'))
+        else:
+            paths.append(arg)
+    return paths
+
+def run_backend(backend, paths, repeat, queue):
+    pages = chars = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            for _, text in document_iter_pages(path, backend):
+                pages += 1
+                chars += len(text)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != 'darwin' else 1024 * 1024)
+    queue.put((pages, chars, elapsed, peak))
+
+def measure(backend, paths, repeat):
+    """Run one backend in a fresh process, returns (pages, chars, seconds, peak RSS in MB)."""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=run_backend, args=(backend, paths, repeat, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def memory_check(pages):
+    """Compare the peak RSS of each backend on synthetic PDFs of pages and 4 * pages pages."""
+    line = "Zeile {} " + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 2
+    text = "\n".join(line.format(i) for i in range(50))
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = (pages, 4 * pages)
+        paths = [os.path.join(tmp, f'{count}.pdf') for count in sizes]
+        for count, path in zip(sizes, paths):
+            write_text_pdf(path, [text] * count)
+        for backend in BACKENDS:
+            small, large = (measure(backend, [path], 1)[3] for path in paths)
+            growth = large - small
+            ok &= growth <= MAX_GROWTH_MB
+            print(f"{backend:>10}: peak RSS {small:6.1f} MB for {sizes[0]} pages, {large:6.1f} MB for {sizes[1]} pages"
+                  f" ({growth:+.1f} MB){'' if growth <= MAX_GROWTH_MB else '  GROWS WITH PAGE COUNT'}")
+    return ok
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 10
+    if '--repeat' in args:
+        i = args.index('--repeat')
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    if '--memory-check' in args:
+        i = args.index('--memory-check')
+        sys.exit(0 if memory_check(int(args[i + 1])) else 1)
+    paths = collect_pdfs(args or [DEFAULT_PDFS])
+    print(f"{len(paths)} PDFs, {repeat} repetitions")
+    baseline = None
+    for backend in BACKENDS:
+        pages, chars, elapsed, peak = measure(backend, paths, repeat)
+        baseline = baseline or elapsed
+        print(f"{backend:>10}: {pages / elapsed:8.1f} pages/s, {chars:9d} chars, "
+              f"peak RSS {peak:6.1f} MB, {baseline / elapsed:5.1f}x vs pdfplumber")
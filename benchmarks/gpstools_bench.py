@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Benchmark the scalar haversine loop against the vectorised batch distance API,
+and gps_cluster on clustered and uniformly spread points.
+
+Usage: python benchmarks/gpstools_bench.py [photos] [locations] [cluster_points]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add path to the directory containing wit_pytools
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from wit_pytools.gpstools import gps_distance, gps_distance_many, nearest_within, gps_cluster
+
+def random_points(rng, count):
+    # Points spread over Germany
+    return np.column_stack((rng.uniform(47.5, 54.5, count), rng.uniform(6.0, 15.0, count)))
+
+def clustered_points(rng, count, clusters=300):
+    # Photo hotspots with a spread of about a kilometer, a quarter of the points spread evenly
+    centres = random_points(rng, clusters)
+    per_cluster = 3 * count // (4 * clusters)
+    spots = [rng.normal(c, 0.01, (per_cluster, 2)) for c in centres]
+    return np.vstack(spots + [random_points(rng, count - clusters * per_cluster)])
+
+def scalar_nearest_within(points, centers, radii):
+    """Nested loop as done per image in bowldir_gps."""
+    result = []
+    for point in points:
+        best, best_dist = -1, float('inf')
+        for index, center in enumerate(centers):
+            dist = gps_distance(point, center)
+            if dist < radii[index] and dist < best_dist:
+                best, best_dist = index, dist
+        result.append(best)
+    return np.array(result)
+
+if __name__ == "__main__":
+    photos = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    locations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = np.random.default_rng(42)
+    points = random_points(rng, photos)
+    centers = random_points(rng, locations)
+    radii = rng.uniform(1.0, 20.0, locations)
+    point_list = [tuple(p) for p in points]
+    center_list = [tuple(c) for c in centers]
+
+    start = time.perf_counter()
+    expected = scalar_nearest_within(point_list, center_list, radii.tolist())
+    scalar = time.perf_counter() - start
+    print(f"{'scalar gps_distance loop':>26}: {scalar:8.3f} s")
+
+    start = time.perf_counter()
+    gps_distance_many(points, centers)
+    matrix = time.perf_counter() - start
+    print(f"{'gps_distance_many':>26}: {matrix:8.3f} s  ({scalar / matrix:.0f}x)")
+
+    start = time.perf_counter()
+    result = nearest_within(points, centers, radii)
+    nearest = time.perf_counter() - start
+    print(f"{'nearest_within':>26}: {nearest:8.3f} s  ({scalar / nearest:.0f}x)")
+    print(f"results identical: {bool(np.array_equal(result, expected))}")
+
+    cluster_points = int(sys.argv[3]) if len(sys.argv) > 3 else 1000000
+    for name, cloud in (('clustered', clustered_points(rng, cluster_points)), ('uniform', random_points(rng, cluster_points))):
+        start = time.perf_counter()
+        labels = gps_cluster(cloud, eps_km=0.5, min_samples=5)
+        elapsed = time.perf_counter() - start
+        print(f"{'gps_cluster ' + name:>26}: {elapsed:8.3f} s  ({labels.max() + 1} clusters, {(labels < 0).sum()} noise)")
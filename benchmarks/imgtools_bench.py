@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Benchmark draft-mode thumbnails against a full decode plus thumbnail().
+
+Usage: python benchmarks/imgtools_bench.py [count]
+"""
+import os
+import sys
+import tempfile
+import time
+import shutil
+
+from PIL import Image
+
+# Add path to the directory containing wit_pytools
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from wit_pytools.imgtools import img_thumbnail, img_resize_batch
+
+SIZE = (320, 320)
+
+def make_photo(path, size=(6000, 4000)):
+    """Create a 24MP JPEG with some structure so it does not compress to nothing."""
+    img = Image.radial_gradient('L').resize(size).convert('RGB')
+    img.save(path, 'JPEG', quality=90)
+
+def full_decode_thumbnail(input_path, output_path):
+    with Image.open(input_path) as img:
+        img.load()
+        img.thumbnail(SIZE, Image.LANCZOS)
+        img.save(output_path, 'JPEG', quality=85)
+
+def bench(label, func, paths, outdir):
+    start = time.perf_counter()
+    for path in paths:
+        func(path, os.path.join(outdir, os.path.basename(path)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>24}: {elapsed:7.3f} s total, {elapsed / len(paths) * 1000:8.1f} ms/image")
+    return elapsed
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    tmpdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tmpdir, 'photo_0.jpg')
+        make_photo(source)
+        paths = [source]
+        for i in range(1, count):
+            paths.append(os.path.join(tmpdir, f'photo_{i}.jpg'))
+            shutil.copy2(source, paths[-1])
+        outdirs = [os.path.join(tmpdir, name) for name in ('full', 'draft', 'batch')]
+        for outdir in outdirs:
+            os.makedirs(outdir)
+
+        full = bench('full decode + thumbnail', full_decode_thumbnail, paths, outdirs[0])
+        draft = bench('img_thumbnail (draft)', lambda i, o: img_thumbnail(i, o, SIZE, overwrite=True), paths, outdirs[1])
+        start = time.perf_counter()
+        img_resize_batch(paths, outdirs[2], SIZE)
+        batch = time.perf_counter() - start
+        print(f"{'img_resize_batch (pool)':>24}: {batch:7.3f} s total, {batch / len(paths) * 1000:8.1f} ms/image")
+        start = time.perf_counter()
+        img_resize_batch(paths, outdirs[2], SIZE)
+        print(f"{'up-to-date rerun':>24}: {time.perf_counter() - start:7.3f} s total")
+        print(f"draft speedup: {full / draft:.1f}x, pool speedup: {full / batch:.1f}x")
+    finally:
+        shutil.rmtree(tmpdir)
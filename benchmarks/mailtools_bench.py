@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Benchmark header-only against full mail parsing in mailtools.parse_msg and parse_eml.
+
+Without arguments a set of synthetic MSG and EML files with large attachments is generated.
+
+Usage: python benchmarks/mailtools_bench.py [mail_or_dir ...] [--repeat N]
+"""
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+# Add path to the directory containing wit_pytools
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from wit_pytools.mailtools import parse_eml, parse_msg
+from wit_pytools.tests.mailfixtures import write_eml, write_msg
+
+PARSERS = {'.msg': parse_msg, '.eml': parse_eml}
+
+def collect_mails(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            for root, _, files in os.walk(arg):
+                paths.extend(os.path.join(root, f) for f in sorted(files) if os.path.splitext(f)[1].lower() in PARSERS)
+        else:
+            paths.append(arg)
+    return paths
+
+def synthetic_mails(directory, count=20, attachment_size=4 * 1024 * 1024):
+    paths = []
+    for i in range(count):
+        subject = f"WG: Angebot {i}" if i % 5 == 0 else f"Angebot {i}"
+        body = f"Anbei das Angebot.\r\n\r\nVon: Kunde <kunde{i}@example.org>\r\n" + "Text\r\n" * 20000
+        paths.append(str(write_msg(os.path.join(directory, f"mail{i:03d}.msg"), subject, f"sender{i}@example.com",
+                                    body=body, attachment=os.urandom(attachment_size))))
+        paths.append(str(write_eml(Path(directory) / f"mail{i:03d}.eml", [f"From: Sender <sender{i}@example.com>",
+                                    f"Subject: {subject}", "Date: Tue, 25 May 2021 10:30:00 +0200"],
+                                    attachment_size=attachment_size)))
+    return paths
+
+def run(paths, repeat, headers_only):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [PARSERS[os.path.splitext(path)[1].lower()](path, True, headers_only=headers_only)
+                   for path in paths]
+    return time.perf_counter() - start, results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 3
+    if '--repeat' in args:
+        i = args.index('--repeat')
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = collect_mails(args) if args else synthetic_mails(tmpdir)
+        print(f"{len(paths)} mails, {repeat} repetitions")
+        full, full_results = run(paths, repeat, headers_only=False)
+        fast, fast_results = run(paths, repeat, headers_only=True)
+        mismatches = sum(a != b for a, b in zip(full_results, fast_results))
+        print(f"      full: {len(paths) * repeat / full:8.1f} mails/s")
+        print(f"   headers: {len(paths) * repeat / fast:8.1f} mails/s, {full / fast:5.1f}x, {mismatches} mismatches")
@@ -1,14 +1,15 @@
 import os
+import shutil
 import sys
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 from configparser import ConfigParser
 from pathlib import Path
 from wit_pytools.witpytools import dryprint
 from wit_pytools.sanitizers import prepregex, cleanfilestring, convert_numerals_arabic_western, normalize_spaces
 from wit_pytools.validators import valid_email_address
 from wit_pytools.systools import walklevel, rmemptydir, movefile, copyfile, delfile
-from wit_pytools.documenttools import document_find_regex
+from wit_pytools.documenttools import document_first_match, document_metadata_match, TEXT_SUFFIXES
 from eliot import log_message
 import gettext
 
@@ -86,7 +87,10 @@ def bowllist_gps(config_object=''):
             bowl_path = bowl.split(';')[0] if ';' in bowl else bowl
             bowls.append(bowl_path)
         print(f"GPS Bowls found: {bowls}")
-        return bool(bowls)  # Return True only if we found actual bowls
+        if bowls:
+            return True  # Return True only if we found actual bowls
+    if config_object and len(config_object) > 0 and config_object.has_section("BOWLS_GPS_POLYGONS"):
+        return len(config_object.items("BOWLS_GPS_POLYGONS", raw=True)) > 0
     return False
 
 # list all email bowls
@@ -99,7 +103,7 @@ def bowllist_email(config_object=''):
     return bowls
 
 # check if file matches a criteria for a bowl and return the corresponding bowl
-def bowldir(file, config_object='', file_path=None, check_content=False):
+def bowldir(file, config_object='', file_path=None, check_content=False, check_metadata=False):
     if not (config_object and len(config_object) > 0 and config_object.has_section("BOWLS")):
         return ''
 
@@ -117,23 +121,39 @@ def bowldir(file, config_object='', file_path=None, check_content=False):
             if crit and crit in file:
                 return '/' + bowl
 
-    # Second pass: optional content search when filename did not match
-    if check_content and file_path:
+    # Second pass: optional metadata and content search when filename did not match
+    if (check_content or check_metadata) and file_path:
         file_path_obj = Path(file_path)
-        if file_path_obj.suffix.lower() == '.pdf':
+        suffix = file_path_obj.suffix.lower()
+        if suffix == '.pdf' or (check_content and suffix in TEXT_SUFFIXES):
+            # Search all criteria in one pass, earlier bowls take precedence
+            crits, crit_bowls = [], []
             for (bowl, critlist) in bowls:
                 if "!DEFAULT" in critlist:
                     continue
                 for crit in critlist.split(','):
                     crit = crit.strip()
-                    if not crit:
-                        continue
-                    try:
-                        content_matches = document_find_regex(file_path_obj, crit)
-                    except RuntimeError:
-                        content_matches = []
-                    if content_matches:
-                        return '/' + bowl
+                    if crit:
+                        crits.append(crit)
+                        crit_bowls.append(bowl)
+            if crits and check_metadata and suffix == '.pdf':
+                # PDF Info/XMP metadata is read without touching any page
+                try:
+                    meta_match = document_metadata_match(file_path_obj, crits)
+                except Exception as e:
+                    log_message(f"Cannot read metadata of {file_path_obj}: {e}", level="WARNING")
+                    meta_match = None
+                if meta_match:
+                    return '/' + crit_bowls[meta_match['query']]
+            if crits and check_content:
+                backend = config_object.get('SETTINGS', 'content_backend', fallback='pdfplumber') if config_object.has_section('SETTINGS') else 'pdfplumber'
+                try:
+                    content_match = document_first_match(file_path_obj, crits, ordered=True, backend=backend.strip() or 'pdfplumber')
+                except Exception as e:
+                    log_message(f"Cannot search content of {file_path_obj}: {e}", level="WARNING")
+                    content_match = None
+                if content_match:
+                    return '/' + crit_bowls[content_match['query']]
 
     if default_bowl:
         return '/' + default_bowl
@@ -153,37 +173,23 @@ def bowllist_gps_tags(config_object=''):
     return False
 
 # check if file matches a criteria for an email bowl and return the corresponding bowl
-def bowldir_email(file, config_object=''):
+def bowldir_email(file, config_object='', sender=None):
     if config_object and len(config_object) > 0:
         if config_object.has_section("BOWLS_EMAIL"):
-            found = False
-            default_bowl = ''
-            malformed_bowl = ''
-            
-            # First pass: look for matches and find special bowls if they exist
-            for (bowl, critlist) in config_object.items("BOWLS_EMAIL"):
-                if "!DEFAULT" in critlist:
-                    default_bowl = bowl
-                    continue
-                if "!MALFORMED" in critlist:
-                    malformed_bowl = bowl
-                    continue
-                    
-                for crit in critlist.split(','):
-                    crit = crit.strip()
-                    if crit and crit in file and not found:
-                        return '/' + bowl
-            
-            # Check if file has a valid email address
-            has_valid_email = valid_email_address(file)
+            from wit_pytools.mailtools import mail_bowl_index
+            # Domain criteria are looked up by the sender domain, the rest are substring tests on file
+            index = mail_bowl_index(tuple(config_object.items("BOWLS_EMAIL", raw=True)))
+            bowl = index.match(file, sender)
+            if bowl:
+                return '/' + bowl
             
             # If no email found and we have a malformed bowl, use it
-            if not has_valid_email and malformed_bowl:
-                return '/' + malformed_bowl
+            if index.malformed and not valid_email_address(file):
+                return '/' + index.malformed
             
             # If no match was found but we have a default bowl, use it
-            if default_bowl and not found:
-                return '/' + default_bowl
+            if index.default:
+                return '/' + index.default
                 
             return ''
     return ''
@@ -296,6 +302,23 @@ def bowldir_gps(file, config_object='', image_coords=None):
             return ''
     return ''
 
+# check if the image coordinates lie within a polygon bowl and return the corresponding bowl
+def bowldir_gps_polygons(file, config_object='', image_coords=None):
+    from wit_pytools.gpstools import gps_polygon_index
+    if config_object and len(config_object) > 0 and image_coords and config_object.has_section("BOWLS_GPS_POLYGONS"):
+        if isinstance(image_coords, str):
+            try:
+                image_coords = tuple(map(float, image_coords.split(',')))
+            except ValueError:
+                log_message(f"Failed to parse image coordinates: {image_coords}", level="ERROR")
+                return ''
+        index = gps_polygon_index(tuple(config_object.items("BOWLS_GPS_POLYGONS", raw=True)))
+        bowl_name = index.name(image_coords)
+        log_message(f"bowldir_gps_polygons: {file} at {image_coords} -> {bowl_name}", level="DEBUG")
+        if bowl_name:
+            return '/' + bowl_name
+    return ''
+
 # check if file matches a criteria for a gps bowl and return the corresponding bowl
 def bowldir_gps_tags(file, config_object='', image_coords=None):
     from wit_pytools.gpstools import is_valid_gps, gps_distance
@@ -470,39 +493,67 @@ def prepsort(config_object, targetdir, prepfilter = False):
     # CHECK _unpack dir
     # CHECK SORT Lists for ,, and < 2
 
-def handle_emails(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite):
-    from wit_pytools.mailtools import parse_msg
+# build the date_sender_project_subject filename of a mail, None if the mail data is incomplete
+def mail_filename(maildata, project_name, suffix, clean, clean_nocase, replacements):
+    if not maildata or len(maildata) < 3:
+        return None
+    # Ensure all elements in maildata are strings to prevent NoneType concatenation errors
+    date, sender, subject = (value if value is not None else "" for value in maildata[:3])
+    # Strip leading date in YYYY-MM-DD format (and following whitespace) from subject if it exists
+    subject = re.sub(r'^(\d{4}-\d{2}-\d{2})\s*', '', subject).strip()
+    nfile = date+'_'+sender+'_'+project_name+'_'+subject+suffix
+    return cleanfilename(nfile, clean, clean_nocase, replacements)
+
+# look up a mail in the shared dedup index (SETTINGS: mail_dedup_index), returns (index, key, path of an earlier copy)
+# key is computed unless it is given (e.g. from the mail_keys of mail_prefetch)
+def mail_duplicate(mail_path, config_object, key=None):
+    if not config_object.has_section('SETTINGS'):
+        return None, None, None
+    index_path = config_object.get('SETTINGS', 'mail_dedup_index', fallback='').strip()
+    if not index_path:
+        return None, None, None
+    from wit_pytools.mailtools import mail_dedup_index, mail_dedup_key
+    try:
+        index = mail_dedup_index(index_path)
+        if key is None:
+            key = mail_dedup_key(mail_path)
+        return index, key, index.duplicate_of(key, mail_path)
+    except Exception as e:
+        log_message(f"Error checking {mail_path} for duplicates: {e}", level="ERROR")
+        return None, None, None
+
+def handle_emails(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, mails=None, mail_keys=None):
+    from wit_pytools.mailtools import parse_mail
     try:
         log_message(_('Handling MSG: {}').format(os.path.join(sourcedir, file)))
-        maildata = parse_msg(os.path.join(sourcedir, file.name), True)
+        mail_path = os.path.join(sourcedir, file.name)
+        # Skip or trash copies of mails that were sorted before (SETTINGS: mail_dedup_action = skip|trash)
+        index, key, duplicate = mail_duplicate(mail_path, config_object, key=(mail_keys or {}).get(mail_path))
+        if duplicate:
+            action = config_object.get('SETTINGS', 'mail_dedup_action', fallback='skip').strip().lower()
+            log_message(f"Duplicate of {duplicate}: {mail_path} ({action})", level="INFO")
+            if action == 'trash':
+                delfile(sourcedir, file.name, dryrun)
+            return
+        # Use the data parsed up front by mail_prefetch if available
+        maildata = (mails or {}).get(mail_path) or parse_mail(mail_path)
+        suffix = '.eml' if file.name.lower().endswith('.eml') else '.msg'
         
         # Extract project name from the last directory in targetdir
         project_name = os.path.basename(os.path.normpath(targetdir))
+        nfile = mail_filename(maildata, project_name, suffix, clean, clean_nocase, replacements)
         
-        if maildata and len(maildata) >= 3:
-            # Strip leading date in YYYY-MM-DD format from subject if it exists
-            subject = maildata[2] if maildata[2] is not None else ""
-            # Regular expression to match YYYY-MM-DD at the beginning of the string
-            # followed by optional whitespace
-            date_pattern = r'^(\d{4}-\d{2}-\d{2})\s*'
-            subject = re.sub(date_pattern, '', subject).strip()
-            maildata[2] = subject
-            
-            # Ensure all elements in maildata are strings to prevent NoneType concatenation errors
-            for i in range(len(maildata)):
-                if maildata[i] is None:
-                    maildata[i] = ""
-            
-            nfile = maildata[0]+'_'+maildata[1]+'_'+project_name+'_'+maildata[2]+'.msg'
-            nfile = cleanfilename(nfile, clean, clean_nocase, replacements)
-            bowl = bowldir_email(nfile, config_object)
-            movefile(sourcedir, file, targetdir + bowl, nfile, filemode)
+        if nfile:
+            bowl = bowldir_email(nfile, config_object, sender=maildata[1])
+            final_path = movefile(sourcedir, file, targetdir + bowl, nfile, filemode)
         else:
             #TODO check
             log_message("No mail information available or incomplete data.")
             nfile = cleanfilename(file.name, clean, clean_nocase, replacements)
             bowl = bowldir_email(nfile, config_object)
-            movefile(sourcedir, file, targetdir + bowl, nfile, filemode, dryrun=dryrun)
+            final_path = movefile(sourcedir, file, targetdir + bowl, nfile, filemode, dryrun=dryrun)
+        if index is not None and final_path:
+            index.add(key, final_path)
     except Exception as e:
         print(f"Error handling MSG file {file.name}: {e}")
         # Fallback to using the original filename
@@ -512,16 +563,183 @@ def handle_emails(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, c
             movefile(sourcedir, file, targetdir + bowl, nfile, filemode, dryrun=dryrun)
     return
 
-def handle_gps(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite):
+# return destdir/nfile, enumerated (base#2.ext) like movefile if it exists and overwrite is off
+def enumerated_path(destdir, nfile, overwrite=False):
+    target_path = os.path.join(destdir, nfile)
+    if overwrite or not os.path.exists(target_path):
+        return target_path
+    base, ext = os.path.splitext(target_path)
+    i = 2
+    while os.path.exists(f"{base}#{i}{ext}"):
+        i += 1
+    return f"{base}#{i}{ext}"
+
+# stream the messages of an mbox file or Maildir directory into their email bowls as EML files,
+# then move the mailbox out of sourcedir so it is not extracted again (SETTINGS: mailbox_done_dir)
+def handle_mailbox(mailbox_path, targetdir, clean, clean_nocase, config_object, replacements, dryrun, overwrite):
+    from wit_pytools.mailtools import iter_mailbox
+    log_message(f"Handling mailbox: {mailbox_path}", level="INFO")
+    project_name = os.path.basename(os.path.normpath(targetdir))
+    mailbox_name = os.path.splitext(os.path.basename(os.path.normpath(mailbox_path)))[0]
+    count = 0
+    done_dir = config_object.get('SETTINGS', 'mailbox_done_dir', fallback='').strip() or os.path.join(targetdir, '_mailboxes')
+    try:
+        for number, (maildata, copy_to) in enumerate(iter_mailbox(mailbox_path), 1):
+            nfile = mail_filename(maildata, project_name, '.eml', clean, clean_nocase, replacements) or f"{mailbox_name}_{number}.eml"
+            destdir = targetdir + bowldir_email(nfile, config_object, sender=maildata[1])
+            if dryrun:
+                dryprint(dryrun, 'extract mail', os.path.join(destdir, nfile))
+                continue
+            os.makedirs(destdir, exist_ok=True)
+            copy_to(enumerated_path(destdir, nfile, overwrite))
+            count += 1
+    except Exception as e:
+        # Left in place to be extracted again once the error is fixed
+        log_message(f"Error handling mailbox {mailbox_path}: {e}", level="ERROR")
+        return count
+    log_message(f"Extracted {count} mails from {mailbox_path}", level="INFO")
+    done_path = enumerated_path(done_dir, os.path.basename(os.path.normpath(mailbox_path)))
+    if dryrun:
+        dryprint(dryrun, 'move mailbox', mailbox_path, 'to', done_path)
+        return count
+    try:
+        os.makedirs(done_dir, exist_ok=True)
+        shutil.move(mailbox_path, done_path)
+        log_message(f"Moved mailbox {mailbox_path} to {done_path}", level="INFO")
+    except OSError as e:
+        log_message(f"Error moving mailbox {mailbox_path} to {done_path}: {e}", level="ERROR")
+    return count
+
+# list the MSG/EML files in sourcedir that are sorted according to ftype_sort
+def mail_paths(sourcedir, ftype_sort):
+    from wit_pytools.mailtools import MAIL_SUFFIXES
+    ftypes = [ftype.strip().casefold() for ftype in ftype_sort.split(',') if ftype.strip()]
+    paths = []
+    for root, dirs, files in os.walk(sourcedir):
+        for filename in files:
+            name = filename.casefold()
+            if name.endswith(MAIL_SUFFIXES) and any(name.endswith(ftype) for ftype in ftypes):
+                paths.append(os.path.join(root, filename))
+    return paths
+
+# number of processes for parsing mails and extracting attachments (SETTINGS: mail_workers), None for one per CPU
+def mail_workers(config_object):
+    workers = config_object.get('SETTINGS', 'mail_workers', fallback='').strip()
+    return int(workers) if workers else None
+
+# parse date, sender and subject of all mail files in sourcedir up front on a process pool (SETTINGS: mail_workers),
+# the dedup keys of all mails are stored in mail_keys by path for handle_emails
+def mail_prefetch(sourcedir, ftype_sort, config_object, mail_keys=None):
+    from wit_pytools.mailtools import parse_many
+    # Duplicates are skipped or trashed by handle_emails without their data, so they are not parsed
+    paths = mail_unique(mail_paths(sourcedir, ftype_sort), config_object, mail_keys)
+    if not paths:
+        return {}
+    try:
+        results = parse_many(paths, workers=mail_workers(config_object))
+    except Exception as e:
+        log_message(f"Error parsing mails in {sourcedir}: {e}", level="ERROR")
+        return {}
+    log_message(f"Parsed {len(paths)} mails in {sourcedir}", level="INFO")
+    return dict(zip(paths, results))
+
+# drop the mails that are copies of sorted mails or of an earlier mail in paths (SETTINGS: mail_dedup_index),
+# the computed dedup keys are stored in mail_keys by path
+def mail_unique(paths, config_object, mail_keys=None):
+    unique, seen = [], set()
+    for path in paths:
+        index, key, duplicate = mail_duplicate(path, config_object)
+        if mail_keys is not None and key is not None:
+            mail_keys[path] = key
+        if duplicate or (key is not None and key in seen):
+            continue
+        seen.add(key)
+        unique.append(path)
+    return unique
+
+# extract the attachments of mails on a process pool and hand each one to dispatch(file_path, directory) as it is ready, mails from mail_prefetch are not parsed again
+def handle_mail_attachments(paths, attachments_dir, ftype_sort, config_object, dispatch, dryrun=False, mails=None):
+    from wit_pytools.mailtools import extract_attachments_many, MAIL_SUFFIXES
+    # Only attachments of types that are sorted themselves, mailboxes are no attachments
+    suffixes = tuple(ftype for ftype in (f.strip().casefold() for f in ftype_sort.split(','))
+                     if ftype and not ftype.endswith(MAIL_SUFFIXES + ('.mbox', 'maildir')))
+    if not suffixes or not paths:
+        return 0
+    if dryrun:
+        dryprint(dryrun, 'extract attachments of', f"{len(paths)} mails to {attachments_dir}")
+        return 0
+    count = 0
+    for mail_path, outputs in extract_attachments_many(paths, attachments_dir, suffixes, workers=mail_workers(config_object), mailinfos=mails):
+        for output in outputs:
+            dispatch(Path(output), attachments_dir)
+            count += 1
+    log_message(f"Extracted {count} attachments from {len(paths)} mails", level="INFO")
+    return count
+
+# infer image coordinates from GPX tracks (SETTINGS: gpx_dir, gpx_camera_offset, gpx_max_gap)
+def gpx_coords(sourcedir, file, config_object):
+    if not config_object.has_section('SETTINGS'):
+        return None
+    gpx_dir = config_object.get('SETTINGS', 'gpx_dir', fallback='').strip()
+    if not gpx_dir:
+        return None
+    from wit_pytools.gpstools import gpx_track, gpx_locate_image, parse_time_offset, GPX_MAX_GAP
+    try:
+        camera_offset = parse_time_offset(config_object.get('SETTINGS', 'gpx_camera_offset', fallback='0'))
+        max_gap = float(config_object.get('SETTINGS', 'gpx_max_gap', fallback=str(GPX_MAX_GAP)).replace(',', '.'))
+        image_coords = gpx_locate_image(sourcedir, file, gpx_track(gpx_dir), camera_offset, max_gap)
+    except Exception as e:
+        log_message(f"Error correlating {file} with GPX tracks: {e}", level="ERROR")
+        return None
+    if image_coords:
+        log_message(f"GPX position for {file}: {image_coords}", level="INFO")
+    return image_coords
+
+# coordinates of an image from its EXIF GPS tags, or inferred from the GPX tracks (SETTINGS: gpx_dir)
+def locate_image(sourcedir, file, config_object):
+    from wit_pytools.imgtools import img_getgps
+    coords = img_getgps(sourcedir, file)
+    if coords is None:
+        coords = gpx_coords(sourcedir, file, config_object)
+    return coords
+
+# split the images of sourcedir into trips and map each image to a dated subfolder (SETTINGS: gps_segment_gap, gps_segment_km)
+def gps_segment_folders(sourcedir, config_object):
+    from wit_pytools.gpstools import gps_segment_dir, GPS_SEGMENT_GAP, GPS_SEGMENT_KM
+    try:
+        max_gap = float(config_object.get('SETTINGS', 'gps_segment_gap', fallback=str(GPS_SEGMENT_GAP)).replace(',', '.'))
+        max_dist = float(config_object.get('SETTINGS', 'gps_segment_km', fallback=str(GPS_SEGMENT_KM)).replace(',', '.'))
+        # Same positions as handle_gps, including the ones inferred from GPX tracks
+        locate = lambda directory, file: locate_image(directory, file, config_object)
+        paths, times, segment_ids = gps_segment_dir(sourcedir, max_gap, max_dist, locate=locate)
+    except Exception as e:
+        log_message(f"Error segmenting images in {sourcedir}: {e}", level="ERROR")
+        return {}
+    segments, folders, used = {}, {}, set()
+    for path, taken, segment_id in zip(paths, times.tolist(), segment_ids.tolist()):
+        if segment_id not in folders:
+            # Name the segment after the date of its first image, EXIF times are camera local
+            folder = datetime.fromtimestamp(taken, timezone.utc).strftime('%Y-%m-%d')
+            unique, i = folder, 2
+            while unique in used:
+                unique = f"{folder}_{i}"
+                i += 1
+            used.add(unique)
+            folders[segment_id] = unique
+        segments[path] = folders[segment_id]
+    log_message(f"Segmented {len(segments)} images into {len(folders)} trips", level="INFO")
+    return segments
+
+def handle_gps(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, segments=None):
     # Check if this is a supported image file type (JPEG or JPG) that we should process
     file_ext = os.path.splitext(file.name)[1].lower()
     if file_ext in ['.jpg', '.jpeg'] and '_nogps' not in file.name.lower():
-        from wit_pytools.imgtools import img_getgps
         try:
             # Clean the filename if clean parameters are provided
             nfile = cleanfilename(file.name, clean, clean_nocase, replacements) if clean else file.name
             log_message(_('Handling GPS: {}').format(os.path.join(sourcedir, file.name)))
-            image_coords = img_getgps(sourcedir, file.name)
+            # Images without GPS data are geotagged from the configured GPX tracks
+            image_coords = locate_image(sourcedir, file.name, config_object)
             # Handle images without GPS data
             if image_coords is None:
                 log_message("Image file does not contain GPS coordinates, renaming", level="WARNING")
@@ -532,6 +750,16 @@ def handle_gps(file, sourcedir, targetdir, clean, clean_nocase, config_object, f
                     movefile(sourcedir, file.name, sourcedir, nfile, filemode, overwrite, dryrun)
                 return False  # Return False to indicate no GPS handling was done
             bowl_coords = {}
+            # Polygon bowls are more precise than radius bowls and take precedence
+            segment = (segments or {}).get(os.path.join(sourcedir, file.name), '')
+            bowl = bowldir_gps_polygons(nfile, config_object, image_coords)
+            if bowl:
+                if segment:
+                    bowl = bowl + '/' + segment
+                log_message("Selected polygon bowl: {} for coordinates: {}".format(bowl, image_coords), level="DEBUG")
+                if not dryrun:
+                    movefile(sourcedir, file, targetdir + bowl, nfile, filemode, overwrite=overwrite, dryrun=dryrun)
+                return
             # Check for valid GPS bowl configuration
             if config_object.has_section("BOWLS_GPS"):
                 for bowl, critlist in config_object.items("BOWLS_GPS", raw=True):
@@ -551,6 +779,8 @@ def handle_gps(file, sourcedir, targetdir, clean, clean_nocase, config_object, f
                     log_message("No matching bowl found within for file {} at {}".format(file.name, image_coords), level="WARNING")
                     print("No matching bowl found within for file {} at {}".format(file.name, image_coords))
                     return  # Exit function if no matching bowl found
+                if segment:
+                    bowl = bowl + '/' + segment
                 # move file if not in dryrun mode
                 if not dryrun:
                     print("Moving file {}".format(file.name, targetdir))
@@ -609,7 +839,20 @@ def handle_oldfiles(file_path, time_diff):
         print(f"Error deleting old file {file.name}: {e}")
         return
 
-def handle_pdf(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, check_content=False):
+# add a PDF moved into a bowl to the full-text index (SETTINGS: document_index)
+def index_document(file_path, config_object):
+    if not file_path or not str(file_path).lower().endswith('.pdf') or not config_object.has_section('SETTINGS'):
+        return
+    index_path = config_object.get('SETTINGS', 'document_index', fallback='').strip()
+    if not index_path:
+        return
+    from wit_pytools.documenttools import document_index
+    try:
+        document_index(index_path).update(file_path)
+    except Exception as e:
+        log_message(f"Error indexing {file_path}: {e}", level="ERROR")
+
+def handle_pdf(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, check_content=False, check_metadata=False):
     # Check if this is a PDF file
     if file.name.lower().endswith('.pdf'):
         try:
@@ -617,14 +860,14 @@ def handle_pdf(file, sourcedir, targetdir, clean, clean_nocase, config_object, f
             nfile = cleanfilename(file.name, clean, clean_nocase, replacements)
             nfile = normalize_spaces(nfile)
             file_path = file if isinstance(file, Path) else Path(os.path.join(sourcedir, str(file)))
-            bowl = bowldir(nfile, config_object, file_path=file_path, check_content=check_content)
+            bowl = bowldir(nfile, config_object, file_path=file_path, check_content=check_content, check_metadata=check_metadata)
             if not dryrun:
-                movefile(sourcedir, file, targetdir + bowl, nfile, filemode, overwrite=overwrite, dryrun=dryrun)
+                index_document(movefile(sourcedir, file, targetdir + bowl, nfile, filemode, overwrite=overwrite, dryrun=dryrun), config_object)
         except Exception as e:
             log_message(f"Error handling PDF file {file.name}: {e}", level="ERROR")
     return
 
-def handlefile(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, use_directory_name=False, dir_file_count=None, dirname=None, skip_unmatched=True, check_content=False):
+def handlefile(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, use_directory_name=False, dir_file_count=None, dirname=None, skip_unmatched=True, check_content=False, segments=None, check_metadata=False, mails=None, attachment=False, mail_keys=None):
     # First check if the file matches any of the specified file types
     file_matches_type = False
     file_ext = ''
@@ -642,13 +885,17 @@ def handlefile(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, conf
     ## Handle PDF Bowls ##
     if file.name.lower().endswith('.pdf'):
         print("Handle PDF Bowls")
-        handle_pdf(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, check_content=check_content)
+        handle_pdf(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, check_content=check_content, check_metadata=check_metadata)
         return
     
     ## Handle E-Mail Bowls ##
-    if bowllist_email(config_object):
+    # Attachments extracted from mails are sorted like any other file, not as mails
+    if bowllist_email(config_object) and not attachment:
         print("Handle E-Mail Bowls")
-        handle_emails(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite)
+        if file.name.lower().endswith('.mbox'):
+            handle_mailbox(os.path.join(sourcedir, file.name), targetdir, clean, clean_nocase, config_object, replacements, dryrun, overwrite)
+            return
+        handle_emails(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, mails=mails, mail_keys=mail_keys)
         return
 
     # Handle GPS tags if enabled
@@ -673,7 +920,7 @@ def handlefile(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, conf
     has_gps_bowls = bowllist_gps(config_object)
     if has_gps_bowls:
         print("Handle GPS Bowls")
-        if handle_gps(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite):
+        if handle_gps(file, sourcedir, targetdir, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, segments=segments):
             # If GPS handling was successful (file was moved), we're done
             return
         # If GPS handling returned False (no GPS data) and gps_moved_unmatched is False, skip further processing
@@ -716,14 +963,14 @@ def handlefile(file, sourcedir, targetdir, ftype_sort, clean, clean_nocase, conf
         else:
             nfile = cleanfilename(file.name, clean, clean_nocase, replacements)
         
-        bowl = bowldir(nfile, config_object, file_path=file, check_content=check_content)
+        bowl = bowldir(nfile, config_object, file_path=file, check_content=check_content, check_metadata=check_metadata)
         # Only move if a bowl was found and it's not empty
         if bowl:
             # Make sure we're not moving to the root target directory
             if bowl.strip() == '':
                 log_message(f"Empty bowl returned for {file.name}, skipping move", level="DEBUG")
             else:
-                movefile(sourcedir, file, targetdir + bowl, nfile, filemode, overwrite=overwrite, dryrun=dryrun)
+                index_document(movefile(sourcedir, file, targetdir + bowl, nfile, filemode, overwrite=overwrite, dryrun=dryrun), config_object)
         else:
             # No matching bowl
             if skip_unmatched:
@@ -766,6 +1013,10 @@ def cinderellasort(configfile, single=None, filemode='win', dryrun=False):
     use_directory_name = settings.get('usedirectoryname', 'false').strip().lower() == 'true'
     skip_unmatched = settings.get('skipunmatched', 'true').strip().lower() == 'true'
     check_content = settings.get('check_content', 'false').strip().lower() == 'true'
+    check_metadata = settings.get('check_metadata', 'false').strip().lower() == 'true'
+    img_cache = settings.get('img_cache', '').strip()
+    gps_segment = settings.get('gps_segment', 'false').strip().lower() == 'true'
+    mail_attachments = settings.get('mail_attachments', 'false').strip().lower() == 'true'
 
     # Fetch replacements from the REPLACEMENTS section
     replacements = {}
@@ -796,6 +1047,10 @@ def cinderellasort(configfile, single=None, filemode='win', dryrun=False):
         print(' gps comp: ' + str(gps_compress))
         print(' skip unmatched: ' + str(skip_unmatched)) 
 
+    # Share image metadata lookups across handlers (and across runs if img_cache is a file)
+    from wit_pytools.imgtools import img_metacache
+    metacache = img_metacache(img_cache or None)
+
     # ADD unzip
 
     # prepare for sort process
@@ -811,7 +1066,7 @@ def cinderellasort(configfile, single=None, filemode='win', dryrun=False):
         file_path = Path(os.path.join(file_dir, file_name))
         
         if file_path.is_file():
-            handlefile(file_path, file_dir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, skip_unmatched=skip_unmatched, check_content=check_content)
+            handlefile(file_path, file_dir, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, skip_unmatched=skip_unmatched, check_content=check_content, check_metadata=check_metadata)
     else:
         # First pass: delete unwanted files in directories with valid sorts
         print("Running cinderellasort in all-files mode")
@@ -863,7 +1118,31 @@ def cinderellasort(configfile, single=None, filemode='win', dryrun=False):
                     dir_file_counts[root] = valid_count
                     print(f"    {root}: {valid_count} valid files")
         
+        # Move photo trips into dated subfolders of their GPS bowl
+        segments = gps_segment_folders(sourcedir, config_object) if gps_segment and bowllist_gps(config_object) else None
+        # Parse all mails of the run in parallel instead of one by one in handlefile
+        # Dedup keys are hashed once here and reused by handle_emails
+        mail_keys = {}
+        mails = mail_prefetch(sourcedir, ftype_sort, config_object, mail_keys) if bowllist_email(config_object) else None
+
+        # Sort the attachments of the mails before the mails themselves are moved
+        if mail_attachments:
+            attachments_dir = settings.get('mail_attachments_dir', '').strip() or os.path.join(targetdir, '_attachments')
+            def dispatch_attachment(file_path, root):
+                handlefile(file_path, root, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, skip_unmatched=skip_unmatched, check_content=check_content, check_metadata=check_metadata, attachment=True)
+            # Attachments of duplicates were sorted with the first copy, mail_prefetch already left them out
+            paths = list(mails) if mails is not None else mail_unique(mail_paths(sourcedir, ftype_sort), config_object)
+            handle_mail_attachments(paths, attachments_dir, ftype_sort, config_object, dispatch_attachment, dryrun, mails)
+
+        # Maildir directories are extracted as a whole if ftype_sort lists 'maildir'
+        from wit_pytools.mailtools import is_maildir
+        sort_maildirs = bool(bowllist_email(config_object)) and 'maildir' in [ftype.strip() for ftype in ftype_sort.split(',')]
+
         for root, dirs, files in os.walk(sourcedir):
+            if sort_maildirs and is_maildir(root):
+                handle_mailbox(root, targetdir, clean, clean_nocase, config_object, replacements, dryrun, overwrite)
+                dirs[:] = []
+                continue
             for filename in files:
                 print("Filename: " + filename)
                 lower_name = filename.casefold()
@@ -887,7 +1166,7 @@ def cinderellasort(configfile, single=None, filemode='win', dryrun=False):
                 # Get directory name and file count for this file
                 dirname = os.path.basename(root) if use_directory_name else None
                 dir_count = dir_file_counts.get(root, 0) if use_directory_name else None
-                handlefile(file_path, root, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, use_directory_name, dir_count, dirname, skip_unmatched, check_content=check_content)
+                handlefile(file_path, root, targetdir, ftype_sort, clean, clean_nocase, config_object, filemode, replacements, dryrun, overwrite, jpg_quality, gps_moved_unmatched, gps_compress, use_directory_name, dir_count, dirname, skip_unmatched, check_content=check_content, segments=segments, check_metadata=check_metadata, mails=mails, mail_keys=mail_keys)
                 processed_files += 1
         log_message(f"Processed {processed_files} files in {sourcedir} and subdirectories")
         
@@ -930,4 +1209,5 @@ def cinderellasort(configfile, single=None, filemode='win', dryrun=False):
             print(' #  No valid sort found!') 
 
     print(f"\n## Removing empty directories:")
-    rmemptydir(sourcedir,dryrun)
\ No newline at end of file
+    rmemptydir(sourcedir,dryrun)
+    log_message(f"Image metadata cache: {metacache.stats()}", level="INFO")
\ No newline at end of file
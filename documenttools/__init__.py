@@ -1,29 +1,580 @@
+import contextlib
+import functools
+import itertools
+import os
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 
 from eliot import log_message
 
+from wit_pytools.systools import sqlite_connect, sqlite_shared
+
 try:  # Optional dependency that is only needed for PDF operations
     import pdfplumber  # type: ignore
 except ImportError:  # pragma: no cover - exercised in environments without pdfplumber
     pdfplumber = None
 
+try:  # Optional fast text extraction backend
+    import pypdf  # type: ignore
+except ImportError:  # pragma: no cover - exercised in environments without pypdf
+    pypdf = None
+
+try:  # Optional fast text extraction backend (installed with pdfplumber)
+    from pdfminer.converter import TextConverter  # type: ignore
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager  # type: ignore
+    from pdfminer.pdfpage import LITERAL_PAGES, PDFPage  # type: ignore
+    from pdfminer.pdfparser import PDFParser  # type: ignore
+    from pdfminer.pdfdocument import PDFDocument  # type: ignore
+    from pdfminer.pdftypes import resolve1  # type: ignore
+    from pdfminer.utils import decode_text  # type: ignore
+except ImportError:  # pragma: no cover - exercised in environments without pdfminer.six
+    PDFPage = None
+
+
+Query = str | List[str] | Dict[Any, str]
+
+# Group references only resolve inside their own pattern and cannot be combined
+_group_reference = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+def _query_items(query: Query) -> Tuple[Tuple[Any, str], ...]:
+    """Normalise a single query, a list (ids are indexes) or a dict (ids are keys)."""
+    if isinstance(query, str):
+        return ((None, query),)
+    if isinstance(query, dict):
+        return tuple(query.items())
+    return tuple(enumerate(query))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_queries(
+    items: Tuple[Tuple[Any, str], ...], regex: bool, flags: int
+) -> Tuple[Optional[re.Pattern], Tuple[Tuple[Any, re.Pattern], ...]]:
+    """Compile queries into one alternation of named groups ``_q0``, ``_q1``, ...
+
+    Returns the combined pattern (``None`` if the queries cannot be combined)
+    and the individually compiled patterns used as fallback.
+    """
+    sources = [q if regex else re.escape(q) for _, q in items]
+    patterns = tuple((qid, re.compile(source, flags)) for (qid, _), source in zip(items, sources))
+    if len(items) == 1 or any(_group_reference.search(source) for source in sources):
+        return None, patterns
+    try:
+        combined = re.compile("|".join(f"(?P<_q{i}>{source})" for i, source in enumerate(sources)), flags)
+    except re.error as exc:
+        log_message(f"Cannot combine {len(items)} queries, scanning them separately: {exc}", level="DEBUG")
+        return None, patterns
+    return combined, patterns
+
+
+def _iter_page_matches(
+    text: str,
+    combined: Optional[re.Pattern],
+    patterns: Tuple[Tuple[Any, re.Pattern], ...],
+) -> Iterator[Tuple[Any, re.Match]]:
+    """Yield ``(query id, match)`` for one page of text in a single pass when possible."""
+    if combined is not None:
+        for match in combined.finditer(text):
+            yield patterns[int(match.lastgroup[2:])][0], match
+    else:
+        for qid, pattern in patterns:
+            for match in pattern.finditer(text):
+                yield qid, match
+
+
+def _page_text(page: Any) -> str:
+    """Extract the text of a pdfplumber page, skipping layout analysis for pages without characters."""
+    if not page.chars:
+        return ""
+    return page.extract_text() or ""
+
+
+def _page_order(count: int, first_pages: int, last_pages: int) -> List[int]:
+    """Page indexes in scan order: the first pages, the last pages, then the rest."""
+    head = list(range(min(max(first_pages, 0), count)))
+    tail = list(range(max(count - max(last_pages, 0), len(head)), count))
+    return head + tail + list(range(len(head), count - len(tail)))
+
+
+PageOrder = Callable[[int], Iterable[int]]
+
+
+def _iter_pages_pdfplumber(path: str, order: PageOrder) -> Iterator[Tuple[int, str]]:
+    with pdfplumber.open(path) as pdf:
+        pages = pdf.pages
+        for index in order(len(pages)):
+            page = pages[index]
+            try:
+                yield index + 1, _page_text(page)
+            finally:
+                # Drop the cached layout objects of the page
+                page.close()
+
+
+def _seek_page_tree(pages: Any, index: int, resolve: Callable[[Any], Any], is_pages: Callable[[Any], bool],
+                    names: Tuple[str, str, Tuple[str, ...]]) -> Tuple[Any, Any, Dict[str, Any]]:
+    """Descend a PDF page tree along the page counts of its nodes to the page at index.
+
+    Only the nodes on the way to the page are read, so pages can be visited in any order
+    without loading the whole tree. Returns the reference and node of the page and the
+    attributes it inherits. Malformed trees raise IndexError, KeyError, TypeError or ValueError.
+    """
+    kids_key, count_key, inheritable = names
+    ref, inherited = pages, {}
+    while True:
+        node = resolve(ref)
+        if not is_pages(node):
+            if index:
+                raise IndexError(index)
+            return ref, node, inherited
+        inherited = {**inherited, **{key: node[key] for key in inheritable if key in node}}
+        for kid in resolve(node[kids_key]):
+            kid_node = resolve(kid)
+            count = int(resolve(kid_node[count_key])) if is_pages(kid_node) else 1
+            if index < count:
+                ref = kid
+                break
+            index -= count
+        else:
+            raise IndexError(index)
+
+
+_PAGE_TREE_ERRORS = (AttributeError, IndexError, KeyError, TypeError, ValueError)
+_PYPDF_PAGE_TREE = ("/Kids", "/Count", ("/Resources", "/MediaBox", "/CropBox", "/Rotate"))
+_PDFMINER_PAGE_TREE = ("Kids", "Count", ("Resources", "MediaBox", "CropBox", "Rotate"))
+
+
+def _iter_pages_pypdf(path: str, order: PageOrder) -> Iterator[Tuple[int, str]]:
+    reader = pypdf.PdfReader(path)
+    cache = getattr(reader, "resolved_objects", None)
+    pages = reader.trailer["/Root"].get("/Pages")
+    resolve = lambda obj: obj.get_object()  # noqa: E731
+    is_pages = lambda node: node.get("/Type") == "/Pages"  # noqa: E731
+    try:
+        count = int(resolve(pages)["/Count"])
+    except _PAGE_TREE_ERRORS:
+        count = len(reader.pages)
+    for index in order(count):
+        try:
+            ref, node, inherited = _seek_page_tree(pages, index, resolve, is_pages, _PYPDF_PAGE_TREE)
+            page = pypdf.PageObject(reader, ref if isinstance(ref, pypdf.generic.IndirectObject) else None)
+            page.update(node)
+            for key, value in inherited.items():
+                page.setdefault(pypdf.generic.NameObject(key), value)
+        except _PAGE_TREE_ERRORS:
+            ref, page = None, reader.pages[index]
+        text = page.extract_text() or ""
+        # The reader keeps every resolved object with its decoded data, drop the page and
+        # its content streams so memory does not grow with the page count. resolved_objects
+        # is a private cache keyed by (generation, idnum) in pypdf 3.x to 6.x (tested with
+        # 6.x); other versions just keep the cache
+        contents = page.get("/Contents")
+        refs = [ref, *(contents if isinstance(contents, pypdf.generic.ArrayObject) else [contents])]
+        contents = page = node = None
+        if isinstance(cache, dict):
+            for obj in refs:
+                if isinstance(obj, pypdf.generic.IndirectObject):
+                    cache.pop((obj.generation, obj.idnum), None)
+        yield index + 1, text
+
+
+def _iter_pages_pdfminer(path: str, order: PageOrder) -> Iterator[Tuple[int, str]]:
+    import io
+
+    with open(path, "rb") as fp:
+        # Without caching parsed objects (with their decoded streams) are dropped after use,
+        # fonts are still cached by the resource manager
+        document = PDFDocument(PDFParser(fp), caching=False)
+        pages = document.catalog.get("Pages")
+        is_pages = lambda node: node.get("Type") is LITERAL_PAGES  # noqa: E731
+        try:
+            count = int(resolve1(resolve1(pages)["Count"]))
+        except _PAGE_TREE_ERRORS:
+            count = sum(1 for _ in PDFPage.create_pages(document))
+        manager = PDFResourceManager()
+        output = io.StringIO()
+        # laparams=None disables the layout analysis, text comes in content stream order
+        interpreter = PDFPageInterpreter(manager, TextConverter(manager, output, laparams=None))
+        for index in order(count):
+            try:
+                ref, node, inherited = _seek_page_tree(pages, index, resolve1, is_pages, _PDFMINER_PAGE_TREE)
+                page = PDFPage(document, getattr(ref, "objid", None), {**inherited, **node}, None)
+            except _PAGE_TREE_ERRORS:
+                page = next(itertools.islice(PDFPage.create_pages(document), index, None))
+            interpreter.process_page(page)
+            page = node = None
+            text = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            yield index + 1, text.replace("\f", "").strip()
+
+
+_PAGE_BACKENDS = {
+    "pdfplumber": (lambda: pdfplumber, _iter_pages_pdfplumber),
+    "pypdf": (lambda: pypdf, _iter_pages_pypdf),
+    "pdfminer": (lambda: PDFPage, _iter_pages_pdfminer),
+}
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_ODT_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+# Besides w:t text runs these elements contribute to the text of a DOCX paragraph
+_DOCX_INLINE = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n"}
+
+
+def _iter_xml_paragraphs(stream: Any, paragraph_tags: Tuple[str, ...], paragraph_text: Callable[[Any], str]) -> Iterator[str]:
+    """Stream paragraphs out of an XML document, dropping each one once it was read."""
+    import xml.etree.ElementTree as ET
+
+    stack: List[Any] = []
+    open_paragraphs = 0
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            open_paragraphs += elem.tag in paragraph_tags
+            continue
+        stack.pop()
+        if elem.tag in paragraph_tags:
+            open_paragraphs -= 1
+            yield paragraph_text(elem)
+        if not open_paragraphs and stack:
+            # Finished elements outside a paragraph are no longer needed; earlier siblings are
+            # already gone, so this is the first child and removing it is cheap
+            stack[-1].remove(elem)
+
+
+def _docx_paragraph_text(paragraph: Any) -> str:
+    parts: List[str] = []
+
+    def collect(elem: Any) -> None:
+        for node in elem:
+            if node.tag == _W + "t":
+                parts.append(node.text or "")
+            elif node.tag in _DOCX_INLINE:
+                parts.append(_DOCX_INLINE[node.tag])
+            elif node.tag != _W + "p":
+                # Paragraphs nested in text boxes (w:txbxContent) are yielded on their own
+                collect(node)
+
+    collect(paragraph)
+    return "".join(parts)
+
+
+def _odt_paragraph_text(elem: Any) -> str:
+    parts = [elem.text or ""]
+    for child in elem:
+        if child.tag == _ODT_TEXT + "s":
+            parts.append(" " * int(child.get(_ODT_TEXT + "c", "1")))
+        elif child.tag == _ODT_TEXT + "tab":
+            parts.append("\t")
+        elif child.tag == _ODT_TEXT + "line-break":
+            parts.append("\n")
+        elif child.tag not in (_ODT_TEXT + "p", _ODT_TEXT + "h"):
+            parts.append(_odt_paragraph_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def _iter_paragraphs_docx(path: str) -> Iterator[str]:
+    import zipfile
+
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as stream:
+        yield from _iter_xml_paragraphs(stream, (_W + "p",), _docx_paragraph_text)
+
+
+def _iter_paragraphs_odt(path: str) -> Iterator[str]:
+    import zipfile
+
+    with zipfile.ZipFile(path) as archive, archive.open("content.xml") as stream:
+        yield from _iter_xml_paragraphs(stream, (_ODT_TEXT + "p", _ODT_TEXT + "h"), _odt_paragraph_text)
+
+
+def _iter_paragraphs_txt(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8", errors="replace") as fp:
+        for line in fp:
+            yield line.rstrip("\r\n")
+
+
+def _iter_paragraphs_eml(path: str) -> Iterator[str]:
+    """Yield the lines of the text/plain parts (or stripped text/html parts) of an email.
+
+    The message is walked line by line, attachments are skipped without being decoded.
+    """
+    from wit_pytools.mailtools import iter_eml_text
+
+    found = False
+    for line in iter_eml_text(path, "plain"):
+        found = True
+        yield line
+    if found:
+        return
+    pending: Optional[str] = None
+    for line in iter_eml_text(path, "html"):
+        pending = line if pending is None else f"{pending}\n{line}"
+        if pending.rfind("<") > pending.rfind(">"):
+            continue  # the tag goes on in the next line
+        yield from re.sub(r"<[^>]+>", " ", pending).splitlines()
+        pending = None
+    if pending is not None:
+        yield from re.sub(r"<[^>]+>", " ", pending).splitlines()
+
+
+_TEXT_EXTRACTORS = {
+    ".docx": _iter_paragraphs_docx,
+    ".odt": _iter_paragraphs_odt,
+    ".txt": _iter_paragraphs_txt,
+    ".eml": _iter_paragraphs_eml,
+}
+TEXT_SUFFIXES = tuple(_TEXT_EXTRACTORS)
+
+
+def document_iter_text(file_path: Path | str, chunk_chars: int = 65536) -> Iterator[str]:
+    """Stream the text of a DOCX, ODT, TXT or EML file in blocks of whole paragraphs.
+
+    DOCX and ODT are parsed with ``iterparse`` straight out of the zip
+    container, so memory is bounded by ``chunk_chars`` rather than the
+    document size. Emails are streamed line by line part after part: the
+    inline text/plain parts are decoded, or the tag-stripped text/html parts
+    if there is no plain text, and attachments are skipped undecoded.
+
+    Args:
+        file_path: Path to the document.
+        chunk_chars: Approximate number of characters per block.
+
+    Yields:
+        Blocks of paragraphs joined by newlines.
+
+    Raises:
+        ValueError: If the file type is not supported.
+    """
+
+    suffix = Path(file_path).suffix.lower()
+    if suffix not in _TEXT_EXTRACTORS:
+        raise ValueError(f"Unsupported document type {suffix!r}, use one of {', '.join(TEXT_SUFFIXES)}")
+    block: List[str] = []
+    size = 0
+    for paragraph in _TEXT_EXTRACTORS[suffix](str(file_path)):
+        block.append(paragraph)
+        size += len(paragraph) + 1
+        if size >= chunk_chars:
+            yield "\n".join(block)
+            block, size = [], 0
+    if block:
+        yield "\n".join(block)
+
+
+def _is_text_document(file_path: Optional[Path | str]) -> bool:
+    return file_path is not None and Path(file_path).suffix.lower() in _TEXT_EXTRACTORS
+
+
+def _require_backend(backend: str, func_name: str, file_path: Optional[Path | str] = None) -> None:
+    if _is_text_document(file_path):
+        return
+    if backend not in _PAGE_BACKENDS:
+        raise ValueError(f"Unknown text extraction backend {backend!r}, use one of {', '.join(_PAGE_BACKENDS)}")
+    if not _PAGE_BACKENDS[backend][0]():
+        package = "pdfminer.six" if backend == "pdfminer" else backend
+        raise RuntimeError(f"{package} is required for {func_name}. Install {package} to use this function.")
+
+
+def document_iter_pages(
+    file_path: Path | str,
+    backend: str = "pdfplumber",
+    *,
+    max_pages: Optional[int] = None,
+    order: Optional[PageOrder] = None,
+) -> Iterator[Tuple[int, str]]:
+    """Lazily extract the text of a PDF page by page.
+
+    Each page is released after its text was yielded, so memory does not
+    grow with the number of pages. DOCX, ODT, TXT and EML files are streamed
+    with :func:`document_iter_text`; its blocks take the place of pages and
+    ``backend`` and ``order`` do not apply.
+
+    Args:
+        file_path: Path to the PDF document.
+        backend: ``"pdfplumber"`` (character level layout, slowest),
+            ``"pypdf"`` or ``"pdfminer"`` (layout analysis disabled).
+        max_pages: Optional maximum number of pages to consider. ``None``
+            considers all pages.
+        order: Optional function mapping the page count to the page indexes
+            to visit, e.g. to scan the first and last pages first.
+
+    Yields:
+        ``(page_number, text)`` tuples, page numbers starting at 1.
+
+    Raises:
+        RuntimeError: If the backend's package is not available in the current
+            environment.
+        ValueError: If the backend is unknown.
+    """
+
+    _require_backend(backend, "document_iter_pages", file_path)
+    if _is_text_document(file_path):
+        blocks = document_iter_text(file_path)
+        if max_pages is not None:
+            blocks = itertools.islice(blocks, max_pages)
+        yield from enumerate(blocks, start=1)
+        return
+
+    def limited_order(count: int) -> Iterable[int]:
+        if max_pages is not None:
+            count = min(count, max_pages)
+        return order(count) if order else range(count)
+
+    yield from _PAGE_BACKENDS[backend][1](str(file_path), limited_order)
+
+
+# Info dictionary keys and the XMP properties that fill them when the Info entry is missing
+METADATA_FIELDS = ("Title", "Author", "Subject", "Keywords", "Creator", "Producer")
+_XMP_FIELDS = {
+    "{http://purl.org/dc/elements/1.1/}title": "Title",
+    "{http://purl.org/dc/elements/1.1/}creator": "Author",
+    "{http://purl.org/dc/elements/1.1/}description": "Subject",
+    "{http://ns.adobe.com/pdf/1.3/}Keywords": "Keywords",
+    "{http://ns.adobe.com/xap/1.0/}CreatorTool": "Creator",
+    "{http://ns.adobe.com/pdf/1.3/}Producer": "Producer",
+}
+_RDF_LI = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}li"
+
+
+def _metadata_text(value: Any) -> Optional[str]:
+    value = resolve1(value)
+    if isinstance(value, bytes):
+        return decode_text(value).strip("\x00").strip()
+    if isinstance(value, str):
+        return value.strip()
+    if value is None:
+        return None
+    return str(value)
+
+
+def _parse_xmp(data: bytes) -> Dict[str, str]:
+    """Read the XMP properties of interest from attributes and simple, Alt, Seq or Bag elements."""
+    import xml.etree.ElementTree as ET
+
+    fields: Dict[str, str] = {}
+    try:
+        root = ET.fromstring(data.strip().strip(b"\x00"))
+    except ET.ParseError as exc:
+        log_message(f"Cannot parse XMP metadata: {exc}", level="DEBUG")
+        return fields
+    for element in root.iter():
+        for attr, value in element.attrib.items():
+            if attr in _XMP_FIELDS and value.strip():
+                fields.setdefault(_XMP_FIELDS[attr], value.strip())
+        if element.tag in _XMP_FIELDS:
+            items = [li.text.strip() for li in element.iter(_RDF_LI) if li.text and li.text.strip()]
+            text = "; ".join(items) if items else (element.text or "").strip()
+            if text:
+                fields.setdefault(_XMP_FIELDS[element.tag], text)
+    return fields
+
+
+def document_metadata(file_path: Path | str) -> Dict[str, str]:
+    """Read the Info dictionary and XMP metadata of a PDF without touching any page.
+
+    Only the trailer, the Info dictionary and the catalog's metadata stream are
+    parsed, which takes milliseconds even for very long documents.
+
+    Args:
+        file_path: Path to the PDF document.
+
+    Returns:
+        A dictionary of the non-empty Info entries (``Title``, ``Author``,
+        ``Subject``, ``Keywords``, ``Creator``, ``Producer``, ``CreationDate``,
+        ...). Fields missing from Info are taken from XMP when present.
+
+    Raises:
+        RuntimeError: If ``pdfminer.six`` is not available in the current
+            environment.
+    """
+
+    if not PDFPage:
+        raise RuntimeError(
+            "pdfminer.six is required for document_metadata. Install pdfminer.six to use this function."
+        )
+
+    metadata: Dict[str, str] = {}
+    with open(str(file_path), "rb") as fp:
+        doc = PDFDocument(PDFParser(fp))
+        for info in doc.info:
+            for key, value in info.items():
+                text = _metadata_text(value)
+                if text:
+                    metadata.setdefault(key, text)
+        stream = resolve1(doc.catalog.get("Metadata"))
+        if stream is not None and hasattr(stream, "get_data"):
+            for key, value in _parse_xmp(stream.get_data()).items():
+                metadata.setdefault(key, value)
+    return metadata
+
+
+def document_metadata_match(
+    file_path: Path | str,
+    query: Query,
+    *,
+    regex: bool = False,
+    flags: int = re.IGNORECASE,
+    fields: Iterable[str] = METADATA_FIELDS,
+) -> Optional[Dict[str, Any]]:
+    """Match queries against the metadata of a PDF, see :func:`document_metadata`.
+
+    Args:
+        file_path: Path to the PDF document.
+        query: Literal string or regex pattern, or a list or dict of them in
+            priority order.
+        regex: When ``True`` the queries are treated as regular expressions.
+        flags: Regular expression flags passed to :func:`re.compile`.
+        fields: Metadata fields to search.
+
+    Returns:
+        A dictionary with ``field`` and ``match`` keys (plus ``query`` for a list
+        or dict of queries) for the earliest listed query that matches, or
+        ``None``.
+
+    Raises:
+        RuntimeError: If ``pdfminer.six`` is not available in the current
+            environment.
+    """
+
+    metadata = document_metadata(file_path)
+    _, patterns = _compile_queries(_query_items(query), regex, flags)
+    values = [(field, metadata[field]) for field in fields if metadata.get(field)]
+    for qid, pattern in patterns:
+        for field, value in values:
+            match = pattern.search(value)
+            if match:
+                result: Dict[str, Any] = {"field": field, "match": match.group(0)}
+                if not isinstance(query, str):
+                    result["query"] = qid
+                return result
+    return None
+
 
 def document_find_regex(
     file_path: Path | str,
-    query: str,
+    query: Query,
     *,
     regex: bool = False,
     context_chars: int = 40,
     max_pages: Optional[int] = None,
     flags: int = re.IGNORECASE,
+    max_matches: Optional[int] = None,
+    backend: str = "pdfplumber",
 ) -> List[Dict[str, Any]]:
     """Search a PDF for a literal string or regex pattern and return contexts.
 
+    Several queries can be given as a list or dict. They are combined into one
+    pattern so each page's text is extracted and scanned only once; where two
+    queries match at the same position the one listed first wins. Queries
+    with backreferences are scanned one after the other on the same text.
+
     Args:
         file_path: Path to the PDF document.
-        query: Literal string or regex pattern to search for.
+        query: Literal string or regex pattern to search for, or a list or dict
+            of them.
         regex: When ``True`` the ``query`` is treated as a regular expression;
             otherwise a literal search is performed.
         context_chars: Number of characters of context to capture on both sides
@@ -31,46 +582,401 @@ def document_find_regex(
         max_pages: Optional maximum number of pages to scan. ``None`` scans all
             pages.
         flags: Regular expression flags passed to :func:`re.compile`.
+        max_matches: Optional number of matches after which the search stops
+            without extracting the remaining pages. ``None`` collects all.
+        backend: Text extraction backend, see :func:`document_iter_pages`.
 
     Returns:
         A list of dictionaries containing ``page_number``, ``match``, and
-        ``context`` keys for each occurrence found.
+        ``context`` keys for each occurrence found. For a list or dict of
+        queries each hit also has a ``query`` key with the list index or dict
+        key of the matching query.
 
     Raises:
-        RuntimeError: If ``pdfplumber`` is not available in the current
+        RuntimeError: If the package of the selected ``backend`` is not available in the current
             environment.
     """
 
-    if not pdfplumber:
-        raise RuntimeError(
-            "pdfplumber is required for document_find_regex. Install pdfplumber to use this function."
-        )
+    _require_backend(backend, "document_find_regex", file_path)
 
-    pattern = re.compile(query if regex else re.escape(query), flags)
+    combined, patterns = _compile_queries(_query_items(query), regex, flags)
+    tagged = not isinstance(query, str)
     pdf_path = Path(file_path)
     results: List[Dict[str, Any]] = []
 
     try:
-        with pdfplumber.open(str(pdf_path)) as pdf:
-            pages = pdf.pages
-            if max_pages is not None:
-                pages = pages[:max_pages]
-
-            for page_index, page in enumerate(pages, start=1):
-                page_text = page.extract_text() or ""
-                for match in pattern.finditer(page_text):
-                    start = max(match.start() - context_chars, 0)
-                    end = min(match.end() + context_chars, len(page_text))
-                    context = page_text[start:end].replace("\n", " ")
-                    results.append(
-                        {
-                            "page_number": page_index,
-                            "match": match.group(0),
-                            "context": context,
-                        }
-                    )
+        for page_index, page_text in document_iter_pages(pdf_path, backend, max_pages=max_pages):
+            for qid, match in _iter_page_matches(page_text, combined, patterns):
+                start = max(match.start() - context_chars, 0)
+                end = min(match.end() + context_chars, len(page_text))
+                context = page_text[start:end].replace("\n", " ")
+                result = {
+                    "page_number": page_index,
+                    "match": match.group(0),
+                    "context": context,
+                }
+                if tagged:
+                    result["query"] = qid
+                results.append(result)
+                if max_matches is not None and len(results) >= max_matches:
+                    return results
     except Exception as exc:
         log_message(f"Failed to search PDF {pdf_path}: {exc}", level="ERROR")
         raise
 
     return results
+
+
+def document_first_match(
+    file_path: Path | str,
+    query: Query,
+    *,
+    regex: bool = False,
+    context_chars: int = 40,
+    max_pages: Optional[int] = None,
+    flags: int = re.IGNORECASE,
+    first_pages: int = 2,
+    last_pages: int = 1,
+    ordered: bool = False,
+    backend: str = "pdfplumber",
+) -> Optional[Dict[str, Any]]:
+    """Return the first match in a PDF, stopping the extraction as soon as it is known.
+
+    Pages are scanned in the order first ``first_pages``, last ``last_pages``,
+    then the remaining pages, since classification terms are usually found on
+    the first or last page.
+
+    Args:
+        file_path: Path to the PDF document.
+        query: Literal string or regex pattern, or a list or dict of them.
+        regex: When ``True`` the queries are treated as regular expressions.
+        context_chars: Number of characters of context to capture on both sides
+            of the match.
+        max_pages: Optional maximum number of pages to consider. ``None``
+            considers all pages.
+        flags: Regular expression flags passed to :func:`re.compile`.
+        first_pages: Number of leading pages to scan first.
+        last_pages: Number of trailing pages to scan after the leading pages.
+        ordered: When ``True`` the queries are a priority list: the hit of the
+            earliest listed query found anywhere in the document is returned
+            and the scan only stops early once the first query matched.
+        backend: Text extraction backend, see :func:`document_iter_pages`.
+
+    Returns:
+        A dictionary with ``page_number``, ``match`` and ``context`` keys (plus
+        ``query`` for a list or dict of queries), or ``None`` if nothing matched.
+
+    Raises:
+        RuntimeError: If the package of the selected ``backend`` is not available in the current
+            environment.
+    """
+
+    _require_backend(backend, "document_first_match", file_path)
+
+    combined, patterns = _compile_queries(_query_items(query), regex, flags)
+    tagged = not isinstance(query, str)
+    pdf_path = Path(file_path)
+    best: Optional[Tuple[int, Any, int, str, re.Match]] = None
+
+    pages = document_iter_pages(
+        pdf_path, backend, max_pages=max_pages, order=lambda count: _page_order(count, first_pages, last_pages)
+    )
+    try:
+        with contextlib.closing(pages):
+            for page_number, page_text in pages:
+                if not page_text:
+                    continue
+                if not ordered:
+                    for qid, match in _iter_page_matches(page_text, combined, patterns):
+                        best = (0, qid, page_number, page_text, match)
+                        break
+                elif combined is None or combined.search(page_text):
+                    # Only queries ranked above the best hit so far can improve it
+                    for rank in range(best[0] if best else len(patterns)):
+                        match = patterns[rank][1].search(page_text)
+                        if match:
+                            best = (rank, patterns[rank][0], page_number, page_text, match)
+                            break
+                if best and best[0] == 0:
+                    break
+    except Exception as exc:
+        log_message(f"Failed to search PDF {pdf_path}: {exc}", level="ERROR")
+        raise
+
+    if best is None:
+        return None
+    _, qid, page_number, page_text, match = best
+    start = max(match.start() - context_chars, 0)
+    end = min(match.end() + context_chars, len(page_text))
+    result = {
+        "page_number": page_number,
+        "match": match.group(0),
+        "context": page_text[start:end].replace("\n", " "),
+    }
+    if tagged:
+        result["query"] = qid
+    return result
+
+
+def document_contains(file_path: Path | str, query: Query, **options: Any) -> bool:
+    """Check whether a PDF contains a query, stopping at the first hit.
+
+    Args:
+        file_path: Path to the PDF document.
+        query: Literal string or regex pattern, or a list or dict of them.
+        **options: Keyword arguments for :func:`document_first_match`.
+
+    Returns:
+        ``True`` if any query matches.
+    """
+
+    return document_first_match(file_path, query, **options) is not None
+
+
+def _find_regex_job(args: Tuple[str, Query, Dict[str, Any]]) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+    """Search one document in a worker process; errors are logged and return ``None``."""
+    path, query, options = args
+    try:
+        return path, document_find_regex(path, query, **options)
+    except Exception as exc:
+        log_message(f"document_find_regex_many: skipping {path}: {exc}", level="ERROR")
+        return path, None
+
+
+def _iter_pdf_paths(paths_or_dir: Path | str | Iterable[Path | str], recursive: bool) -> Iterator[str]:
+    """Yield PDF paths lazily from a directory or pass an iterable of paths through."""
+    if isinstance(paths_or_dir, (str, Path)) and os.path.isdir(paths_or_dir):
+        for root, dirs, files in os.walk(paths_or_dir):
+            if not recursive:
+                dirs[:] = []
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith(".pdf"):
+                    yield os.path.join(root, file)
+    elif isinstance(paths_or_dir, (str, Path)):
+        yield str(paths_or_dir)
+    else:
+        for path in paths_or_dir:
+            yield str(path)
+
+
+def document_find_regex_many(
+    paths_or_dir: Path | str | Iterable[Path | str],
+    queries: Query,
+    *,
+    workers: Optional[int] = None,
+    first_hit: bool = False,
+    recursive: bool = True,
+    **options: Any,
+) -> Iterator[Tuple[str, Optional[List[Dict[str, Any]]]]]:
+    """Search many PDFs on a process pool and stream the results back.
+
+    Only a bounded number of documents is in flight at any time, so memory
+    stays flat regardless of the archive size. Results arrive in completion
+    order, not input order.
+
+    Args:
+        paths_or_dir: Directory to scan for ``*.pdf`` files, a single PDF or an
+            iterable of PDF paths.
+        queries: Query or list/dict of queries passed to
+            :func:`document_find_regex`.
+        workers: Number of worker processes. ``None`` uses the number of CPUs,
+            ``1`` searches in the calling process.
+        first_hit: Stop searching a document after its first match.
+        recursive: Include subdirectories when ``paths_or_dir`` is a directory.
+        **options: Further keyword arguments for :func:`document_find_regex`
+            (``regex``, ``context_chars``, ``max_pages``, ``flags``, ``max_matches``).
+
+    Yields:
+        ``(path, results)`` tuples, where ``results`` is the list returned by
+        :func:`document_find_regex` or ``None`` if the document could not be read.
+
+    Raises:
+        RuntimeError: If the package of the selected ``backend`` is not available in the current
+            environment.
+    """
+
+    _require_backend(options.get("backend", "pdfplumber"), "document_find_regex_many")
+    if first_hit:
+        options["max_matches"] = 1
+    jobs = ((path, queries, options) for path in _iter_pdf_paths(paths_or_dir, recursive))
+
+    if workers == 1:
+        for job in jobs:
+            yield _find_regex_job(job)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    max_in_flight = (workers or os.cpu_count() or 1) * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        try:
+            for job in jobs:
+                pending.add(executor.submit(_find_regex_job, job))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # Consumer stopped early: drop the queued documents
+            for future in pending:
+                future.cancel()
+
+
+class DocumentIndex:
+    """Incremental SQLite FTS5 full-text index over the page text of PDFs.
+
+    Documents are keyed by path and only re-extracted when their size or
+    mtime changed. Use ``':memory:'`` for a throwaway index or a file path to
+    keep it across runs.
+    """
+
+    def __init__(self, dbpath: str = ":memory:", backend: str = "pdfplumber") -> None:
+        self.dbpath = dbpath
+        self.backend = backend
+        self._conn = sqlite_connect(dbpath, (
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, size INTEGER NOT NULL,"
+            " mtime INTEGER NOT NULL, pages INTEGER NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS page_text ("
+            " id INTEGER PRIMARY KEY, doc_id INTEGER NOT NULL, page_number INTEGER NOT NULL, text TEXT NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS page_text_doc ON page_text (doc_id)",
+            # External content table: the FTS index can be updated per document without a full scan
+            "CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5("
+            " text, content='page_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        ))
+
+    def update(self, file_path: Path | str) -> bool:
+        """Index a PDF if it is new or changed.
+
+        Args:
+            file_path: Path to the PDF document.
+
+        Returns:
+            ``True`` if the document was (re)indexed, ``False`` if it was up to date.
+
+        Raises:
+            RuntimeError: If the package of the selected ``backend`` is not available in the current
+                environment.
+        """
+
+        _require_backend(self.backend, "DocumentIndex")
+
+        path = os.path.abspath(str(file_path))
+        st = os.stat(path)
+        row = self._conn.execute("SELECT id, size, mtime FROM documents WHERE path=?", (path,)).fetchone()
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+            return False
+
+        texts = [text for _, text in document_iter_pages(path, self.backend)]
+        with self._conn:
+            if row:
+                self._delete(row[0])
+            doc_id = self._conn.execute(
+                "INSERT INTO documents (path, size, mtime, pages) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, len(texts)),
+            ).lastrowid
+            for number, text in enumerate(texts, start=1):
+                if text:
+                    rowid = self._conn.execute(
+                        "INSERT INTO page_text (doc_id, page_number, text) VALUES (?, ?, ?)", (doc_id, number, text)
+                    ).lastrowid
+                    self._conn.execute("INSERT INTO page_fts (rowid, text) VALUES (?, ?)", (rowid, text))
+        log_message(f"DocumentIndex: indexed {path} ({len(texts)} pages)", level="DEBUG")
+        return True
+
+    def update_dir(self, directory: Path | str, recursive: bool = True) -> Dict[str, int]:
+        """Index all new or changed PDFs below a directory and drop deleted ones.
+
+        Args:
+            directory: Directory to scan for ``*.pdf`` files.
+            recursive: Include subdirectories.
+
+        Returns:
+            Counts of ``indexed``, ``unchanged``, ``failed`` and ``removed`` documents.
+        """
+
+        counts = {"indexed": 0, "unchanged": 0, "failed": 0, "removed": 0}
+        for path in _iter_pdf_paths(directory, recursive):
+            try:
+                counts["indexed" if self.update(path) else "unchanged"] += 1
+            except RuntimeError:
+                raise
+            except Exception as exc:
+                log_message(f"DocumentIndex: cannot index {path}: {exc}", level="ERROR")
+                counts["failed"] += 1
+        prefix = os.path.join(os.path.abspath(str(directory)), "")
+        for (path,) in self._conn.execute(
+            "SELECT path FROM documents WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall():
+            if not os.path.exists(path):
+                self.remove(path)
+                counts["removed"] += 1
+        return counts
+
+    def _delete(self, doc_id: int) -> None:
+        """Remove a document and its pages (inside the caller's transaction)."""
+        self._conn.executemany(
+            "INSERT INTO page_fts (page_fts, rowid, text) VALUES ('delete', ?, ?)",
+            self._conn.execute("SELECT id, text FROM page_text WHERE doc_id=?", (doc_id,)).fetchall(),
+        )
+        self._conn.execute("DELETE FROM page_text WHERE doc_id=?", (doc_id,))
+        self._conn.execute("DELETE FROM documents WHERE id=?", (doc_id,))
+
+    def remove(self, file_path: Path | str) -> None:
+        """Drop a document from the index."""
+        path = os.path.abspath(str(file_path))
+        row = self._conn.execute("SELECT id FROM documents WHERE path=?", (path,)).fetchone()
+        if row:
+            with self._conn:
+                self._delete(row[0])
+
+    def search(self, query: str, *, limit: int = 50, literal: bool = False, snippet_tokens: int = 12) -> List[Dict[str, Any]]:
+        """Search the index and return matching pages, best matches first.
+
+        Args:
+            query: FTS5 query (terms, ``"phrases"``, ``prefix*``, ``AND``/``OR``/``NOT``).
+            limit: Maximum number of pages to return.
+            literal: When ``True`` the query is searched as one phrase without
+                FTS5 syntax.
+            snippet_tokens: Number of tokens in each snippet.
+
+        Returns:
+            A list of dictionaries containing ``path``, ``page_number`` and
+            ``snippet`` keys; matches are marked with ``[`` and ``]`` in the snippet.
+        """
+
+        if literal:
+            query = '"' + query.replace('"', '""') + '"'
+        rows = self._conn.execute(
+            "SELECT d.path, t.page_number, snippet(page_fts, 0, '[', ']', '...', ?)"
+            " FROM page_fts JOIN page_text t ON t.id = page_fts.rowid JOIN documents d ON d.id = t.doc_id"
+            " WHERE page_fts MATCH ? ORDER BY rank LIMIT ?",
+            (snippet_tokens, query, limit),
+        ).fetchall()
+        return [{"path": path, "page_number": page, "snippet": snippet} for path, page, snippet in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of indexed documents and pages with text."""
+        documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        pages = self._conn.execute("SELECT COUNT(*) FROM page_text").fetchone()[0]
+        return {"documents": documents, "pages": pages}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def document_index(dbpath: Optional[str] = None) -> DocumentIndex:
+    """Return the shared document index.
+
+    Args:
+        dbpath: SQLite file of the index. If ``None``, the current index is
+            returned (an in-memory index is created on first use).
+    """
+
+    return sqlite_shared(DocumentIndex, dbpath)
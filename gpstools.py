@@ -1,6 +1,15 @@
+import functools
 import math
 import os
+import re
 import sys
+from datetime import datetime, timezone
+from eliot import log_message
+
+try:  # Optional dependency that is only needed for the batch functions
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - exercised in environments without numpy
+    np = None
 
 # Add path to parent directory to allow importing from sibling modules
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -75,6 +84,44 @@ def is_valid_gps(s):
     log_message(f"Wrong number of parts: {len(parts)}")
     return False
 
+# Earth radius in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+def _haversine(lat1, lon1, lat2, lon2, lib=math):
+    """
+    Haversine distance in kilometers between coordinates in decimal degrees.
+
+    Works on floats with lib=math and on broadcastable arrays with lib=numpy.
+    """
+    atan2 = getattr(lib, 'atan2', None) or lib.arctan2
+    # Convert latitude and longitude from degrees to radians
+    lat1 = lib.radians(lat1)
+    lon1 = lib.radians(lon1)
+    lat2 = lib.radians(lat2)
+    lon2 = lib.radians(lon2)
+
+    # Haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = lib.sin(dlat/2)**2 + lib.cos(lat1) * lib.cos(lat2) * lib.sin(dlon/2)**2
+    c = 2 * atan2(lib.sqrt(a), lib.sqrt(1-a))
+    return EARTH_RADIUS_KM * c
+
+def _require_numpy(func_name):
+    if np is None:
+        raise RuntimeError(
+            f"numpy is required for {func_name}. Install numpy to use this function."
+        )
+
+def _as_points(points):
+    """Convert a sequence of (lat, lon) pairs to an (N, 2) float array."""
+    arr = np.asarray(points, dtype=float)
+    if arr.ndim == 1 and arr.size == 2:
+        arr = arr.reshape(1, 2)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"Expected (lat, lon) pairs, got array of shape {arr.shape}")
+    return arr
+
 def gps_distance(coord1, coord2):
     """
     Calculate the distance between two GPS coordinates using the Haversine formula.
@@ -86,20 +133,1119 @@ def gps_distance(coord1, coord2):
     Returns:
         float: Distance between the coordinates in kilometers
     """
-    # Earth radius in kilometers
-    earth_radius = 6371.0
-    
-    # Convert latitude and longitude from degrees to radians
-    lat1 = math.radians(coord1[0])
-    lon1 = math.radians(coord1[1])
-    lat2 = math.radians(coord2[0])
-    lon2 = math.radians(coord2[1])
-    
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = earth_radius * c
-    
-    return distance
+    return _haversine(coord1[0], coord1[1], coord2[0], coord2[1])
+
+def gps_distance_many(points, centers):
+    """
+    Calculate the distances between many GPS coordinates and many centers.
+
+    Args:
+        points: N (latitude, longitude) pairs in decimal degrees
+        centers: M (latitude, longitude) pairs in decimal degrees
+
+    Returns:
+        numpy.ndarray: (N, M) distance matrix in kilometers
+    """
+    _require_numpy("gps_distance_many")
+    points = _as_points(points)
+    centers = _as_points(centers)
+    return _haversine(points[:, 0:1], points[:, 1:2], centers[:, 0], centers[:, 1], lib=np)
+
+def nearest_within(points, centers, radii, chunk_size=4096):
+    """
+    Find the nearest center within its radius for each point.
+
+    Args:
+        points: N (latitude, longitude) pairs in decimal degrees
+        centers: M (latitude, longitude) pairs in decimal degrees
+        radii: Radius in kilometers per center, or a single radius for all centers
+        chunk_size (int, optional): Points per block, bounds the size of temporary matrices
+
+    Returns:
+        numpy.ndarray: Index of the nearest center within its radius per point, -1 if none
+    """
+    _require_numpy("nearest_within")
+    points = _as_points(points)
+    centers = _as_points(centers)
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+    result = np.full(len(points), -1, dtype=np.intp)
+    if len(centers) == 0:
+        return result
+    for start in range(0, len(points), chunk_size):
+        block = points[start:start + chunk_size]
+        dist = _haversine(block[:, 0:1], block[:, 1:2], centers[:, 0], centers[:, 1], lib=np)
+        dist[dist >= radii] = np.inf
+        best = np.argmin(dist, axis=1)
+        hit = np.isfinite(dist[np.arange(len(block)), best])
+        result[start:start + len(block)] = np.where(hit, best, -1)
+    return result
+
+# GeoNames dump columns (geonameid, name, asciiname, alternatenames, latitude, longitude,
+# feature class, feature code, country code, ...)
+GEONAMES_NAME = 1
+GEONAMES_LAT = 4
+GEONAMES_LON = 5
+GEONAMES_FEATURE_CLASS = 6
+GEONAMES_COUNTRY = 8
+# Grid cell size of the gazetteer index in degrees
+GAZETTEER_CELL_DEG = 0.25
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+class GpsGazetteer:
+    """
+    Offline reverse geocoder over a GeoNames-style TSV dump.
+
+    Places are stored in flat arrays sorted by a 0.25 degree lat/lon grid cell with a
+    cell offset table, so a query only scans the cells within max_km. The index is
+    built once from the dump and memory-mapped afterwards.
+    """
+
+    _ARRAYS = ('lat', 'lon', 'country', 'name_offsets', 'names', 'cell_start')
+
+    def __init__(self, index_dir):
+        _require_numpy("GpsGazetteer")
+        self.index_dir = index_dir
+        for name in self._ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_dir, name + '.npy'), mmap_mode='r'))
+        self.nlat = int(round(180 / GAZETTEER_CELL_DEG))
+        self.nlon = int(round(360 / GAZETTEER_CELL_DEG))
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def build(cls, tsv_path, index_dir, feature_classes='P'):
+        """
+        Build the index files from a GeoNames-style TSV dump.
+
+        Args:
+            tsv_path (str): Path to the dump (e.g. cities1000.txt)
+            index_dir (str): Directory for the index files
+            feature_classes (str, optional): GeoNames feature classes to keep, None keeps all. Default is 'P' (populated places).
+
+        Returns:
+            GpsGazetteer: The memory-mapped index
+        """
+        _require_numpy("GpsGazetteer.build")
+        lats, lons, countries, names = [], [], [], []
+        with open(tsv_path, encoding='utf-8') as fh:
+            for line in fh:
+                cols = line.rstrip('\n').split('\t')
+                if len(cols) <= GEONAMES_COUNTRY:
+                    continue
+                if feature_classes and cols[GEONAMES_FEATURE_CLASS] not in feature_classes:
+                    continue
+                try:
+                    lat = float(cols[GEONAMES_LAT])
+                    lon = float(cols[GEONAMES_LON])
+                except ValueError:
+                    # Header or malformed line
+                    continue
+                lats.append(lat)
+                lons.append(lon)
+                countries.append(cols[GEONAMES_COUNTRY].encode('ascii', 'replace')[:2])
+                names.append(cols[GEONAMES_NAME].encode('utf-8'))
+
+        lat = np.array(lats, dtype=np.float32)
+        lon = np.array(lons, dtype=np.float32)
+        cells = _gazetteer_cell(lat.astype(float), lon.astype(float))
+        order = np.argsort(cells, kind='stable')
+        nlat = int(round(180 / GAZETTEER_CELL_DEG))
+        nlon = int(round(360 / GAZETTEER_CELL_DEG))
+        name_lengths = np.fromiter((len(names[i]) for i in order), dtype=np.int64, count=len(order))
+        arrays = {
+            'lat': lat[order],
+            'lon': lon[order],
+            'country': np.array(countries, dtype='S2')[order],
+            'name_offsets': np.concatenate(([0], np.cumsum(name_lengths))),
+            'names': np.frombuffer(b''.join(names[i] for i in order), dtype=np.uint8),
+            'cell_start': np.searchsorted(cells[order], np.arange(nlat * nlon + 1)),
+        }
+        os.makedirs(index_dir, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(index_dir, name + '.npy'), array)
+        return cls(index_dir)
+
+    @classmethod
+    def load(cls, tsv_path, index_dir, feature_classes='P'):
+        """Open the index in index_dir, building it first if it is missing or older than the dump."""
+        marker = os.path.join(index_dir, 'cell_start.npy')
+        if not os.path.exists(marker) or os.path.getmtime(marker) < os.path.getmtime(tsv_path):
+            return cls.build(tsv_path, index_dir, feature_classes)
+        return cls(index_dir)
+
+    def place(self, index):
+        """Return name, country and coordinates of the place at index."""
+        start, end = self.name_offsets[index], self.name_offsets[index + 1]
+        return {
+            'name': bytes(self.names[start:end]).decode('utf-8'),
+            'country': self.country[index].decode('ascii'),
+            'lat': float(self.lat[index]),
+            'lon': float(self.lon[index]),
+        }
+
+    def _ranges(self, lat, lon, max_km):
+        """Index ranges of all grid cells within max_km of a coordinate."""
+        dlat = max_km / KM_PER_DEG_LAT
+        row_lo = max(int((lat - dlat + 90) // GAZETTEER_CELL_DEG), 0)
+        row_hi = min(int((lat + dlat + 90) // GAZETTEER_CELL_DEG), self.nlat - 1)
+        col_lo, col_hi = (int(c) for c in _gazetteer_cols(lat, lon, max_km))
+        ranges = []
+        for row in range(row_lo, row_hi + 1):
+            base = row * self.nlon
+            for lo, hi in _wrap_cols(col_lo, col_hi, self.nlon):
+                start, end = self.cell_start[base + lo], self.cell_start[base + hi + 1]
+                if end > start:
+                    ranges.append((start, end))
+        return ranges
+
+    def nearest(self, coord, max_km=50.0):
+        """
+        Find the nearest place to a coordinate.
+
+        Args:
+            coord (tuple): (latitude, longitude) in decimal degrees
+            max_km (float, optional): Search radius in kilometers. Default is 50.
+
+        Returns:
+            dict: name, country, lat, lon and distance_km of the nearest place, or None
+        """
+        lat, lon = float(coord[0]), float(coord[1])
+        best, best_dist = -1, max_km
+        for start, end in self._ranges(lat, lon, max_km):
+            dist = _haversine(lat, lon, self.lat[start:end].astype(float), self.lon[start:end].astype(float), lib=np)
+            i = int(np.argmin(dist))
+            if dist[i] <= best_dist:
+                best, best_dist = start + i, float(dist[i])
+        if best < 0:
+            return None
+        result = self.place(best)
+        result['distance_km'] = best_dist
+        return result
+
+    def nearest_many(self, points, max_km=50.0, chunk_size=8192):
+        """
+        Vectorised nearest-place lookup.
+
+        Args:
+            points: N (latitude, longitude) pairs in decimal degrees
+            max_km (float, optional): Search radius in kilometers. Default is 50.
+            chunk_size (int, optional): Points per block, bounds the candidate arrays
+
+        Returns:
+            numpy.ndarray: Place index per point, -1 if no place within max_km
+            numpy.ndarray: Distance in kilometers per point, inf if no place within max_km
+        """
+        points = _as_points(points)
+        indices = np.full(len(points), -1, dtype=np.int64)
+        distances = np.full(len(points), np.inf)
+        for chunk in range(0, len(points), chunk_size):
+            block = points[chunk:chunk + chunk_size]
+            idx, dist = self._nearest_block(block, max_km)
+            indices[chunk:chunk + len(block)] = idx
+            distances[chunk:chunk + len(block)] = dist
+        return indices, distances
+
+    def _nearest_block(self, block, max_km):
+        n = len(block)
+        lat, lon = block[:, 0], block[:, 1]
+        dlat = max_km / KM_PER_DEG_LAT
+        row_lo = np.clip(((lat - dlat + 90) // GAZETTEER_CELL_DEG).astype(np.int64), 0, self.nlat - 1)
+        row_hi = np.clip(((lat + dlat + 90) // GAZETTEER_CELL_DEG).astype(np.int64), 0, self.nlat - 1)
+        col_lo, col_hi = _gazetteer_cols(lat, lon, max_km)
+        # Split column windows that cross the antimeridian into two ranges
+        full = col_hi - col_lo + 1 >= self.nlon
+        col_lo = np.where(full, 0, col_lo)
+        col_hi = np.where(full, self.nlon - 1, col_hi)
+        first_lo = np.clip(col_lo, 0, self.nlon - 1)
+        first_hi = np.clip(col_hi, 0, self.nlon - 1)
+        wrap_lo = np.where(col_lo < 0, col_lo + self.nlon, np.where(col_hi >= self.nlon, 0, 1))
+        wrap_hi = np.where(col_lo < 0, self.nlon - 1, np.where(col_hi >= self.nlon, col_hi - self.nlon, 0))
+
+        starts, ends = [], []
+        for r in range(int((row_hi - row_lo).max()) + 1 if n else 0):
+            row = row_lo + r
+            valid = row <= row_hi
+            base = np.minimum(row, self.nlat - 1) * self.nlon
+            for lo, hi in ((first_lo, first_hi), (wrap_lo, wrap_hi)):
+                ok = valid & (lo <= hi)
+                start = self.cell_start[base + np.minimum(lo, self.nlon - 1)]
+                end = self.cell_start[base + np.minimum(hi, self.nlon - 1) + 1]
+                starts.append(np.where(ok, start, 0))
+                ends.append(np.where(ok, end, 0))
+        indices = np.full(n, -1, dtype=np.int64)
+        distances = np.full(n, np.inf)
+        if not starts:
+            return indices, distances
+        # One row of candidate ranges per point, so each point's candidates stay contiguous
+        starts = np.stack(starts, axis=1).ravel()
+        lengths = np.maximum(np.stack(ends, axis=1).ravel() - starts, 0)
+        counts = lengths.reshape(n, -1).sum(axis=1)
+        total = int(counts.sum())
+        if total == 0:
+            return indices, distances
+        # Expand all (point, candidate) pairs without a Python loop
+        owner = np.repeat(np.arange(n), counts)
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        candidate = offsets + np.arange(total)
+        dist = _haversine(lat[owner], lon[owner], self.lat[candidate].astype(float), self.lon[candidate].astype(float), lib=np)
+        has_candidates = np.flatnonzero(counts)
+        group_start = (np.cumsum(counts) - counts)[has_candidates]
+        mins = np.minimum.reduceat(dist, group_start)
+        # First candidate per point that reaches its minimum
+        at_min = np.flatnonzero(dist == np.repeat(mins, counts[has_candidates]))
+        best = at_min[np.unique(owner[at_min], return_index=True)[1]]
+        hit = dist[best] <= max_km
+        indices[owner[best[hit]]] = candidate[best[hit]]
+        distances[owner[best[hit]]] = dist[best[hit]]
+        return indices, distances
+
+    def reverse_geocode_many(self, points, max_km=50.0):
+        """Return the nearest place dict (with distance_km) or None for every point."""
+        indices, distances = self.nearest_many(points, max_km)
+        result = []
+        for index, dist in zip(indices, distances):
+            if index < 0:
+                result.append(None)
+            else:
+                place = self.place(index)
+                place['distance_km'] = float(dist)
+                result.append(place)
+        return result
+
+def _gazetteer_cell(lat, lon):
+    """Grid cell id for coordinate arrays."""
+    nlat = int(round(180 / GAZETTEER_CELL_DEG))
+    nlon = int(round(360 / GAZETTEER_CELL_DEG))
+    row = np.clip(((lat + 90) // GAZETTEER_CELL_DEG).astype(np.int64), 0, nlat - 1)
+    col = ((lon + 180) // GAZETTEER_CELL_DEG).astype(np.int64) % nlon
+    return row * nlon + col
+
+def _gazetteer_cols(lat, lon, max_km):
+    """Unwrapped column window (may extend beyond the grid) covering max_km around lon."""
+    # The window has to be wide enough at the latitude closest to the pole
+    lat_pole = np.minimum(np.abs(lat) + max_km / KM_PER_DEG_LAT, 90.0)
+    cos_lat = np.cos(np.radians(lat_pole))
+    dlon = np.minimum(max_km / (KM_PER_DEG_LAT * np.maximum(cos_lat, 1e-9)), 180.0)
+    col_lo = np.floor((lon - dlon + 180) / GAZETTEER_CELL_DEG).astype(np.int64)
+    col_hi = np.floor((lon + dlon + 180) / GAZETTEER_CELL_DEG).astype(np.int64)
+    return col_lo, col_hi
+
+def _wrap_cols(col_lo, col_hi, nlon):
+    """Split an unwrapped column window into at most two ranges within 0..nlon-1."""
+    if col_hi - col_lo + 1 >= nlon:
+        return [(0, nlon - 1)]
+    if col_lo < 0:
+        return [(0, col_hi), (col_lo + nlon, nlon - 1)]
+    if col_hi >= nlon:
+        return [(col_lo, nlon - 1), (0, col_hi - nlon)]
+    return [(col_lo, col_hi)]
+
+# Bits per axis of the packed DBSCAN grid cell key
+_CELL_BITS = 21
+_CELL_BIAS = 1 << (_CELL_BITS - 1)
+
+def _gps_xyz(lat, lon):
+    """Convert coordinate arrays to points on the earth sphere in kilometers."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    cos_lat = np.cos(lat)
+    return EARTH_RADIUS_KM * np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def _xyz_to_gps(xyz):
+    """Convert a point in space to (latitude, longitude) of its projection on the sphere."""
+    x, y, z = xyz
+    return (math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x)))
+
+# Columns (dx, dy) of the 3x3x3 neighbourhood on the grid with cell side eps, nearest first.
+# The cells of one column (same x and y, z within +-1) are contiguous in key order.
+_EPS_COLUMNS = sorted(((dx, dy) for dx in range(-1, 2) for dy in range(-1, 2)), key=lambda d: (d[0] ** 2 + d[1] ** 2, d))
+# Half of the 5x5x5 neighbourhood on the grid with cell side eps/sqrt(3), so each unordered
+# pair of cells comes up once: (dx, dy, dz_lo, dz_hi), nearest columns first
+_LINK_COLUMNS = [(0, 0, 1, 2)] + sorted(((dx, dy, -2, 2) for dx in range(0, 3) for dy in range(-2, 3) if (dx, dy) > (0, 0)),
+                                        key=lambda d: (d[0] ** 2 + d[1] ** 2, d))
+
+def _cell_keys(xyz, side):
+    """Pack the grid cell (side in km) of each point into one sortable int64 key."""
+    ijk = np.floor(xyz / side).astype(np.int64) + _CELL_BIAS
+    return (ijk[:, 0] << (2 * _CELL_BITS)) | (ijk[:, 1] << _CELL_BITS) | ijk[:, 2]
+
+def _runs(sorted_keys):
+    """Distinct keys of a sorted key array with the start and length of each run."""
+    start = np.flatnonzero(np.diff(sorted_keys, prepend=sorted_keys[:1] - 1))
+    return sorted_keys[start], start, np.diff(np.append(start, len(sorted_keys)))
+
+def _column_ranges(keys, query, dx, dy, dz_lo, dz_hi):
+    """Index ranges [lo, hi) of the sorted cell keys in column (dx, dy), dz_lo..dz_hi of each query key."""
+    base = query + ((dx << (2 * _CELL_BITS)) + (dy << _CELL_BITS))
+    lo = np.searchsorted(keys, base + dz_lo)
+    # Keys are unique, so the range holds at most dz_hi - dz_lo + 1 cells: count them instead of a second search
+    last = len(keys) - 1
+    bound = base + dz_hi
+    hi = lo.copy()
+    for step in range(dz_hi - dz_lo + 1):
+        index = lo + step
+        hi += (index <= last) & (keys[np.minimum(index, last)] <= bound)
+    return lo, hi
+
+def _ranges(start, count):
+    """Concatenation of arange(start[i], start[i] + count[i]) for all i."""
+    offset = np.cumsum(count) - count
+    return np.arange(offset[-1] + count[-1] if len(count) else 0) + np.repeat(start - offset, count)
+
+def _range_distances(src, tgt, lo, hi, budget=1 << 20):
+    """
+    Squared distances from each point src[r] to the points tgt[lo[r]:hi[r]], in chunks of about budget.
+
+    Yields (rows, seg, d2): indices of the non-empty rows in the chunk, start of each row in d2
+    and the distances of all rows of the chunk.
+    """
+    rows = np.flatnonzero(hi > lo)
+    count = (hi - lo)[rows]
+    end = np.cumsum(count)
+    first = 0
+    while first < len(rows):
+        done = end[first - 1] if first else 0
+        last = max(first + 1, int(np.searchsorted(end, done + budget, side='right')))
+        chunk, chunk_count = rows[first:last], count[first:last]
+        seg = np.cumsum(chunk_count) - chunk_count
+        idx = _ranges(lo[chunk], chunk_count)
+        diff = tgt[idx] - np.repeat(src[chunk], chunk_count, axis=0)
+        yield chunk, seg, np.einsum('ij,ij->i', diff, diff)
+        first = last
+
+def _nearest_in_ranges(src, tgt, lo, hi):
+    """Index in tgt and squared distance of the nearest point of tgt[lo[r]:hi[r]] to src[r] (-1, inf if empty)."""
+    nearest = np.full(len(src), -1, dtype=np.int64)
+    best = np.full(len(src), np.inf)
+    for rows, seg, d2 in _range_distances(src, tgt, lo, hi):
+        best[rows] = np.minimum.reduceat(d2, seg)
+        count = np.diff(np.append(seg, len(d2)))
+        is_min = d2 == np.repeat(best[rows], count)
+        nearest[rows] = np.minimum.reduceat(np.where(is_min, np.arange(len(d2)), len(d2)), seg) - seg + lo[rows]
+    return nearest, best
+
+def _flatten(parent):
+    """Point every node of an array union-find directly at its root."""
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            return parent
+        parent = grand
+
+def _union(parent, a, b):
+    """Merge the sets of the node pairs (a[k], b[k]), returns the flattened parent array."""
+    while True:
+        parent = _flatten(parent)
+        root_a, root_b = parent[a], parent[b]
+        differ = root_a != root_b
+        if not differ.any():
+            return parent
+        a, b, root_a, root_b = a[differ], b[differ], root_a[differ], root_b[differ]
+        # Hook the larger root below the smallest root it is paired with
+        np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+
+def gps_cluster(points, eps_km=0.5, min_samples=5):
+    """
+    Cluster GPS coordinates with a grid-accelerated DBSCAN.
+
+    Points are placed on a 3D grid with a cell side of eps/sqrt(3), so all points of a
+    cell are neighbours of each other and cells with at least min_samples points are core
+    cells without any distance test. Neighbours of the remaining points are counted on a
+    second grid with a cell side of eps (only the 27 surrounding cells can hold them).
+    All steps work on whole arrays: neighbour cells are found per grid column with one key
+    search, distances are computed in batches and core cells are joined with an array
+    union-find, nearest cell pairs first, so most farther pairs are already joined.
+
+    Args:
+        points: N (latitude, longitude) pairs in decimal degrees
+        eps_km (float, optional): Neighbourhood radius in kilometers. Default is 0.5.
+        min_samples (int, optional): Points (including itself) within eps_km that make a point a core point. Default is 5.
+
+    Returns:
+        numpy.ndarray: Cluster label per point, 0 for the largest cluster, -1 for noise
+    """
+    _require_numpy("gps_cluster")
+    points = _as_points(points)
+    labels = np.full(len(points), -1, dtype=np.int64)
+    if len(points) == 0:
+        return labels
+    side = eps_km / math.sqrt(3)
+    if EARTH_RADIUS_KM / side >= _CELL_BIAS - 3:
+        raise ValueError(f"eps_km must be at least {math.sqrt(3) * EARTH_RADIUS_KM / (_CELL_BIAS - 3):.3f} km")
+    eps2 = eps_km ** 2
+
+    # Work on points sorted by eps grid cell, so every cell is a contiguous slice
+    xyz = _gps_xyz(points[:, 0], points[:, 1])
+    point_keys = _cell_keys(xyz, eps_km)
+    order = np.argsort(point_keys, kind='stable')
+    xyz, point_keys = xyz[order], point_keys[order]
+    fine_keys = _cell_keys(xyz, side)
+    fine_order = np.argsort(fine_keys, kind='stable')
+    cell_keys, cell_start, cell_count = _runs(point_keys)
+    cell_bounds = np.append(cell_start, len(points))
+    point_cell = np.repeat(np.arange(len(cell_keys)), cell_count)
+
+    # Core points: points of dense fine cells are core, the others are counted if their
+    # eps cell neighbourhood holds enough points, nearest columns first until they are core
+    fine_count = _runs(fine_keys[fine_order])[2]
+    core = np.empty(len(points), dtype=bool)
+    core[fine_order] = np.repeat(fine_count >= min_samples, fine_count)
+    sparse_cells = np.flatnonzero(np.bincount(point_cell[~core], minlength=len(cell_keys)))
+    total = np.zeros(len(sparse_cells), dtype=np.int64)
+    for dx, dy in _EPS_COLUMNS:
+        lo, hi = _column_ranges(cell_keys, cell_keys[sparse_cells], dx, dy, -1, 1)
+        total += cell_bounds[hi] - cell_bounds[lo]
+    candidate = np.zeros(len(cell_keys), dtype=bool)
+    candidate[sparse_cells[total >= min_samples]] = True
+    pending = np.flatnonzero(~core & candidate[point_cell])
+    found = np.zeros(len(points), dtype=np.int64)
+    for dx, dy in _EPS_COLUMNS:
+        if len(pending) == 0:
+            break
+        lo, hi = _column_ranges(cell_keys, point_keys[pending], dx, dy, -1, 1)
+        for rows, seg, d2 in _range_distances(xyz[pending], xyz, cell_bounds[lo], cell_bounds[hi]):
+            found[pending[rows]] += np.add.reduceat((d2 <= eps2).astype(np.int64), seg)
+        done = found[pending] >= min_samples
+        core[pending[done]] = True
+        pending = pending[~done]
+    core_points = np.flatnonzero(core)
+    if len(core_points) == 0:
+        return labels
+
+    # Core points grouped by fine cell, each core cell is a contiguous slice of link_xyz
+    link_points = fine_order[core[fine_order]]
+    link_keys, _, link_count = _runs(fine_keys[link_points])
+    link_bounds = np.append(0, np.cumsum(link_count))
+    link_xyz = xyz[link_points]
+    centre = np.add.reduceat(link_xyz, link_bounds[:-1], axis=0) / link_count[:, None]
+
+    # Connect neighbouring core cells that have core points within eps. A cheap probe (the
+    # core point of each cell nearest to the centre of the other) decides most pairs, the
+    # rest are tested exactly once all probes are merged, so joined pairs can be skipped.
+    parent = np.arange(len(link_keys))
+    undecided_i, undecided_j = [], []
+    for dx, dy, dz_lo, dz_hi in _LINK_COLUMNS:
+        lo, hi = _column_ranges(link_keys, link_keys, dx, dy, dz_lo, dz_hi)
+        pair_i = np.repeat(np.arange(len(link_keys)), hi - lo)
+        pair_j = _ranges(lo, hi - lo)
+        parent = _flatten(parent)
+        apart = parent[pair_i] != parent[pair_j]
+        pair_i, pair_j = pair_i[apart], pair_j[apart]
+        probe_i, _ = _nearest_in_ranges(centre[pair_j], link_xyz, link_bounds[pair_i], link_bounds[pair_i + 1])
+        probe_j, _ = _nearest_in_ranges(centre[pair_i], link_xyz, link_bounds[pair_j], link_bounds[pair_j + 1])
+        linked = _nearest_in_ranges(link_xyz[probe_i], link_xyz, link_bounds[pair_j], link_bounds[pair_j + 1])[1] <= eps2
+        linked |= _nearest_in_ranges(link_xyz[probe_j], link_xyz, link_bounds[pair_i], link_bounds[pair_i + 1])[1] <= eps2
+        parent = _union(parent, pair_i[linked], pair_j[linked])
+        undecided_i.append(pair_i[~linked])
+        undecided_j.append(pair_j[~linked])
+    undecided_i = np.concatenate(undecided_i)
+    undecided_j = np.concatenate(undecided_j)
+    for start in range(0, len(undecided_i), 4096):
+        pair_i, pair_j = undecided_i[start:start + 4096], undecided_j[start:start + 4096]
+        parent = _flatten(parent)
+        apart = parent[pair_i] != parent[pair_j]
+        pair_i, pair_j = pair_i[apart], pair_j[apart]
+        if len(pair_i) == 0:
+            continue
+        # Every core point of cell i against the core points of cell j
+        row_pair = np.repeat(np.arange(len(pair_i)), link_count[pair_i])
+        rows = _ranges(link_bounds[pair_i], link_count[pair_i])
+        _, d2 = _nearest_in_ranges(link_xyz[rows], link_xyz, link_bounds[pair_j][row_pair], link_bounds[pair_j + 1][row_pair])
+        linked = np.zeros(len(pair_i), dtype=bool)
+        linked[row_pair[d2 <= eps2]] = True
+        parent = _union(parent, pair_i[linked], pair_j[linked])
+    sorted_labels = np.full(len(points), -1, dtype=np.int64)
+    sorted_labels[link_points] = np.repeat(_flatten(parent), link_count)
+
+    # Border points join the cluster of their nearest core point within eps, searched in
+    # the eps cells around them (core points in eps cell order are contiguous per cell)
+    core_keys, core_start, _ = _runs(point_keys[core_points])
+    core_bounds = np.append(core_start, len(core_points))
+    core_xyz = xyz[core_points]
+    near_core = np.zeros(len(cell_keys), dtype=bool)
+    for dx, dy in _EPS_COLUMNS:
+        lo, hi = _column_ranges(cell_keys, core_keys, dx, dy, -1, 1)
+        near_core[_ranges(lo, hi - lo)] = True
+    border = np.flatnonzero(~core & near_core[point_cell])
+    best = np.full(len(border), np.inf)
+    nearest = np.full(len(border), -1, dtype=np.int64)
+    for dx, dy in _EPS_COLUMNS:
+        lo, hi = _column_ranges(core_keys, point_keys[border], dx, dy, -1, 1)
+        index, d2 = _nearest_in_ranges(xyz[border], core_xyz, core_bounds[lo], core_bounds[hi])
+        closer = d2 < best
+        best[closer], nearest[closer] = d2[closer], index[closer]
+    within = best <= eps2
+    sorted_labels[border[within]] = sorted_labels[core_points[nearest[within]]]
+
+    # Number clusters by size, largest first
+    clustered = sorted_labels >= 0
+    roots, inverse, sizes = np.unique(sorted_labels[clustered], return_inverse=True, return_counts=True)
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(roots))
+    sorted_labels[clustered] = rank[inverse]
+    labels[order] = sorted_labels
+    return labels
+
+def gps_cluster_dir(sourcedir, eps_km=0.5, min_samples=5, recursive=True):
+    """
+    Cluster the GPS coordinates of all JPEG images in a directory.
+
+    Args:
+        sourcedir (str): Directory containing the images
+        eps_km (float, optional): Neighbourhood radius in kilometers. Default is 0.5.
+        min_samples (int, optional): Minimum neighbourhood size of a core point. Default is 5.
+        recursive (bool, optional): Include subdirectories. Default is True.
+
+    Returns:
+        list: Paths of the geotagged images
+        numpy.ndarray: (N, 2) coordinates
+        numpy.ndarray: Cluster label per image, -1 for noise
+    """
+    _require_numpy("gps_cluster_dir")
+    paths, coords = [], []
+    for root, dirs, files in os.walk(sourcedir):
+        if not recursive:
+            dirs[:] = []
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() in ('.jpg', '.jpeg'):
+                image_coords = img_getgps(root, file)
+                if image_coords:
+                    paths.append(os.path.join(root, file))
+                    coords.append(image_coords)
+    points = np.array(coords, dtype=float).reshape(-1, 2)
+    return paths, points, gps_cluster(points, eps_km, min_samples)
+
+def gps_bowl_suggestions(points, labels, min_size=10, gazetteer=None, name='Cluster'):
+    """
+    Suggest BOWLS_GPS entries for clusters found by gps_cluster.
+
+    Args:
+        points: N (latitude, longitude) pairs in decimal degrees
+        labels: Cluster label per point as returned by gps_cluster
+        min_size (int, optional): Minimum number of points of a suggested cluster. Default is 10.
+        gazetteer (GpsGazetteer, optional): Name bowls after the nearest place instead of numbering them
+        name (str, optional): Name prefix for numbered bowls. Default is 'Cluster'.
+
+    Returns:
+        list: Lines in BOWLS_GPS format 'Name;radius=lat,lon', largest cluster first
+    """
+    _require_numpy("gps_bowl_suggestions")
+    points = _as_points(points)
+    labels = np.asarray(labels)
+    lines = []
+    used_names = set()
+    for label in range(int(labels.max()) + 1 if len(labels) else 0):
+        members = points[labels == label]
+        if len(members) < min_size:
+            continue
+        center = _xyz_to_gps(_gps_xyz(members[:, 0], members[:, 1]).mean(axis=0))
+        radius = float(_haversine(center[0], center[1], members[:, 0], members[:, 1], lib=np).max())
+        # Round the radius up to 100 m
+        radius = max(math.ceil(radius * 10) / 10, 0.1)
+        bowl_name = f"{name} {label + 1:02d}"
+        if gazetteer is not None:
+            place = gazetteer.nearest(center)
+            if place:
+                bowl_name = place['name'].replace('=', '-').replace(':', '-').replace(';', '-')
+        unique_name, i = bowl_name, 2
+        while unique_name in used_names:
+            unique_name = f"{bowl_name} {i}"
+            i += 1
+        used_names.add(unique_name)
+        lines.append(f"{unique_name};{radius:g}={center[0]:.6f},{center[1]:.6f}")
+    return lines
+
+# Default maximum time between two track points to interpolate between them (seconds)
+GPX_MAX_GAP = 300
+_gpx_time = re.compile(r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2})?$')
+_gpx_tracks = {}
+
+def _parse_gpx_time(text):
+    """Parse an ISO 8601 GPX timestamp to UTC epoch seconds (naive times are UTC)."""
+    match = _gpx_time.match(text.strip())
+    if not match:
+        return None
+    date, clock, fraction, zone = match.groups()
+    dt = datetime.strptime(f"{date} {clock}", '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    seconds = dt.timestamp() + (float('0.' + fraction) if fraction else 0.0)
+    if zone and zone != 'Z':
+        sign = -1 if zone[0] == '-' else 1
+        zone = zone[1:].replace(':', '')
+        seconds -= sign * (int(zone[:2]) * 3600 + int(zone[2:]) * 60)
+    return seconds
+
+def parse_time_offset(value):
+    """Parse a camera clock offset like '3600', '-90', '+02:00' or '-01:30:15' to seconds."""
+    value = str(value).strip()
+    if not value:
+        return 0.0
+    if ':' not in value:
+        return float(value.replace(',', '.'))
+    sign = -1 if value[0] == '-' else 1
+    parts = [float(p) for p in value.lstrip('+-').split(':')]
+    return sign * sum(p * f for p, f in zip(parts, (3600, 60, 1)))
+
+def exif_datetime_to_epoch(value, camera_offset=0):
+    """
+    Convert an EXIF DateTimeOriginal ('YYYY:MM:DD HH:MM:SS') to UTC epoch seconds.
+
+    Args:
+        value (str): EXIF date and time as recorded by the camera clock
+        camera_offset (float, optional): Camera clock minus UTC in seconds (includes the time zone). Default is 0.
+
+    Returns:
+        float: Epoch seconds or None if the value cannot be parsed
+    """
+    try:
+        dt = datetime.strptime(str(value).strip()[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=timezone.utc).timestamp() - camera_offset
+
+class GpsTrack:
+    """GPS track points as time-sorted arrays (UTC epoch seconds, latitude, longitude)."""
+
+    def __init__(self, times, lats, lons):
+        _require_numpy("GpsTrack")
+        order = np.argsort(np.asarray(times, dtype=float), kind='stable')
+        self.times = np.asarray(times, dtype=float)[order]
+        self.lats = np.asarray(lats, dtype=float)[order]
+        self.lons = np.asarray(lons, dtype=float)[order]
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate_many(self, timestamps, max_gap=GPX_MAX_GAP):
+        """
+        Interpolate positions for many timestamps with one binary search each.
+
+        Points between two track points up to max_gap seconds apart are interpolated
+        linearly, otherwise the nearest track point is used if it is within max_gap.
+
+        Returns:
+            numpy.ndarray: (N, 2) coordinates, NaN where no position is known
+        """
+        t = np.atleast_1d(np.asarray(timestamps, dtype=float))
+        result = np.full((len(t), 2), np.nan)
+        if len(self.times) == 0:
+            return result
+        last = len(self.times) - 1
+        after = np.clip(np.searchsorted(self.times, t, side='right'), 1, last) if last else np.zeros(len(t), dtype=np.intp)
+        before = np.maximum(after - 1, 0)
+        t0, t1 = self.times[before], self.times[after]
+        span = t1 - t0
+        inside = (t >= t0) & (t <= t1) & (span <= max_gap)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(span > 0, (t - t0) / span, 0.0)
+        result[inside, 0] = (self.lats[before] + frac * (self.lats[after] - self.lats[before]))[inside]
+        result[inside, 1] = (self.lons[before] + frac * (self.lons[after] - self.lons[before]))[inside]
+        # Otherwise fall back to the nearest track point within max_gap
+        nearest = np.where(np.abs(t - t0) <= np.abs(t1 - t), before, after)
+        near = ~inside & (np.abs(self.times[nearest] - t) <= max_gap)
+        result[near, 0] = self.lats[nearest[near]]
+        result[near, 1] = self.lons[nearest[near]]
+        return result
+
+    def locate(self, timestamp, max_gap=GPX_MAX_GAP):
+        """Return the (latitude, longitude) at a UTC epoch timestamp or None."""
+        lat, lon = self.locate_many([timestamp], max_gap)[0]
+        if math.isnan(lat):
+            return None
+        return (float(lat), float(lon))
+
+def gpx_load_tracks(gpxdir):
+    """
+    Load all track points of the .gpx files in a directory into one GpsTrack.
+
+    Args:
+        gpxdir (str): Directory containing GPX files (searched recursively)
+
+    Returns:
+        GpsTrack: Time-sorted track points of all files
+    """
+    from xml.etree.ElementTree import iterparse
+    times, lats, lons = [], [], []
+    for root, dirs, files in os.walk(gpxdir):
+        for file in sorted(files):
+            if not file.lower().endswith('.gpx'):
+                continue
+            try:
+                for _, elem in iterparse(os.path.join(root, file)):
+                    if elem.tag.rsplit('}', 1)[-1] != 'trkpt':
+                        continue
+                    timestamp = None
+                    for child in elem:
+                        if child.tag.rsplit('}', 1)[-1] == 'time' and child.text:
+                            timestamp = _parse_gpx_time(child.text)
+                    if timestamp is not None:
+                        times.append(timestamp)
+                        lats.append(float(elem.get('lat')))
+                        lons.append(float(elem.get('lon')))
+                    # Drop parsed points to keep memory flat on large files
+                    elem.clear()
+            except Exception as e:
+                log_message(f"gpx_load_tracks: error reading {file}: {e}", level="ERROR")
+    log_message(f"gpx_load_tracks: loaded {len(times)} track points from {gpxdir}", level="INFO")
+    return GpsTrack(times, lats, lons)
+
+def gpx_track(gpxdir):
+    """Return the GpsTrack of a directory, loading it only once per process."""
+    if gpxdir not in _gpx_tracks:
+        _gpx_tracks[gpxdir] = gpx_load_tracks(gpxdir)
+    return _gpx_tracks[gpxdir]
+
+def gpx_locate_image(sourcedir, image, track, camera_offset=0, max_gap=GPX_MAX_GAP):
+    """
+    Infer the position of an image from a GPS track and its EXIF DateTimeOriginal.
+
+    Args:
+        sourcedir (str): Directory containing the image
+        image (str): Image filename
+        track (GpsTrack): Track to correlate with
+        camera_offset (float, optional): Camera clock minus UTC in seconds. Default is 0.
+        max_gap (float, optional): Maximum interpolation gap in seconds. Default is GPX_MAX_GAP.
+
+    Returns:
+        tuple: (latitude, longitude) or None if the image time is not covered by the track
+    """
+    from wit_pytools.imgtools import img_getmeta
+    try:
+        taken = img_getmeta(sourcedir, image)['datetime_original']
+    except Exception as e:
+        log_message(f"gpx_locate_image: no metadata for {image}: {e}", level="WARNING")
+        return None
+    timestamp = exif_datetime_to_epoch(taken, camera_offset) if taken else None
+    if timestamp is None:
+        return None
+    return track.locate(timestamp, max_gap)
+
+# Default thresholds that start a new trip segment
+GPS_SEGMENT_GAP = 6 * 3600
+GPS_SEGMENT_KM = 50.0
+
+def gps_segment(times, lats, lons, max_gap_s=GPS_SEGMENT_GAP, max_dist_km=GPS_SEGMENT_KM):
+    """
+    Split a time-sorted series of photos into trips in a single vectorised pass.
+
+    A new segment starts wherever the time gap to the previous photo exceeds max_gap_s
+    or the distance to the previous photo with coordinates exceeds max_dist_km. Photos
+    without coordinates (NaN) only split on time and do not hide a jump between the
+    photos around them.
+
+    Args:
+        times (array-like): Epoch seconds, sorted ascending
+        lats (array-like): Latitudes (NaN if unknown)
+        lons (array-like): Longitudes (NaN if unknown)
+        max_gap_s (float, optional): Maximum time gap in seconds. Default is GPS_SEGMENT_GAP.
+        max_dist_km (float, optional): Maximum distance in kilometers. Default is GPS_SEGMENT_KM.
+
+    Returns:
+        numpy.ndarray: Segment id per photo, starting at 0
+    """
+    _require_numpy("gps_segment")
+    times = np.asarray(times, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if not len(times):
+        return np.zeros(0, dtype=np.int64)
+    breaks = np.diff(times) > max_gap_s
+    located = ~(np.isnan(lats) | np.isnan(lons))
+    # Index of the last photo with coordinates up to each photo, -1 before the first one
+    last = np.where(located, np.arange(len(times)), -1)
+    np.maximum.accumulate(last, out=last)
+    ref = last[:-1]
+    check = located[1:] & (ref >= 0)
+    breaks[check] |= _haversine(lats[ref[check]], lons[ref[check]], lats[1:][check], lons[1:][check], lib=np) > max_dist_km
+    return np.concatenate(([0], np.cumsum(breaks))).astype(np.int64)
+
+def gps_segment_stream(records, max_gap_s=GPS_SEGMENT_GAP, max_dist_km=GPS_SEGMENT_KM, chunk_size=65536):
+    """
+    Segment a time-sorted stream of (timestamp, lat, lon) records chunk by chunk.
+
+    Args:
+        records (iterable): (timestamp, latitude, longitude) tuples, sorted by timestamp
+        max_gap_s (float, optional): Maximum time gap in seconds. Default is GPS_SEGMENT_GAP.
+        max_dist_km (float, optional): Maximum distance in kilometers. Default is GPS_SEGMENT_KM.
+        chunk_size (int, optional): Records per vectorised pass. Default is 65536.
+
+    Yields:
+        tuple: (record, segment id)
+    """
+    # The last record and the last record with coordinates carry over into the next chunk
+    previous = previous_located = None
+    offset = 0
+    records = iter(records)
+    while True:
+        chunk = [r for _, r in zip(range(chunk_size), records)]
+        if not chunk:
+            return
+        prefix = [r for r in (previous_located, previous) if r is not None]
+        if len(prefix) == 2 and prefix[0] is prefix[1]:
+            prefix = prefix[1:]
+        block = prefix + chunk
+        arr = np.array([(r[0], np.nan if r[1] is None else r[1], np.nan if r[2] is None else r[2]) for r in block], dtype=float)
+        ids = gps_segment(arr[:, 0], arr[:, 1], arr[:, 2], max_gap_s, max_dist_km)
+        if prefix:
+            ids = ids[len(prefix):] - ids[len(prefix) - 1]
+        ids = ids + offset
+        yield from zip(chunk, ids.tolist())
+        previous, offset = chunk[-1], ids[-1]
+        located = [r for r in chunk if r[1] is not None and r[2] is not None and not (math.isnan(r[1]) or math.isnan(r[2]))]
+        if located:
+            previous_located = located[-1]
+
+def gps_segment_dir(sourcedir, max_gap_s=GPS_SEGMENT_GAP, max_dist_km=GPS_SEGMENT_KM, recursive=True, locate=None):
+    """
+    Segment all JPEG images of a directory into trips by EXIF DateTimeOriginal and GPS.
+
+    Args:
+        sourcedir (str): Directory containing the images
+        max_gap_s (float, optional): Maximum time gap in seconds. Default is GPS_SEGMENT_GAP.
+        max_dist_km (float, optional): Maximum distance in kilometers. Default is GPS_SEGMENT_KM.
+        recursive (bool, optional): Include subdirectories. Default is True.
+        locate (callable, optional): Returns (latitude, longitude) or None for (directory, file),
+            e.g. to fall back to GPX tracks. Default is img_getgps.
+
+    Returns:
+        list: Paths of the images with a capture time, sorted by time
+        numpy.ndarray: Capture times in epoch seconds (camera clock)
+        numpy.ndarray: Segment id per image
+    """
+    _require_numpy("gps_segment_dir")
+    from wit_pytools.imgtools import img_getmeta
+    records = []
+    for root, dirs, files in os.walk(sourcedir):
+        if not recursive:
+            dirs[:] = []
+        for file in files:
+            if os.path.splitext(file)[1].lower() not in ('.jpg', '.jpeg'):
+                continue
+            try:
+                taken = exif_datetime_to_epoch(img_getmeta(root, file)['datetime_original'] or '')
+            except Exception as e:
+                log_message(f"gps_segment_dir: no metadata for {file}: {e}", level="WARNING")
+                continue
+            if taken is None:
+                continue
+            image_coords = (locate or img_getgps)(root, file) or (np.nan, np.nan)
+            records.append((taken, image_coords[0], image_coords[1], os.path.join(root, file)))
+    records.sort(key=lambda r: (r[0], r[3]))
+    arr = np.array([r[:3] for r in records], dtype=float).reshape(-1, 3)
+    return [r[3] for r in records], arr[:, 0], gps_segment(arr[:, 0], arr[:, 1], arr[:, 2], max_gap_s, max_dist_km)
+
+# Maximum number of entries per node of the polygon bounding box index
+POLYGON_NODE_SIZE = 16
+
+def gps_parse_polygon(value):
+    """
+    Parse a polygon given as 'lat,lon;lat,lon;...'. Holes are further rings separated by '|'.
+
+    Args:
+        value (str): Polygon vertices, at least three per ring
+
+    Returns:
+        list: Rings of the polygon, each a list of (latitude, longitude)
+    """
+    rings = []
+    for ring_str in value.split('|'):
+        ring = []
+        for crit in ring_str.split(';'):
+            crit = crit.replace(' ', '')
+            if not crit:
+                continue
+            parts = crit.split(',')
+            if len(parts) != 2:
+                raise ValueError(f"Invalid polygon vertex: {crit}")
+            ring.append((float(parts[0]), float(parts[1])))
+        if len(ring) < 3:
+            raise ValueError(f"Polygon ring needs at least 3 vertices: {ring_str}")
+        rings.append(ring)
+    return rings
+
+def gps_load_geojson(path):
+    """
+    Load the Polygon and MultiPolygon geometries of a GeoJSON file.
+
+    Args:
+        path (str): GeoJSON file (FeatureCollection, Feature or bare geometry)
+
+    Returns:
+        list: Polygons, each a list of rings of (latitude, longitude)
+    """
+    import json
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    geometries = []
+    if data.get('type') == 'FeatureCollection':
+        geometries = [feature.get('geometry') for feature in data.get('features', [])]
+    elif data.get('type') == 'Feature':
+        geometries = [data.get('geometry')]
+    else:
+        geometries = [data]
+    polygons = []
+    for geometry in geometries:
+        if not geometry:
+            continue
+        if geometry.get('type') == 'Polygon':
+            parts = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            parts = geometry['coordinates']
+        else:
+            continue
+        for rings in parts:
+            # GeoJSON positions are [longitude, latitude]
+            polygons.append([[(float(p[1]), float(p[0])) for p in ring] for ring in rings if len(ring) >= 3])
+    return [rings for rings in polygons if rings]
+
+def _point_in_edges(lat, lon, edges):
+    """Even-odd ray casting of a point against the edges (lat1, lon1, lat2, lon2) of all rings."""
+    inside = False
+    for lat1, lon1, lat2, lon2 in edges:
+        if (lat1 > lat) != (lat2 > lat) and lon < (lon2 - lon1) * (lat - lat1) / (lat2 - lat1) + lon1:
+            inside = not inside
+    return inside
+
+def _bbox_contains(bbox, lat, lon):
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]
+
+class GpsPolygonIndex:
+    """
+    Named polygons with precomputed bounding boxes in a two level STR-packed index.
+
+    A point is only ray cast against polygons whose bounding box contains it. When
+    polygons overlap the first one (config order) wins.
+    """
+
+    def __init__(self, polygons):
+        """
+        Args:
+            polygons (list): (name, rings) tuples, rings as returned by gps_parse_polygon
+        """
+        self.names = []
+        self.bboxes = []
+        self.edges = []
+        self._edge_arrays = {}
+        for name, rings in polygons:
+            edges = []
+            for ring in rings:
+                for (lat1, lon1), (lat2, lon2) in zip(ring, ring[1:] + ring[:1]):
+                    if (lat1, lon1) != (lat2, lon2):
+                        edges.append((lat1, lon1, lat2, lon2))
+            lats = [p[0] for ring in rings for p in ring]
+            lons = [p[1] for ring in rings for p in ring]
+            self.names.append(name)
+            self.bboxes.append((min(lats), min(lons), max(lats), max(lons)))
+            self.edges.append(edges)
+        self.nodes = self._pack()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _pack(self):
+        """Sort-Tile-Recursive packing of the polygon bounding boxes into nodes."""
+        order = sorted(range(len(self.bboxes)), key=lambda i: self.bboxes[i][1] + self.bboxes[i][3])
+        slices = max(1, math.ceil(math.sqrt(math.ceil(len(order) / POLYGON_NODE_SIZE))))
+        slice_size = slices * POLYGON_NODE_SIZE
+        nodes = []
+        for s in range(0, len(order), slice_size):
+            tile = sorted(order[s:s + slice_size], key=lambda i: self.bboxes[i][0] + self.bboxes[i][2])
+            for n in range(0, len(tile), POLYGON_NODE_SIZE):
+                members = sorted(tile[n:n + POLYGON_NODE_SIZE])
+                boxes = [self.bboxes[i] for i in members]
+                bbox = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                        max(b[2] for b in boxes), max(b[3] for b in boxes))
+                nodes.append((bbox, members))
+        return nodes
+
+    def locate(self, coord):
+        """
+        Find the polygon containing a point.
+
+        Args:
+            coord (tuple): (latitude, longitude)
+
+        Returns:
+            int: Index of the first polygon containing the point or -1
+        """
+        lat, lon = float(coord[0]), float(coord[1])
+        candidates = [i for bbox, members in self.nodes if _bbox_contains(bbox, lat, lon)
+                      for i in members if _bbox_contains(self.bboxes[i], lat, lon)]
+        for i in sorted(candidates):
+            if _point_in_edges(lat, lon, self.edges[i]):
+                return i
+        return -1
+
+    def name(self, coord):
+        """Return the name of the polygon containing a point or None."""
+        index = self.locate(coord)
+        return self.names[index] if index >= 0 else None
+
+    def _contains_many(self, index, lat, lon, chunk_size=1 << 20):
+        if index not in self._edge_arrays:
+            self._edge_arrays[index] = np.array(self.edges[index], dtype=float).reshape(-1, 4).T
+        lat1, lon1, lat2, lon2 = (e[None, :] for e in self._edge_arrays[index])
+        inside = np.empty(len(lat), dtype=bool)
+        step = max(1, chunk_size // max(1, lat1.shape[1]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for start in range(0, len(lat), step):
+                plat = lat[start:start + step, None]
+                plon = lon[start:start + step, None]
+                crosses = ((lat1 > plat) != (lat2 > plat)) & (plon < (lon2 - lon1) * (plat - lat1) / (lat2 - lat1) + lon1)
+                inside[start:start + step] = np.count_nonzero(crosses, axis=1) % 2 == 1
+        return inside
+
+    def locate_many(self, points):
+        """
+        Classify many points at once.
+
+        Args:
+            points (array-like): Sequence of (latitude, longitude) pairs
+
+        Returns:
+            numpy.ndarray: Index of the first polygon containing each point or -1
+        """
+        _require_numpy("GpsPolygonIndex.locate_many")
+        pts = _as_points(points)
+        lat, lon = pts[:, 0], pts[:, 1]
+        none = len(self.names)
+        result = np.full(len(pts), none, dtype=np.int64)
+        for bbox, members in self.nodes:
+            in_node = np.flatnonzero((lat >= bbox[0]) & (lat <= bbox[2]) & (lon >= bbox[1]) & (lon <= bbox[3]))
+            if not in_node.size:
+                continue
+            for i in members:
+                b = self.bboxes[i]
+                sel = in_node[(lat[in_node] >= b[0]) & (lat[in_node] <= b[2]) &
+                              (lon[in_node] >= b[1]) & (lon[in_node] <= b[3]) & (result[in_node] > i)]
+                if sel.size:
+                    result[sel[self._contains_many(i, lat[sel], lon[sel])]] = i
+        result[result == none] = -1
+        return result
+
+@functools.lru_cache(maxsize=8)
+def gps_polygon_index(items):
+    """
+    Compile BOWLS_GPS_POLYGONS entries into a GpsPolygonIndex (cached per config).
+
+    Args:
+        items (tuple): (bowl, value) pairs; value is 'lat,lon;lat,lon;...' or a GeoJSON file
+
+    Returns:
+        GpsPolygonIndex: Index whose names are the bowl names, in config order
+    """
+    polygons = []
+    for bowl, value in items:
+        value = value.strip()
+        if not value or "!DEFAULT" in value:
+            continue
+        bowl_name = bowl.split(';')[0]
+        try:
+            if value.lower().endswith(('.geojson', '.json')):
+                polygons.extend((bowl_name, rings) for rings in gps_load_geojson(value))
+            else:
+                polygons.append((bowl_name, gps_parse_polygon(value)))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log_message(f"gps_polygon_index: invalid polygon bowl {bowl}: {e}", level="ERROR")
+    log_message(f"gps_polygon_index: compiled {len(polygons)} polygons", level="DEBUG")
+    return GpsPolygonIndex(polygons)
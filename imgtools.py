@@ -1,12 +1,18 @@
 import os
-from wit_pytools.systools import checkfile
-from PIL import Image
+from wit_pytools.systools import checkfile, sqlite_connect, sqlite_shared
+from PIL import Image, ImageOps, PngImagePlugin
 import shutil
+import tempfile
 from io import BytesIO
 
 # Use absolute paths based on the script location
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# EXIF tag ids used by the metadata cache
+EXIF_ORIENTATION = 274
+EXIF_DATETIMEORIGINAL = 36867
+EXIF_GPSINFO = 34853
+
 def jpg_compress(input_path, output_path=None, quality=85, maintain_exif=True, min_size_reduction=0.1, calc=False):
     """
     Compress a JPG image to a different quality level.
@@ -117,6 +123,148 @@ def jpg_compress(input_path, output_path=None, quality=85, maintain_exif=True, m
     except Exception as e:
         raise ValueError(f"Error processing image: {str(e)}")
 
+def _thumbnail_tag(size, quality):
+    """Comment stored in a thumbnail to recognise the settings it was made with."""
+    return f"wit_pytools thumbnail {size[0]}x{size[1]}" + (f" q{quality}" if quality is not None else "")
+
+def _thumbnail_current(output_path, tag, size):
+    """Check if an existing thumbnail was made with the settings described by tag."""
+    try:
+        with Image.open(output_path) as thumb:
+            stored = thumb.info.get('comment', thumb.info.get('Comment'))
+            if stored is not None:
+                if isinstance(stored, bytes):
+                    stored = stored.decode('utf-8', errors='replace')
+                return stored == tag
+            # Formats without a comment: the thumbnail has to fit into size and reach one of its bounds
+            width, height = thumb.size
+            return width <= size[0] and height <= size[1] and (width == size[0] or height == size[1])
+    except Exception:
+        return False
+
+def _thumbnail_up_to_date(input_path, output_path, tag, size):
+    """Check if output_path is newer than its source and was made with the same settings."""
+    return (os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+            and _thumbnail_current(output_path, tag, size))
+
+def _default_file_mode():
+    """Mode of a newly created file under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+def img_thumbnail(input_path, output_path, size=(320, 320), quality=85, overwrite=False):
+    """
+    Create a downscaled preview of an image.
+
+    JPEG sources are decoded in draft mode (DCT scaling), so a large photo is decoded at
+    up to 1/8 of its size before the final resize. The output is written atomically.
+    JPEG and PNG thumbnails record size and quality in their comment, so an existing
+    thumbnail made with other settings is recreated.
+
+    Args:
+        input_path (str): Path to the input image
+        output_path (str): Path to save the thumbnail. The format follows the file extension.
+        size (tuple, optional): Maximum (width, height) of the thumbnail. Default is (320, 320).
+        quality (int, optional): JPEG quality, from 1 (worst) to 95 (best). Default is 85.
+        overwrite (bool, optional): Recreate the thumbnail even if it is up to date. Default is False.
+
+    Returns:
+        str: Path to the thumbnail
+        bool: True if the thumbnail was written, False if it was already up to date
+
+    Raises:
+        FileNotFoundError: If the input file doesn't exist
+        ValueError: If the input file is not a valid image
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    ext = os.path.splitext(output_path)[1].lower()
+    tag = _thumbnail_tag(size, quality if ext in ('.jpg', '.jpeg') else None)
+    if not overwrite and _thumbnail_up_to_date(input_path, output_path, tag, size):
+        return output_path, False
+
+    outdir = os.path.dirname(output_path) or '.'
+    os.makedirs(outdir, exist_ok=True)
+    fd, temp_output = tempfile.mkstemp(prefix='.tmp_', suffix=os.path.splitext(output_path)[1], dir=outdir)
+    os.close(fd)
+    try:
+        with Image.open(input_path) as img:
+            # Let the JPEG decoder scale down while decoding
+            img.draft('RGB', size)
+            thumb = ImageOps.exif_transpose(img)
+            thumb.thumbnail(size, Image.LANCZOS)
+            save_kwargs = {}
+            if ext in ('.jpg', '.jpeg'):
+                if thumb.mode not in ('RGB', 'L'):
+                    thumb = thumb.convert('RGB')
+                save_kwargs["quality"] = quality
+                save_kwargs["comment"] = tag
+            elif ext == '.png':
+                pnginfo = PngImagePlugin.PngInfo()
+                pnginfo.add_text('Comment', tag)
+                save_kwargs["pnginfo"] = pnginfo
+            thumb.save(temp_output, **save_kwargs)
+        # mkstemp creates the file readable for the owner only
+        os.chmod(temp_output, _default_file_mode())
+        os.replace(temp_output, output_path)
+        return output_path, True
+    except Exception as e:
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+        raise ValueError(f"Error creating thumbnail: {str(e)}")
+
+def _img_thumbnail_job(job):
+    """Process pool worker for img_resize_batch."""
+    input_path, output_path, size, quality, overwrite = job
+    try:
+        _, written = img_thumbnail(input_path, output_path, size=size, quality=quality, overwrite=overwrite)
+        return output_path, 'created' if written else 'skipped'
+    except Exception as e:
+        return output_path, f"error: {e}"
+
+def img_resize_batch(input_paths, outdir, size=(320, 320), quality=85, workers=None, overwrite=False):
+    """
+    Create thumbnails for many images on a process pool.
+
+    Args:
+        input_paths (list): Paths of the input images
+        outdir (str): Directory for the thumbnails (same file names as the inputs)
+        size (tuple, optional): Maximum (width, height) of the thumbnails. Default is (320, 320).
+        quality (int, optional): JPEG quality, from 1 (worst) to 95 (best). Default is 85.
+        workers (int, optional): Number of worker processes. Default is the number of CPUs.
+        overwrite (bool, optional): Recreate thumbnails even if they are up to date. Default is False.
+
+    Returns:
+        list: (output_path, status) per input in input order, status is 'created', 'skipped' or 'error: ...'
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    results = [None] * len(input_paths)
+    jobs = []
+    for index, input_path in enumerate(input_paths):
+        output_path = os.path.join(outdir, os.path.basename(input_path))
+        # Check up-to-date targets here (same test as img_thumbnail) to avoid sending them to the pool
+        jpeg = os.path.splitext(output_path)[1].lower() in ('.jpg', '.jpeg')
+        if (not overwrite and os.path.exists(input_path)
+                and _thumbnail_up_to_date(input_path, output_path, _thumbnail_tag(size, quality if jpeg else None), size)):
+            results[index] = (output_path, 'skipped')
+        else:
+            jobs.append((index, (input_path, output_path, tuple(size), quality, overwrite)))
+    if not jobs:
+        return results
+    if workers == 1 or len(jobs) == 1:
+        done = map(_img_thumbnail_job, [job for _, job in jobs])
+        for (index, _), result in zip(jobs, done):
+            results[index] = result
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        done = executor.map(_img_thumbnail_job, [job for _, job in jobs], chunksize=chunksize)
+        for (index, _), result in zip(jobs, done):
+            results[index] = result
+    return results
+
 def png2jpg(input_path, output_path=None, quality=85, background_color=(255, 255, 255)):
     """
     Convert a PNG image to JPG format.
@@ -355,6 +503,132 @@ def img_getexif(sourcedir, image):
     except Exception as e:
         raise ValueError(f"Error getting EXIF data: {str(e)}")
 
+def _gps_from_exif(gps_info, image):
+    """Convert an EXIF GPSInfo dictionary to (latitude, longitude) or None."""
+    from wit_pytools.gpstools import _convert_to_decimal_degrees
+    lat_ref = gps_info.get(1, 'N')
+    lat_data = gps_info.get(2)
+    lon_ref = gps_info.get(3, 'E')
+    lon_data = gps_info.get(4)
+    if not (isinstance(lat_data, (list, tuple)) and len(lat_data) == 3 and isinstance(lon_data, (list, tuple)) and len(lon_data) == 3):
+        print(f"Invalid GPS data structure in file {image}: lat_data={lat_data}, lon_data={lon_data}")
+        return None
+    latitude = _convert_to_decimal_degrees(lat_data, lat_ref)
+    longitude = _convert_to_decimal_degrees(lon_data, lon_ref)
+    if latitude is not None and longitude is not None:
+        # Check if coordinates are (0,0) and treat as no GPS data
+        if abs(latitude) < 0.000001 and abs(longitude) < 0.000001:
+            print(f"Image {image} has GPS coordinates of (0,0), treating as no GPS data")
+            return None
+        return (latitude, longitude)
+    return None
+
+def _img_readmeta(path):
+    """Read GPS, DateTimeOriginal, dimensions and orientation from an image file in one pass."""
+    with Image.open(path) as img:
+        width, height = img.size
+        getexif = getattr(img, '_getexif', None)
+        exif_data = (getexif() if getexif else None) or {}
+    gps = None
+    if isinstance(exif_data.get(EXIF_GPSINFO), dict):
+        gps = _gps_from_exif(exif_data[EXIF_GPSINFO], os.path.basename(path))
+    datetime_original = exif_data.get(EXIF_DATETIMEORIGINAL)
+    orientation = exif_data.get(EXIF_ORIENTATION)
+    return {
+        'gps': gps,
+        'datetime_original': str(datetime_original).strip('\x00 ') if datetime_original else None,
+        'width': width,
+        'height': height,
+        'orientation': int(orientation) if isinstance(orientation, int) else None,
+    }
+
+def _sqlite_int(value):
+    """Map unsigned 64-bit stat values (inode numbers) into sqlite's signed INTEGER range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+class ImgMetaCache:
+    """
+    Sqlite-backed cache of image metadata (GPS, DateTimeOriginal, dimensions, orientation).
+
+    Entries are keyed by device and inode and are only valid while size and mtime
+    still match, so renamed files (e.g. the _nogps rename) keep their entry.
+    Use ':memory:' for a per-process cache or a file path to share it across runs.
+    """
+
+    def __init__(self, dbpath=':memory:'):
+        self.dbpath = dbpath
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite_connect(dbpath, (
+            "CREATE TABLE IF NOT EXISTS imgmeta ("
+            " dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL,"
+            " lat REAL, lon REAL, datetime_original TEXT, width INTEGER, height INTEGER, orientation INTEGER,"
+            " PRIMARY KEY (dev, ino))",))
+
+    def getmeta(self, path):
+        """Return the metadata dict for path, reading the file only on a cache miss."""
+        st = os.stat(path)
+        key = (_sqlite_int(st.st_dev), _sqlite_int(st.st_ino))
+        row = self._conn.execute(
+            "SELECT size, mtime, lat, lon, datetime_original, width, height, orientation"
+            " FROM imgmeta WHERE dev=? AND ino=?", key).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            self.hits += 1
+            return {
+                'gps': (row[2], row[3]) if row[2] is not None and row[3] is not None else None,
+                'datetime_original': row[4],
+                'width': row[5],
+                'height': row[6],
+                'orientation': row[7],
+            }
+        self.misses += 1
+        meta = _img_readmeta(path)
+        gps = meta['gps'] or (None, None)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO imgmeta VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (st.st_size, st.st_mtime_ns, gps[0], gps[1], meta['datetime_original'],
+                   meta['width'], meta['height'], meta['orientation']))
+        self._conn.commit()
+        return meta
+
+    def stats(self):
+        """Return lookup statistics: hits, misses, hit_rate and number of cached entries."""
+        lookups = self.hits + self.misses
+        entries = self._conn.execute("SELECT COUNT(*) FROM imgmeta").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
+
+    def close(self):
+        self._conn.close()
+
+def img_metacache(dbpath=None):
+    """
+    Return the shared image metadata cache.
+
+    Args:
+        dbpath (str, optional): Sqlite file to persist the cache across runs. If None, the
+            current cache is returned (an in-memory cache is created on first use).
+    """
+    return sqlite_shared(ImgMetaCache, dbpath)
+
+def img_getmeta(sourcedir, image):
+    """
+    Return cached image metadata.
+
+    Args:
+        sourcedir (str): Directory containing the image
+        image (str): Image filename
+
+    Returns:
+        dict: gps ((lat, lon) or None), datetime_original, width, height, orientation
+    """
+    checkfile(sourcedir, image)
+    return img_metacache().getmeta(os.path.join(sourcedir, image))
+
 def img_getgps(sourcedir, image):
     """
     Extract GPS coordinates from an image's EXIF data.
@@ -366,26 +640,8 @@ def img_getgps(sourcedir, image):
     Returns:
         tuple: (latitude, longitude) or None if GPS data not found or coordinates are (0,0)
     """
-    from wit_pytools.gpstools import _convert_to_decimal_degrees    
     try:
-        exif_data = img_getexif(sourcedir, image)
-        if exif_data and 'GPSInfo' in exif_data:
-            gps_info = exif_data['GPSInfo']
-            lat_ref = gps_info.get(1, 'N')
-            lat_data = gps_info.get(2)
-            lon_ref = gps_info.get(3, 'E')
-            lon_data = gps_info.get(4)
-            if not (isinstance(lat_data, (list, tuple)) and len(lat_data) == 3 and isinstance(lon_data, (list, tuple)) and len(lon_data) == 3):
-                print(f"Invalid GPS data structure in file {image}: lat_data={lat_data}, lon_data={lon_data}")
-                return None
-            latitude = _convert_to_decimal_degrees(lat_data, lat_ref)
-            longitude = _convert_to_decimal_degrees(lon_data, lon_ref)
-            if latitude is not None and longitude is not None:
-                # Check if coordinates are (0,0) and treat as no GPS data
-                if abs(latitude) < 0.000001 and abs(longitude) < 0.000001:
-                    print(f"Image {image} has GPS coordinates of (0,0), treating as no GPS data")
-                    return None
-                return (latitude, longitude)
+        return img_getmeta(sourcedir, image)['gps']
     except Exception as e:
         print(f"Error extracting GPS data: {e}")
     return None
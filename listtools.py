@@ -2,13 +2,81 @@
 from wit_pytools.sanitizers import prepregex  # noqa: F401
 
 import csv
+import functools
+import io
+import itertools
+import mmap
 import os
-from typing import Any, Dict, Optional, List
+import re
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, List
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from eliot import log_message
 from wit_pytools.systools import checkfile
 
+try:  # Optional dependency that is only needed for NumPy/pandas finance columns
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - exercised in environments without numpy
+    np = None
+
+_DATE_KEYS = {"date", "booking_date", "transaction_date"}
+_AMOUNT_KEYS = {"amount", "value", "sum", "credit", "debit"}
+
+
+_CSV_DEFAULTS: Dict[str, Any] = {
+    "delimiter": ",",
+    "encoding": "utf-8",
+    "has_header": True,
+    "skip_header": True,
+    "strip": True,
+}
+
+
+def _iter_csv_rows(path: str, cfg: Dict[str, Any]) -> Iterator[List[str]]:
+    """Yield the rows of a CSV file according to the merged settings."""
+    with open(path, mode="r", encoding=cfg["encoding"], newline="") as fh:
+        reader = csv.reader(fh, delimiter=cfg["delimiter"], quotechar=cfg.get("quotechar", '"'))
+        if cfg["has_header"] and cfg["skip_header"]:
+            next(reader, None)
+        if cfg["strip"]:
+            for row in reader:
+                yield [c.strip() if isinstance(c, str) else c for c in row]
+        else:
+            yield from reader
+
+
+def read_csv_iter(
+    sourcedir: str,
+    filename: str,
+    settings: Optional[Dict[str, Any]] = None,
+) -> Iterator[List[str]]:
+    """Lazily read a CSV file row by row (Iterator[List[str]]).
+
+    Takes the same settings as read_csv_to_list. The file is checked
+    immediately, rows are only read as the iterator is consumed, so memory
+    stays constant regardless of the file size.
+    """
+    # Validate file exists
+    checkfile(sourcedir, filename)
+    return _iter_csv_rows(os.path.join(sourcedir, filename), {**_CSV_DEFAULTS, **(settings or {})})
+
+
+def read_csv_chunks(
+    sourcedir: str,
+    filename: str,
+    settings: Optional[Dict[str, Any]] = None,
+    size: int = 10000,
+) -> Iterator[List[List[str]]]:
+    """Lazily read a CSV file in batches of up to size rows (Iterator[List[List[str]]]).
+
+    Takes the same settings as read_csv_to_list.
+    """
+    if size < 1:
+        raise ValueError("read_csv_chunks: size must be at least 1")
+    rows = read_csv_iter(sourcedir, filename, settings)
+    return iter(lambda: list(itertools.islice(rows, size)), [])
+
 
 def read_csv_to_list(
     sourcedir: str,
@@ -20,32 +88,11 @@ def read_csv_to_list(
     Settings keys: delimiter, encoding, has_header, strip, skip_header
     - Always returns List[List[str]]
     - If has_header is True and skip_header is True, the first row is skipped
+    - Use read_csv_iter or read_csv_chunks for files that do not fit into memory
     """
-    # Validate file exists
-    checkfile(sourcedir, filename)
-
     path = os.path.join(sourcedir, filename)
-    defaults: Dict[str, Any] = {
-        "delimiter": ",",
-        "encoding": "utf-8",
-        "has_header": True,
-        "skip_header": True,
-        "strip": True,
-    }
-    cfg = {**defaults, **(settings or {})}
-    rows = []
     try:
-        with open(path, mode="r", encoding=cfg["encoding"], newline="") as fh:
-            reader = csv.reader(fh, delimiter=cfg["delimiter"])
-            first = True
-            for row in reader:
-                if first and cfg["has_header"] and cfg["skip_header"]:
-                    first = False
-                    continue
-                first = False
-                if cfg["strip"]:
-                    row = [c.strip() if isinstance(c, str) else c for c in row]
-                rows.append(row)
+        rows = list(read_csv_iter(sourcedir, filename, settings))
         log_message(
             f"read_csv_to_list: loaded {len(rows)} rows from '{path}'",
             level="INFO",
@@ -56,6 +103,38 @@ def read_csv_to_list(
         raise
 
 
+def write_csv_rows(
+    targetdir: str,
+    filename: str,
+    rows: Iterable[Any],
+    settings: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Write rows (dicts or lists) to a CSV file as they are produced.
+
+    Settings keys: delimiter, encoding, has_header
+    - Dict rows are written with a header of their keys (taken from the first row)
+    - None values are written as empty fields
+    - Returns the number of rows written (without header)
+    """
+    cfg = {**_CSV_DEFAULTS, **(settings or {})}
+    path = os.path.join(targetdir, filename)
+    count = 0
+    with open(path, mode="w", encoding=cfg["encoding"], newline="") as fh:
+        writer = csv.writer(fh, delimiter=cfg["delimiter"])
+        keys: Optional[List[Any]] = None
+        for row in rows:
+            if isinstance(row, dict):
+                if keys is None:
+                    keys = list(row)
+                    if cfg["has_header"]:
+                        writer.writerow(keys)
+                row = [row.get(k) for k in keys]
+            writer.writerow(["" if v is None else v for v in row])
+            count += 1
+    log_message(f"write_csv_rows: wrote {count} rows to '{path}'", level="INFO")
+    return count
+
+
 def _parse_amount(value: Optional[str], decimal_sep: Optional[str], thousands_sep: Optional[str]) -> Optional[Decimal]:
     """Parse a monetary string to Decimal based on separators."""
     if value is None:
@@ -86,9 +165,17 @@ def _format_date(value: Optional[str], in_fmt: Optional[str], out_fmt: Optional[
         return None
 
 
-def format_finance_rows(rows: List[Any], preset: Dict[str, Any]) -> List[Dict[str, Any]]:
+def format_finance_rows(rows: Iterable[Any], preset: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Transform rows using formatting rules defined in the preset."""
-    out: List[Dict[str, Any]] = []
+    return list(iter_finance_rows(rows, preset))
+
+
+def iter_finance_rows(rows: Iterable[Any], preset: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Lazily transform rows using formatting rules defined in the preset.
+
+    Same rules as format_finance_rows, rows are consumed and yielded one at a
+    time, e.g. from read_csv_iter into write_csv_rows.
+    """
     field_map = preset.get("field_map") or {}
     # Use the preset's date_format for both parsing and output formatting
     date_in_fmt: Optional[str] = preset.get("date_format")
@@ -110,9 +197,9 @@ def format_finance_rows(rows: List[Any], preset: Dict[str, Any]) -> List[Dict[st
                     val = r[in_key] if isinstance(r, list) and in_key < len(r) else None
                 else:
                     val = r.get(in_key) if isinstance(r, dict) else None
-                if out_key.lower() in {"date", "booking_date", "transaction_date"}:
+                if out_key.lower() in _DATE_KEYS:
                     val = _format_date(str(val) if val is not None else None, date_in_fmt, date_out_fmt)
-                elif out_key.lower() in {"amount", "value", "sum", "credit", "debit"}:
+                elif out_key.lower() in _AMOUNT_KEYS:
                     val = _parse_amount(str(val) if val is not None else None, dec_sep, thou_sep)
                 new_row[out_key] = val
         else:
@@ -128,6 +215,257 @@ def format_finance_rows(rows: List[Any], preset: Dict[str, Any]) -> List[Dict[st
                 new_row[str(amount_field_index_fallback)] = _parse_amount(str(r[amount_field_index_fallback]), dec_sep, thou_sep)
         if currency and "currency" not in new_row:
             new_row["currency"] = currency
-        out.append(new_row)
+        yield new_row
+
+
+def _amount_parser(decimal_sep: Optional[str], thousands_sep: Optional[str]) -> Callable[[str], Optional[Decimal]]:
+    """Return a parser equivalent to _parse_amount with the separators resolved once.
+
+    Single-character separators are handled by one precompiled str.translate
+    table instead of two replace calls, others fall back to _parse_amount.
+    """
+    if (thousands_sep and len(thousands_sep) != 1) or (decimal_sep and len(decimal_sep) != 1):
+        return lambda s: _parse_amount(s, decimal_sep, thousands_sep)
+    table: Dict[int, Optional[str]] = {}
+    if decimal_sep and decimal_sep != ".":
+        table[ord(decimal_sep)] = "."
+    if thousands_sep:
+        # Thousands separators are removed before the decimal separator is replaced
+        table[ord(thousands_sep)] = None
+
+    def parse(s: str) -> Optional[Decimal]:
+        try:
+            return Decimal(s.strip().translate(table))
+        except (InvalidOperation, ValueError):
+            return None
+
+    return parse
+
+
+def _convert_column(values: List[Any], convert: Callable[[str], Any]) -> List[Any]:
+    """Apply convert(str(value)) to a column, None stays None, each distinct value is converted once."""
+    distinct = dict.fromkeys(values)
+    # Distinct values are keys, so only strings and None are safe (1 == True == 1.0 would collide)
+    if all(v is None or type(v) is str for v in distinct):
+        for v in distinct:
+            distinct[v] = convert(v) if v is not None else None
+        return list(map(distinct.__getitem__, values))
+    return [convert(str(v)) if v is not None else None for v in values]
+
+
+def format_finance_columns(rows: Iterable[Any], preset: Dict[str, Any], output: str = "lists") -> Any:
+    """Transform rows into columns using formatting rules defined in the preset.
+
+    Gives the same values as format_finance_rows, column by column: the
+    field map is resolved once into per-column converters, dates are parsed
+    once per distinct date string and amounts with a precompiled separator
+    translation. Presets without field_map are formatted row by row and then
+    split into columns (missing fields are None).
+
+    Args:
+        rows: List or dict rows, e.g. from read_csv_to_list or read_csv_iter
+        preset: Formatting preset, see format_finance_rows
+        output: "lists" (dict of lists), "numpy" (dict of arrays, amounts as
+            float64 with NaN for unparsable values, other columns as object)
+            or "pandas" (DataFrame of the numpy columns)
+
+    Returns:
+        Dict[str, List[Any]] for "lists", Dict[str, numpy.ndarray] for "numpy"
+        or pandas.DataFrame for "pandas"
+
+    Raises:
+        ValueError: If output is not one of the supported values
+        RuntimeError: If numpy or pandas is required but not installed
+    """
+    if output not in ("lists", "numpy", "pandas"):
+        raise ValueError(f"format_finance_columns: unsupported output '{output}'")
+    rows = rows if isinstance(rows, list) else list(rows)
+    field_map = preset.get("field_map") or {}
+    currency: Optional[str] = preset.get("currency")
+    columns: Dict[str, List[Any]] = {}
+    amount_columns: List[str] = []
+
+    if field_map:
+        date_fmt: Optional[str] = preset.get("date_format")
+        convert_date = lambda s: _format_date(s, date_fmt, date_fmt)  # noqa: E731
+        convert_amount = _amount_parser(preset.get("decimal_separator"), preset.get("thousands_separator"))
+        for out_key, in_key in field_map.items():
+            # Support mapping by column name (dict rows) or index (list rows)
+            if isinstance(in_key, int):
+                values = [r[in_key] if isinstance(r, list) and in_key < len(r) else None for r in rows]
+            else:
+                values = [r.get(in_key) if isinstance(r, dict) else None for r in rows]
+            if out_key.lower() in _DATE_KEYS:
+                values = _convert_column(values, convert_date)
+            elif out_key.lower() in _AMOUNT_KEYS:
+                values = _convert_column(values, convert_amount)
+                amount_columns.append(out_key)
+            columns[out_key] = values
+        if currency and "currency" not in columns:
+            columns["currency"] = [currency] * len(rows)
+    else:
+        formatted = list(iter_finance_rows(rows, preset))
+        keys = list(dict.fromkeys(k for row in formatted for k in row))
+        columns = {k: [row.get(k) for row in formatted] for k in keys}
+        for name in (preset.get("amount_field"), preset.get("amount_field_index")):
+            if name is not None and str(name) in columns:
+                amount_columns.append(str(name))
+
+    if output == "lists":
+        return columns
+    if np is None:
+        raise RuntimeError(f"numpy is required for format_finance_columns(output='{output}'). Install numpy to use this option.")
+    arrays: Dict[str, Any] = {}
+    for key, values in columns.items():
+        if key in amount_columns:
+            arrays[key] = np.array([float(v) if v is not None else np.nan for v in values], dtype=np.float64)
+        else:
+            arrays[key] = np.array(values, dtype=object)
+    if output == "numpy":
+        return arrays
+    try:
+        import pandas as pd  # type: ignore
+    except ImportError:
+        raise RuntimeError("pandas is required for format_finance_columns(output='pandas'). Install pandas to use this option.")
+    return pd.DataFrame(arrays)
+
+
+FINANCE_CSV_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _csv_quote_patterns(delimiter: bytes, quotechar: bytes) -> tuple:
+    """Compile the patterns for quote characters that open a field and for a whole quoted field."""
+    d, q = re.escape(delimiter), re.escape(quotechar)
+    # Like the csv module, a quote only opens a quoted field at the start of a field,
+    # elsewhere (e.g. 27" Monitor) it is a literal character
+    opening = re.compile(rb"(?<![^" + d + rb"\r\n])" + q)
+    # Unrolled loop (no nested quantifiers), doubled quotes are escaped quotes
+    quoted = re.compile(q + rb"[^" + q + rb"]*(?:" + q + q + rb"[^" + q + rb"]*)*" + q)
+    return opening, quoted
+
+
+def _csv_row_end(buf: Any, pos: int, target: int, patterns: tuple) -> int:
+    """Return the offset just after the first row-ending newline at or after target.
+
+    pos must be the start of a row at or before target, the quoted fields from
+    there on are skipped as a whole, so newlines inside them are not row ends.
+    Returns len(buf) if no further row boundary exists.
+    """
+    opening, quoted = patterns
+    while True:
+        nl = buf.find(b"\n", max(pos, target))
+        m = opening.search(buf, pos, nl if nl >= 0 else len(buf))
+        if m is None:
+            return nl + 1 if nl >= 0 else len(buf)
+        field = quoted.match(buf, m.start())
+        if field is None:
+            # Unterminated quoted field, it runs to the end of the file
+            return len(buf)
+        pos = field.end()
+
+
+def _csv_byte_ranges(path: str, cfg: Dict[str, Any], size: int) -> List[tuple]:
+    """Split a CSV file into (start, end) byte ranges of about size bytes at row boundaries.
+
+    The header row (if skipped) is left out. The file is scanned from the start
+    with the quoting rules of the csv module, so rows with quoted newlines are
+    never split. Encodings that are not ASCII compatible (e.g. UTF-16) and
+    multi-byte delimiters give a single range.
+    """
+    encoding = cfg["encoding"]
+    quotechar = cfg.get("quotechar", '"').encode(encoding)
+    delimiter = cfg["delimiter"].encode(encoding)
+    total = os.path.getsize(path)
+    if not ('\n"'.encode(encoding).endswith(b'\n"') and len(quotechar) == 1 and len(delimiter) == 1):
+        return [(-1, total)]
+    if total == 0:
+        return []
+    patterns = _csv_quote_patterns(delimiter, quotechar)
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        start = 0
+        if cfg["has_header"] and cfg["skip_header"]:
+            start = _csv_row_end(buf, 0, 0, patterns)
+        ranges = []
+        while start < total:
+            target = start + size
+            end = _csv_row_end(buf, start, target, patterns) if target < total else total
+            ranges.append((start, end))
+            start = end
+        return ranges
+
+
+def _finance_csv_range(job: tuple) -> List[Dict[str, Any]]:
+    """Read and format the CSV rows in one byte range (process pool worker)."""
+    path, start, end, cfg, preset = job
+    if start < 0:
+        # No byte offsets available, read the whole file through the csv module
+        return list(iter_finance_rows(_iter_csv_rows(path, cfg), preset))
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    reader = csv.reader(io.StringIO(data.decode(cfg["encoding"]), newline=""), delimiter=cfg["delimiter"],
+                        quotechar=cfg.get("quotechar", '"'))
+    if cfg["strip"]:
+        reader = ([c.strip() if isinstance(c, str) else c for c in row] for row in reader)
+    return list(iter_finance_rows(reader, preset))
+
+
+def format_finance_csv(
+    sourcedir: str,
+    filename: str,
+    preset: Dict[str, Any],
+    settings: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    chunk_bytes: int = FINANCE_CSV_CHUNK_BYTES,
+) -> Iterator[Dict[str, Any]]:
+    """Read and format a large CSV file on a process pool (Iterator[Dict[str, Any]]).
+
+    Gives the same rows as iter_finance_rows(read_csv_iter(...), preset). The
+    file is split into byte ranges of about chunk_bytes at row boundaries
+    (newlines inside quoted fields are respected), each range is parsed and
+    formatted in a worker process and the rows are yielded in file order, so
+    the result can go straight into write_csv_rows.
+
+    Args:
+        sourcedir: Directory of the CSV file
+        filename: Name of the CSV file
+        preset: Formatting preset, see format_finance_rows
+        settings: CSV settings as for read_csv_to_list, plus an optional quotechar
+        workers: Number of worker processes, default is the number of CPUs,
+            1 formats in the calling process, as do files of a single chunk
+        chunk_bytes: Approximate size of the byte range handled per job
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If chunk_bytes is smaller than 1
+    """
+    if chunk_bytes < 1:
+        raise ValueError("format_finance_csv: chunk_bytes must be at least 1")
+    checkfile(sourcedir, filename)
+    path = os.path.join(sourcedir, filename)
+    cfg = {**_CSV_DEFAULTS, **(settings or {})}
+    jobs = [(path, start, end, cfg, preset) for start, end in _csv_byte_ranges(path, cfg, chunk_bytes)]
+    log_message(f"format_finance_csv: {len(jobs)} chunks from '{path}'", level="INFO")
+    return _format_finance_jobs(jobs, workers)
+
 
-    return out
\ No newline at end of file
+def _format_finance_jobs(jobs: List[tuple], workers: Optional[int]) -> Iterator[Dict[str, Any]]:
+    """Yield the formatted rows of the jobs in order, at most a few chunks are kept in memory."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        for job in jobs:
+            yield from _finance_csv_range(job)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque = deque()
+        jobs_iter = iter(jobs)
+        for job in itertools.islice(jobs_iter, workers * 2):
+            pending.append(executor.submit(_finance_csv_range, job))
+        while pending:
+            rows = pending.popleft().result()
+            job = next(jobs_iter, None)
+            if job is not None:
+                pending.append(executor.submit(_finance_csv_range, job))
+            yield from rows
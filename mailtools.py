@@ -1,17 +1,59 @@
-import os, re, sys, shutil
-import extract_msg
-import eml_parser
+import binascii, codecs, functools, hashlib, os, re, sys, shutil, struct
+import email.header, email.policy, email.utils
+from email.parser import BytesHeaderParser
+from datetime import datetime, timedelta, timezone
+from eliot import log_message
+from wit_pytools.systools import sqlite_connect, sqlite_shared
 from wit_pytools.validators import valid_email_address
 
+try:  # Optional dependency for reading MSG property streams (installed with extract-msg)
+    import olefile
+except ImportError:  # pragma: no cover - exercised in environments without olefile
+    olefile = None
+
+try:  # Optional dependency for full MSG parsing
+    import extract_msg
+except ImportError:  # pragma: no cover - exercised in environments without extract-msg
+    extract_msg = None
+
+try:  # Optional dependency for EML parsing
+    import eml_parser
+except ImportError:  # pragma: no cover - exercised in environments without eml-parser
+    eml_parser = None
+
 date_format = "%Y-%m-%d"
 email_pattern = r'<(.*?)>'  # Matches anything inside < >
 forward_subject_prefix = re.compile(r'^\s*(fwd|fw|wg)\s*:', re.IGNORECASE)  # Common forward prefixes (EN/DE)
 
+# MAPI property ids read by the header-only MSG path
+PR_SUBJECT = 0x0037
+PR_CLIENT_SUBMIT_TIME = 0x0039
+PR_TRANSPORT_MESSAGE_HEADERS = 0x007D
+PR_SENDER_EMAIL_ADDRESS = 0x0C1F
+PR_MESSAGE_DELIVERY_TIME = 0x0E06
+PR_BODY = 0x1000
+PR_INTERNET_MESSAGE_ID = 0x1035
+PR_ATTACH_DATA_BIN = 0x3701
+PR_ATTACH_FILENAME = 0x3704
+PR_ATTACH_LONG_FILENAME = 0x3707
+PR_MESSAGE_CODEPAGE = 0x3FFD
+PR_SENDER_SMTP_ADDRESS = 0x5D01
+PR_SENT_REPRESENTING_SMTP_ADDRESS = 0x5D02
+PT_LONG = 0x0003
+PT_SYSTIME = 0x0040
+_MSG_PROPERTIES = '__properties_version1.0'
+_MSG_PROPERTIES_HEADER = 32  # top-level property stream header, followed by 16-byte entries
+_FILETIME_EPOCH = datetime(1601, 1, 1, tzinfo=timezone.utc)
+
 # Email EML
 # https://pypi.org/project/eml-parser/
 # pip install eml-parser
-def parse_eml(file, dryrun=False):
+def parse_eml(file, dryrun=False, headers_only=True):
     #dryprint(dryrun, 'parsing eml', file)
+    if headers_only:
+        return parse_eml_headers(file)
+    if eml_parser is None:
+        raise RuntimeError("eml-parser is required for parse_eml. Install it via 'pip install eml-parser'.")
     with open(file, 'rb') as fhdl:
         raw_email = fhdl.read()
     ep = eml_parser.EmlParser()
@@ -22,112 +64,950 @@ def parse_eml(file, dryrun=False):
     mailinfo.append(parsed_eml['header']['subject'])
     return mailinfo
 
+def _read_header_block(fhdl):
+    """Read the raw header block of a mail up to and including the blank line that ends it."""
+    lines = []
+    for line in fhdl:
+        lines.append(line)
+        if line in (b'\r\n', b'\n'):
+            break
+    return b''.join(lines)
+
+def _decode_header(value):
+    """Decode RFC 2047 encoded words and unfold a raw header value."""
+    if not value:
+        return ''
+    return str(email.header.make_header(email.header.decode_header(value))).replace('\r\n', '').replace('\n', '')
+
+def parse_eml_headers(file):
+    """Read date, sender and subject of an EML file from its header block only.
+
+    Reading stops at the blank line after the headers, so the body and attachments are never
+    loaded. The values are returned in the shape of the full ``eml_parser`` result.
+
+    Args:
+        file: Path to the EML file.
+
+    Returns:
+        list: ``[date, from, subject]`` with an aware datetime (epoch if missing or unparsable),
+        the lowercased sender address and the decoded subject.
+    """
+    with open(file, 'rb') as fhdl:
+        return _parse_header_block(_read_header_block(fhdl))
+
+def _parse_header_block(data):
+    """Parse date, sender and subject from a raw header block, see parse_eml_headers."""
+    headers = BytesHeaderParser(policy=email.policy.compat32).parsebytes(data)
+    try:
+        msg_date = email.utils.parsedate_to_datetime(headers.get('Date', ''))
+        if msg_date.tzinfo is None:
+            msg_date = msg_date.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        msg_date = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    sender = email.utils.parseaddr(_decode_header(headers.get('From', '')))[1].lower()
+    return [msg_date, sender, _decode_header(headers.get('Subject', ''))]
+
+def _msg_properties(ole):
+    """Read the fixed-size top-level MAPI properties of an MSG file.
+
+    Returns:
+        dict: ``{property_id: (property_type, 8 value bytes)}``
+    """
+    props = {}
+    if not ole.exists(_MSG_PROPERTIES):
+        return props
+    data = ole.openstream(_MSG_PROPERTIES).read()
+    for offset in range(_MSG_PROPERTIES_HEADER, len(data) - 15, 16):
+        tag, _flags = struct.unpack_from('<II', data, offset)
+        props[tag >> 16] = (tag & 0xFFFF, data[offset + 8:offset + 16])
+    return props
+
+def _msg_codepage(props):
+    """Return the Python codec for 8-bit string properties of an MSG file."""
+    ptype, value = props.get(PR_MESSAGE_CODEPAGE, (None, b''))
+    if ptype == PT_LONG:
+        codec = f"cp{struct.unpack_from('<I', value)[0]}"
+        try:
+            return codecs.lookup(codec).name
+        except LookupError:
+            pass
+    return 'cp1252'
+
+def _msg_string(ole, prop_id, codepage='cp1252', storage=''):
+    """Read a string property stream (PT_UNICODE or PT_STRING8), ``''`` if it does not exist.
+
+    Top-level properties are read unless storage names a sub-storage such as an attachment (with trailing ``/``).
+    """
+    for ptype, encoding in (('001F', 'utf-16-le'), ('001E', codepage)):
+        name = f'{storage}__substg1.0_{prop_id:04X}{ptype}'
+        if ole.exists(name):
+            return ole.openstream(name).read().decode(encoding, errors='replace').rstrip('\x00')
+    return ''
+
+def _msg_time(props, prop_id):
+    """Convert a PT_SYSTIME property (FILETIME, 100ns ticks since 1601) to an aware datetime, or None."""
+    ptype, value = props.get(prop_id, (None, b''))
+    if ptype != PT_SYSTIME:
+        return None
+    ticks = struct.unpack_from('<Q', value)[0]
+    return _FILETIME_EPOCH + timedelta(microseconds=ticks // 10) if ticks else None
+
+def _header_address(headers, name='From'):
+    """Extract the address of a header (``From`` by default) from raw transport message headers."""
+    match = re.search(rf'^{name}\s*:\s*(.+)$', headers, re.IGNORECASE | re.MULTILINE)
+    if not match:
+        return ''
+    m_angle = re.search(email_pattern, match.group(1))
+    if m_angle and '@' in m_angle.group(1):
+        return m_angle.group(1)
+    m_bare = re.search(r'[\w\.-]+@[\w\.-]+', match.group(1))
+    return m_bare.group(0) if m_bare else ''
+
+def _forwarded_sender(formatted_sender, body_text):
+    """Return the original sender of a forwarded mail, or ``formatted_sender`` if the body does not name one.
+
+    Searches the body for the From/Von line of the forwarded header block, e.g.
+    ``From: John Doe <john@example.com>`` or ``Von: Jane Doe <jane@example.com>``.
+    """
+    from_line_match = re.search(r'^(?:From|Von)\s*:\s*(.+)$', body_text, re.IGNORECASE | re.MULTILINE)
+    if not from_line_match:
+        return formatted_sender
+    from_line = from_line_match.group(1).strip()
+    extracted_sender = ''
+    # Prefer email inside angle brackets
+    m_angle = re.search(email_pattern, from_line)
+    if m_angle and m_angle.group(1):
+        extracted_sender = m_angle.group(1)
+    else:
+        # Fallback: bare email somewhere on the line
+        m_bare = re.search(r'[\w\.-]+@[\w\.-]+', from_line)
+        if m_bare:
+            extracted_sender = m_bare.group(0)
+
+    # Only use extracted sender if domains are different
+    # This prevents misidentification of replies (AW) as forwards
+    actual_domain = formatted_sender.split('@')[-1] if '@' in formatted_sender else ''
+    extracted_domain = extracted_sender.split('@')[-1] if '@' in extracted_sender else ''
+    if actual_domain and extracted_domain and actual_domain != extracted_domain:
+        return extracted_sender
+    return formatted_sender
+
+def _mailinfo(msg_date, sender, subject):
+    """Build the ``[date, sender, subject]`` list returned by parse_msg."""
+    # Ensure date is not None
+    return [format(msg_date.strftime(date_format)) if msg_date is not None else "", format(sender), format(subject)]
+
+def parse_msg_headers(file):
+    """Read date, sender and subject of an MSG file from its MAPI property streams.
+
+    Only ``PR_CLIENT_SUBMIT_TIME``, the sender SMTP address and ``PR_SUBJECT`` are read; the body
+    stream is opened only when the subject carries a forward prefix. Attachments and recipients
+    are never touched, so the cost does not grow with the size of the message.
+
+    Args:
+        file: Path to the MSG file.
+
+    Returns:
+        list: ``[date, sender, subject]`` like parse_msg, the date in local time. None if the file
+        lacks the data for the fast path (no property stream, or a forward without a plain-text
+        body) and has to be parsed in full.
+
+    Raises:
+        RuntimeError: If olefile is not installed.
+    """
+    if olefile is None:
+        raise RuntimeError("olefile is required for parse_msg_headers. Install it via 'pip install olefile'.")
+    with olefile.OleFileIO(file) as ole:
+        props = _msg_properties(ole)
+        if not props:
+            return None
+        codepage = _msg_codepage(props)
+        msg_subj = _msg_string(ole, PR_SUBJECT, codepage)
+        msg_date = _msg_time(props, PR_CLIENT_SUBMIT_TIME) or _msg_time(props, PR_MESSAGE_DELIVERY_TIME)
+
+        # Prefer the SMTP address; PR_SENDER_EMAIL_ADDRESS holds an X.500 DN for Exchange senders
+        formatted_sender = _msg_string(ole, PR_SENDER_SMTP_ADDRESS, codepage)
+        if '@' not in formatted_sender:
+            formatted_sender = _msg_string(ole, PR_SENDER_EMAIL_ADDRESS, codepage)
+        if '@' not in formatted_sender:
+            formatted_sender = _msg_string(ole, PR_SENT_REPRESENTING_SMTP_ADDRESS, codepage)
+        if '@' not in formatted_sender:
+            formatted_sender = _header_address(_msg_string(ole, PR_TRANSPORT_MESSAGE_HEADERS, codepage))
+        log_message(f"parse_msg_headers: {file} sender = '{formatted_sender}'", level="DEBUG")
+
+        # Detect forward by common subject prefixes, only then the body is needed
+        if forward_subject_prefix.search(msg_subj):
+            body_text = _msg_string(ole, PR_BODY, codepage)
+            if not body_text:
+                return None  # body only available as RTF/HTML, leave it to extract_msg
+            formatted_sender = _forwarded_sender(formatted_sender, body_text)
+
+    return _mailinfo(msg_date.astimezone() if msg_date is not None else None, formatted_sender, msg_subj)
+
 # Parse Outlook MSG file
 # https://pypi.org/project/extract-msg/
 # pip install extract-msg
-def parse_msg(file, dryrun=False):
+def parse_msg(file, dryrun=False, headers_only=True):
     #dryprint(dryrun, 'parsing msg', file)
     if not os.path.isfile(file):
-        print(f"File not found: {file}")
+        log_message(f"File not found: {file}", level="ERROR")
         return []
-    else:
+    if headers_only and olefile is not None:
+        try:
+            mailinfo = parse_msg_headers(file)
+            if mailinfo is not None:
+                return mailinfo
+        except Exception as e:
+            log_message(f"Header-only parsing of {file} failed, parsing full message: {e}", level="DEBUG")
+    if extract_msg is None:
+        raise RuntimeError("extract-msg is required for parse_msg. Install it via 'pip install extract-msg'.")
+    try:
+        msg = extract_msg.Message(os.path.join(file)) #sys.argv[1]
+        msg_sender = msg.sender if msg.sender is not None else ""
+        msg_date = msg.date
+        msg_subj = msg.subject if msg.subject is not None else ""
+
+        # Prefer original sender if this is a forwarded mail
+        formatted_sender = msg_sender
+        log_message(f"parse_msg: raw msg_sender = '{msg_sender}'", level="DEBUG")
+
+        # Try to extract email from msg.sender_email property (SMTP address)
         try:
-            msg = extract_msg.Message(os.path.join(file)) #sys.argv[1]
-            msg_sender = msg.sender if msg.sender is not None else ""
-            msg_date = msg.date
-            msg_subj = msg.subject if msg.subject is not None else ""
-
-            # Prefer original sender if this is a forwarded mail
-            formatted_sender = msg_sender
-            print(f"DEBUG: raw msg_sender = '{msg_sender}'")
-            
-            # Try to extract email from msg.sender_email property (SMTP address)
+            if hasattr(msg, 'sender_email') and msg.sender_email:
+                formatted_sender = msg.sender_email
+                log_message(f"parse_msg: using sender_email = '{formatted_sender}'", level="DEBUG")
+        except Exception:
+            pass
+
+        # If still no bare email (display name, or "Name <email>"), search for email pattern in the sender string
+        if '@' not in formatted_sender or '<' in formatted_sender:
             try:
-                if hasattr(msg, 'sender_email') and msg.sender_email:
-                    formatted_sender = msg.sender_email
-                    print(f"DEBUG: using sender_email = '{formatted_sender}'")
+                # Look for email in angle brackets within sender
+                match = re.search(email_pattern, msg_sender)
+                if match and '@' in match.group(1):
+                    formatted_sender = match.group(1)
+                    log_message(f"parse_msg: extracted from angle brackets = '{formatted_sender}'", level="DEBUG")
             except Exception:
                 pass
-            
-            # If still no email (just display name), search for email pattern in the sender string
-            if '@' not in formatted_sender:
-                try:
-                    # Look for email in angle brackets within sender
-                    match = re.search(email_pattern, msg_sender)
+
+        # If still no email, try to get from message headers
+        if '@' not in formatted_sender:
+            try:
+                from_header = msg.header.get('From', '') if hasattr(msg, 'header') else ''
+                log_message(f"parse_msg: From header = '{from_header}'", level="DEBUG")
+                if from_header:
+                    match = re.search(email_pattern, from_header)
                     if match and '@' in match.group(1):
                         formatted_sender = match.group(1)
-                        print(f"DEBUG: extracted from angle brackets = '{formatted_sender}'")
-                except Exception:
-                    pass
-            
-            # If still no email, try to get from message headers
-            if '@' not in formatted_sender:
+                        log_message(f"parse_msg: extracted from header = '{formatted_sender}'", level="DEBUG")
+            except Exception as e:
+                log_message(f"parse_msg: header extraction error = {e}", level="DEBUG")
+
+        try:
+            # Detect forward by common subject prefixes
+            if forward_subject_prefix.search(msg_subj):
+                formatted_sender = _forwarded_sender(formatted_sender, getattr(msg, 'body', '') or '')
+        except Exception:
+            # If anything goes wrong, keep the original formatted_sender
+            pass
+
+        mailinfo = _mailinfo(msg_date, formatted_sender, msg_subj)
+        msg.close()
+        return mailinfo
+    except Exception as e:
+        log_message(f"Error parsing MSG file: {e}", level="ERROR")
+        # Return empty strings for all fields in case of error
+        return ["", "", ""]
+
+MAIL_SUFFIXES = ('.msg', '.eml')
+PARSE_MANY_MIN_BATCH = 64  # smaller batches are parsed in the calling process, a pool costs more to start
+
+def parse_mail(file, headers_only=True):
+    """Read date, sender and subject of an MSG or EML file in the shape returned by parse_msg.
+
+    Args:
+        file: Path to the mail file, EML is detected by its suffix and everything else parsed as MSG.
+        headers_only: Use the header-only fast paths of parse_msg and parse_eml.
+
+    Returns:
+        list: ``[date, sender, subject]`` with the date as ``YYYY-MM-DD`` in local time, ``[]`` if the
+        file does not exist and ``["", "", ""]`` if it cannot be parsed.
+    """
+    if os.path.splitext(str(file))[1].lower() != '.eml':
+        return parse_msg(file, True, headers_only=headers_only)
+    if not os.path.isfile(file):
+        log_message(f"File not found: {file}", level="ERROR")
+        return []
+    try:
+        msg_date, sender, subject = parse_eml(file, True, headers_only=headers_only)
+    except Exception as e:
+        log_message(f"Error parsing EML file: {e}", level="ERROR")
+        return ["", "", ""]
+    return _eml_mailinfo(msg_date, sender, subject)
+
+def _eml_mailinfo(msg_date, sender, subject):
+    """Convert a parse_eml result to the parse_msg shape."""
+    # eml_parser reports a missing date as the epoch
+    if msg_date is not None and msg_date.timestamp() <= 0:
+        msg_date = None
+    return _mailinfo(msg_date.astimezone() if msg_date is not None else None, sender or "", subject or "")
+
+def _parse_mail_job(job):
+    """Process pool worker for parse_many."""
+    file, headers_only = job
+    return parse_mail(file, headers_only)
+
+def parse_many(paths, workers=None, headers_only=True):
+    """Read date, sender and subject of many MSG/EML files on a process pool.
+
+    Args:
+        paths: Paths of the mail files.
+        workers: Number of worker processes. Default is the number of CPUs, ``1`` parses in the
+            calling process, as do batches smaller than ``PARSE_MANY_MIN_BATCH``.
+        headers_only: Use the header-only fast paths of parse_msg and parse_eml.
+
+    Returns:
+        list: The parse_mail result per input path, in input order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = [(str(path), headers_only) for path in paths]
+    if workers == 1 or len(jobs) < PARSE_MANY_MIN_BATCH:
+        return list(map(_parse_mail_job, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Header parsing takes about a millisecond, chunks keep the IPC overhead small
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(_parse_mail_job, jobs, chunksize=chunksize))
+
+# Mailboxes (mbox files and Maildir directories)
+_MAX_HEADER_BYTES = 1024 * 1024  # stop collecting headers of malformed messages without a blank line
+_MBOX_BLOCK = 1024 * 1024
+_mbox_separator = re.compile(rb'\n\r?\nFrom ')  # blank line followed by a From_ line
+_mbox_escaped_from = re.compile(rb'\n>(>*From )')  # literal prefix, much faster than a ^ anchor with MULTILINE
+
+def is_maildir(path):
+    """Return True if path is a Maildir directory (with cur, new and tmp subdirectories)."""
+    return all(os.path.isdir(os.path.join(path, sub)) for sub in ('cur', 'new', 'tmp'))
+
+def _mbox_boundaries(fhdl):
+    """Yield ``(message_end, from_line)`` byte offsets for each From_ line of an mbox file.
+
+    ``message_end`` is where the previous message ends (the start of the separating blank line).
+    The file is scanned in blocks, the overlap between blocks is shorter than any separator that
+    lies entirely inside it, so no separator is reported twice.
+    """
+    if fhdl.read(5) == b'From ':
+        yield 0, 0
+    fhdl.seek(0)
+    offset, tail = 0, b''
+    while True:
+        block = fhdl.read(_MBOX_BLOCK)
+        if not block:
+            return
+        data = tail + block
+        base = offset - len(tail)
+        for match in _mbox_separator.finditer(data):
+            if match.end() > len(tail):
+                yield base + match.start() + 1, base + match.end() - 5
+        offset += len(block)
+        tail = data[-7:]
+
+def _copy_mbox_message(path, start, end, dest):
+    """Write the mbox message between byte offsets start and end to dest as an EML file."""
+    with open(path, 'rb') as src, open(dest, 'wb') as out:
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            # Blocks end on line boundaries so every quoted line is preceded by a newline
+            block = src.read(min(remaining, _MBOX_BLOCK))
+            if not block:
+                break
+            if not block.endswith(b'\n') and len(block) < remaining:
+                block += src.readline(remaining - len(block))
+            remaining -= len(block)
+            # Undo the >From quoting of body lines (mboxrd)
+            out.write(_mbox_escaped_from.sub(rb'\n\1', b'\n' + block)[1:])
+    return dest
+
+def _mbox_header(fhdl, from_line):
+    """Return the offset where the message after the From_ line at from_line starts, and its header block."""
+    fhdl.seek(from_line)
+    start = from_line + len(fhdl.readline())
+    header, size = [], 0
+    for line in fhdl:
+        size += len(line)
+        if size > _MAX_HEADER_BYTES or line in (b'\n', b'\r\n'):
+            break
+        header.append(line)
+    return start, b''.join(header)
+
+def _iter_mbox(path):
+    """Yield ``(mailinfo, copy_to)`` for each message of an mbox file."""
+    def message(from_line, end):
+        start, header = _mbox_header(reader, from_line)
+        mailinfo = _eml_mailinfo(*_parse_header_block(header + b'\n'))
+        return mailinfo, lambda dest: _copy_mbox_message(path, start, end, dest)
+
+    with open(path, 'rb') as scanner, open(path, 'rb') as reader:
+        previous = None
+        for message_end, from_line in _mbox_boundaries(scanner):
+            if previous is not None:
+                yield message(previous, message_end)
+            previous = from_line
+        if previous is not None:
+            yield message(previous, os.path.getsize(path))
+
+def _iter_maildir(path):
+    """Yield ``(mailinfo, copy_to)`` for each message of a Maildir directory."""
+    for sub in ('new', 'cur'):
+        folder = os.path.join(path, sub)
+        for name in sorted(os.listdir(folder)):
+            file = os.path.join(folder, name)
+            if name.startswith('.') or not os.path.isfile(file):
+                continue
+            mailinfo = _eml_mailinfo(*parse_eml_headers(file))
+            yield mailinfo, lambda dest, file=file: shutil.copyfile(file, dest)
+
+def iter_mailbox(path):
+    """Stream the messages of an mbox file or a Maildir directory.
+
+    Only the header block of each message is parsed and kept in memory, messages are copied
+    line by line (mbox) or file by file (Maildir), so memory stays flat for multi-GB mailboxes.
+
+    Args:
+        path: Path to an mbox file or a Maildir directory.
+
+    Yields:
+        ``(mailinfo, copy_to)`` tuples, where ``mailinfo`` is ``[date, sender, subject]`` in the
+        parse_msg shape and ``copy_to(dest)`` writes the message to ``dest`` as an EML file.
+    """
+    if os.path.isdir(path):
+        if not is_maildir(path):
+            raise ValueError(f"Not a Maildir directory: {path}")
+        return _iter_maildir(path)
+    return _iter_mbox(path)
+
+# De-duplication
+_DEDUP_HEADERS = ('From', 'To', 'Cc', 'Date', 'Subject')
+_HASH_BLOCK = 1024 * 1024
+
+def _normalize_message_id(value):
+    """Strip whitespace and angle brackets from a Message-ID, ``''`` if there is none."""
+    return ' '.join(str(value or '').split()).strip('<> ')
+
+def _content_key(header_fields, body_chunks):
+    """Hash normalised header values and the body (line endings ignored) into a dedup key."""
+    digest = hashlib.sha256()
+    for value in header_fields:
+        digest.update(' '.join(value.split()).lower().encode('utf-8', errors='replace') + b'\n')
+    for chunk in body_chunks:
+        digest.update(chunk.replace(b'\r', b''))
+    return 'sha256:' + digest.hexdigest()
+
+def _eml_dedup_key(file):
+    with open(file, 'rb') as fhdl:
+        headers = BytesHeaderParser(policy=email.policy.compat32).parsebytes(_read_header_block(fhdl))
+        message_id = _normalize_message_id(headers.get('Message-ID'))
+        if message_id:
+            return 'mid:' + message_id
+        fields = [_decode_header(headers.get(name, '')) for name in _DEDUP_HEADERS]
+        return _content_key(fields, iter(lambda: fhdl.read(_HASH_BLOCK), b''))
+
+def _msg_dedup_key(file):
+    if olefile is None:
+        raise RuntimeError("olefile is required for mail_dedup_key. Install it via 'pip install olefile'.")
+    with olefile.OleFileIO(file) as ole:
+        props = _msg_properties(ole)
+        codepage = _msg_codepage(props)
+        message_id = _normalize_message_id(_msg_string(ole, PR_INTERNET_MESSAGE_ID, codepage))
+        if message_id:
+            return 'mid:' + message_id
+        sent = _msg_time(props, PR_CLIENT_SUBMIT_TIME)
+        fields = [_msg_string(ole, PR_SENDER_SMTP_ADDRESS, codepage) or _msg_string(ole, PR_SENDER_EMAIL_ADDRESS, codepage),
+                  sent.isoformat() if sent else '', _msg_string(ole, PR_SUBJECT, codepage)]
+        return _content_key(fields, [_msg_string(ole, PR_BODY, codepage).encode('utf-8')])
+
+def mail_dedup_key(file):
+    """Return the de-duplication key of an MSG or EML file.
+
+    The key is ``mid:<Message-ID>`` if the mail carries one, so re-exported copies of the same
+    mail match across formats. Otherwise it is ``sha256:<hash>`` over the normalised sender,
+    date and subject headers plus the body, which is streamed in blocks.
+
+    Args:
+        file: Path to the mail file, EML is detected by its suffix and everything else read as MSG.
+
+    Raises:
+        RuntimeError: If olefile is needed for an MSG file but not installed.
+    """
+    if os.path.splitext(str(file))[1].lower() == '.eml':
+        return _eml_dedup_key(file)
+    return _msg_dedup_key(file)
+
+class MailDedupIndex:
+    """Persistent index of sorted mails by de-duplication key (see mail_dedup_key).
+
+    Use ``':memory:'`` for a throwaway index or a file path to share it across runs.
+    """
+
+    def __init__(self, dbpath=':memory:'):
+        self.dbpath = dbpath
+        self._conn = sqlite_connect(dbpath, (
+            "CREATE TABLE IF NOT EXISTS mails (key TEXT PRIMARY KEY, path TEXT NOT NULL, added INTEGER NOT NULL)",))
+
+    def lookup(self, key):
+        """Return the recorded path of the mail with this key, or None if it is unknown."""
+        row = self._conn.execute("SELECT path FROM mails WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def duplicate_of(self, key, file=None):
+        """Return the path of an earlier copy of this mail that still exists, or None.
+
+        Entries whose file is gone (deleted or moved by hand) are dropped, so the mail is sorted again.
+        """
+        path = self.lookup(key)
+        if path is None or (file is not None and os.path.abspath(str(file)) == path):
+            return None
+        if not os.path.exists(path):
+            self.remove(key)
+            return None
+        return path
+
+    def add(self, key, path):
+        """Record the sorted location of a mail."""
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO mails (key, path, added) VALUES (?, ?, ?)",
+                               (key, os.path.abspath(str(path)), int(datetime.now().timestamp())))
+
+    def remove(self, key):
+        """Forget the mail with this key."""
+        with self._conn:
+            self._conn.execute("DELETE FROM mails WHERE key=?", (key,))
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM mails").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+def mail_dedup_index(dbpath=None):
+    """Return the shared mail de-duplication index.
+
+    Args:
+        dbpath: SQLite file of the index. If None, the current index is returned (an in-memory
+            index is created on first use).
+    """
+    return sqlite_shared(MailDedupIndex, dbpath)
+
+# Email bowl routing
+_domain_pattern = re.compile(r'@((?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,})')
+_domain_crit = re.compile(r'^@((?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,})$')
+
+def sender_domain(text):
+    """Return the lowercased domain of the first email address in text, or ``''``."""
+    match = _domain_pattern.search(text or '')
+    return match.group(1).lower() if match else ''
+
+class MailBowlIndex:
+    """
+    BOWLS_EMAIL criteria compiled for lookup by sender domain.
+
+    Criteria of the form ``@example.com`` match that sender domain exactly and are a dictionary lookup.
+    All other criteria, including bare domains like ``example.com``, remain substring tests on the file
+    name. Bowls keep their config order as priority.
+    """
+
+    def __init__(self, items):
+        self.bowls, self.default, self.malformed = [], '', ''
+        self._domains, self._generic = {}, []
+        for bowl, critlist in items:
+            # Special bowls are skipped as a whole, like in the linear matcher
+            if "!DEFAULT" in critlist:
+                self.default = bowl
+                continue
+            if "!MALFORMED" in critlist:
+                self.malformed = bowl
+                continue
+            position = len(self.bowls)
+            self.bowls.append(bowl)
+            for crit in critlist.split(','):
+                crit = crit.strip()
+                if not crit:
+                    continue
+                match = _domain_crit.match(crit)
+                if match:
+                    self._domains.setdefault(match.group(1).lower(), position)
+                else:
+                    self._generic.append((position, crit))
+
+    def match(self, file, sender=None):
+        """
+        Return the first bowl (in config order) whose criteria match, or ``''``.
+
+        Args:
+            file (str): Generated file name, searched by the substring criteria
+            sender (str, optional): Sender address, the domain is taken from file if not given
+        """
+        domain = sender_domain(sender) or sender_domain(file)
+        best = self._domains.get(domain) if domain else None
+        for position, crit in self._generic:
+            if best is not None and position >= best:
+                break
+            if crit in file:
+                return self.bowls[position]
+        return self.bowls[best] if best is not None else ''
+
+@functools.lru_cache(maxsize=8)
+def mail_bowl_index(items):
+    """
+    Compile BOWLS_EMAIL entries into a MailBowlIndex (cached per config).
+
+    Args:
+        items (tuple): (bowl, critlist) pairs in config order
+    """
+    return MailBowlIndex(items)
+
+# Attachments
+_ATTACH_BLOCK = 1024 * 1024
+_unsafe_filename_chars = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+def _attachment_filename(mailinfo, name):
+    """Deterministic attachment file name ``date_sender_name`` from the mail metadata."""
+    name = _unsafe_filename_chars.sub('', os.path.basename(name.replace('\\', '/'))).strip(' .') or 'attachment'
+    prefix = '_'.join(_unsafe_filename_chars.sub('', value) for value in mailinfo[:2] if value)
+    return f"{prefix}_{name}" if prefix else name
+
+def _open_exclusive(outdir, filename):
+    """Create outdir/filename for writing, enumerating the name (base#2.ext) if it exists.
+
+    The exclusive create keeps concurrent workers from overwriting each other's files.
+    """
+    base, ext = os.path.splitext(filename)
+    candidate, i = filename, 2
+    while True:
+        path = os.path.join(outdir, candidate)
+        try:
+            return path, open(path, 'xb')
+        except FileExistsError:
+            candidate = f"{base}#{i}{ext}"
+            i += 1
+
+class _PartWriter:
+    """Decode a MIME part line by line into a file (base64, quoted-printable or raw)."""
+
+    def __init__(self, fhdl, encoding):
+        self.fhdl = fhdl
+        self.encoding = encoding
+        self.leftover = b''
+        self.eol = b''
+
+    def feed(self, line):
+        if self.encoding == 'base64':
+            data = self.leftover + b''.join(line.split())
+            usable = len(data) - len(data) % 4
+            self.leftover = data[usable:]
+            if usable:
+                self.fhdl.write(binascii.a2b_base64(data[:usable]))
+            return
+        if self.encoding == 'quoted-printable':
+            line = binascii.a2b_qp(line)
+        # The line break before the closing boundary belongs to the boundary, so hold it back
+        content = line.rstrip(b'\r\n')
+        self.fhdl.write(self.eol + content)
+        self.eol = line[len(content):]
+
+    def close(self):
+        if self.leftover:
+            self.fhdl.write(binascii.a2b_base64(self.leftover + b'=' * (-len(self.leftover) % 4)))
+        self.fhdl.close()
+
+def _iter_eml_part_lines(src):
+    """Walk the MIME parts of an open EML file line by line.
+
+    Yields ``(headers, line)`` for every raw body line of each non-multipart part and
+    ``(headers, None)`` once that part ended, ``headers`` is the parsed header block of the part.
+    """
+    parser = BytesHeaderParser(policy=email.policy.compat32)
+    stack = []
+
+    def open_part():
+        headers = parser.parsebytes(_read_header_block(src))
+        if headers.get_content_maintype() == 'multipart':
+            boundary = headers.get_param('boundary')
+            if boundary:
+                stack.append(b'--' + str(boundary).encode('utf-8', errors='replace'))
+            return None
+        return headers
+
+    part = open_part()
+    for line in src:
+        if stack and line.startswith(b'--'):
+            delimiter = line.rstrip(b'\r\n ')
+            if delimiter in (stack[-1], stack[-1] + b'--'):
+                if part is not None:
+                    yield part, None
+                    part = None
+                if delimiter == stack[-1]:
+                    part = open_part()
+                else:
+                    stack.pop()
+                continue
+        if part is not None:
+            yield part, line
+    if part is not None:
+        yield part, None
+
+def _discard_partial(path, fhdl):
+    """Close and delete an attachment file that could not be written completely."""
+    fhdl.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _extract_eml_attachments(file, outdir, mailinfo, suffixes, outputs):
+    """Stream the attachments of an EML file to outdir, see extract_attachments."""
+    def open_part(headers):
+        name = headers.get_filename()
+        if not name:
+            return None
+        name = _decode_header(name)
+        if suffixes and not name.lower().endswith(suffixes):
+            return None
+        path, fhdl = _open_exclusive(outdir, _attachment_filename(mailinfo, name))
+        encoding = str(headers.get('Content-Transfer-Encoding', '')).strip().lower()
+        return path, _PartWriter(fhdl, encoding)
+
+    current = part = None
+    with open(file, 'rb') as src:
+        try:
+            for headers, line in _iter_eml_part_lines(src):
+                if headers is not current:
+                    current, part = headers, open_part(headers)
+                if part is None:
+                    continue
+                path, writer = part
                 try:
-                    from_header = msg.header.get('From', '') if hasattr(msg, 'header') else ''
-                    print(f"DEBUG: From header = '{from_header}'")
-                    if from_header:
-                        match = re.search(email_pattern, from_header)
-                        if match and '@' in match.group(1):
-                            formatted_sender = match.group(1)
-                            print(f"DEBUG: extracted from header = '{formatted_sender}'")
+                    if line is None:
+                        writer.close()
+                        outputs.append(path)
+                        part = None
+                    else:
+                        writer.feed(line)
                 except Exception as e:
-                    print(f"DEBUG: header extraction error = {e}")
-                    pass
+                    # A broken part (e.g. bad base64) only costs this attachment
+                    log_message(f"Error extracting {path} from {file}: {e}", level="ERROR")
+                    _discard_partial(path, writer.fhdl)
+                    part = None
+        finally:
+            if part is not None:
+                _discard_partial(part[0], part[1].fhdl)
 
+class _TextLines:
+    """File-like target for _PartWriter that decodes the written bytes into complete lines."""
+
+    def __init__(self, charset):
+        self.decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        self.pending = ''
+        self.lines = []
+
+    def write(self, data):
+        text = self.pending + self.decoder.decode(data)
+        # A CRLF may be split between two writes, so a trailing CR does not end a line yet
+        end = len(text) - text.endswith('\r')
+        cut = max(text.rfind('\n', 0, end), text.rfind('\r', 0, end)) + 1
+        self.lines.extend(text[:cut].splitlines())
+        self.pending = text[cut:]
+
+    def close(self):
+        self.lines.extend((self.pending + self.decoder.decode(b'', final=True)).splitlines())
+        self.pending = ''
+
+def iter_eml_text(file, subtype='plain'):
+    """Yield the decoded lines of the inline ``text/<subtype>`` parts of an EML file.
+
+    The message is read line by line and only the matching parts are decoded, attachments are
+    skipped without being decoded, so memory is bounded by the longest line.
+
+    Args:
+        file: Path to the EML file.
+        subtype (str): MIME subtype of the text parts, e.g. ``'plain'`` or ``'html'``.
+
+    Yields:
+        str: Lines without line breaks, part after part.
+    """
+    content_type = f'text/{subtype}'
+    current = writer = None
+    with open(file, 'rb') as src:
+        for headers, line in _iter_eml_part_lines(src):
+            if headers is not current:
+                current, writer = headers, None
+                if headers.get_content_type() == content_type and headers.get_content_disposition() != 'attachment':
+                    try:
+                        sink = _TextLines(headers.get_content_charset() or 'utf-8')
+                    except LookupError as e:
+                        log_message(f"Cannot decode part of {file}: {e}", level="DEBUG")
+                    else:
+                        encoding = str(headers.get('Content-Transfer-Encoding', '')).strip().lower()
+                        writer = _PartWriter(sink, encoding)
+            if writer is None:
+                continue
             try:
-                # Detect forward by common subject prefixes
-                is_forward = bool(forward_subject_prefix.search(msg_subj))
-                if is_forward:
-                    body_text = getattr(msg, 'body', '') or ''
-                    # Search for original From/Von line in the forwarded header block
-                    # Example lines:
-                    #   From: John Doe <john@example.com>
-                    #   Von: Jane Doe <jane@example.com>
-                    from_line_match = re.search(r'^(?:From|Von)\s*:\s*(.+)$', body_text, re.IGNORECASE | re.MULTILINE)
-                    if from_line_match:
-                        from_line = from_line_match.group(1).strip()
-                        # Prefer email inside angle brackets
-                        m_angle = re.search(email_pattern, from_line)
-                        if m_angle and m_angle.group(1):
-                            extracted_sender = m_angle.group(1)
-                        else:
-                            # Fallback: bare email somewhere on the line
-                            m_bare = re.search(r'[\w\.-]+@[\w\.-]+', from_line)
-                            if m_bare:
-                                extracted_sender = m_bare.group(0)
-                        
-                        # Only use extracted sender if it looks like a valid forward
-                        # (contains @ and doesn't match the actual sender domain)
-                        if extracted_sender and '@' in extracted_sender:
-                            # Check if extracted sender domain differs from actual sender domain
-                            actual_domain = formatted_sender.split('@')[-1] if '@' in formatted_sender else ''
-                            extracted_domain = extracted_sender.split('@')[-1] if '@' in extracted_sender else ''
-                            
-                            # Only use extracted sender if domains are different
-                            # This prevents misidentification of replies (AW) as forwards
-                            if actual_domain and extracted_domain and actual_domain != extracted_domain:
-                                formatted_sender = extracted_sender
-            except Exception:
-                # If anything goes wrong, keep the original formatted_sender
-                pass
+                if line is None:
+                    writer.close()
+                    writer = None
+                else:
+                    writer.feed(line)
+            except ValueError as e:
+                log_message(f"Cannot decode part of {file}: {e}", level="DEBUG")
+                writer = None
+            yield from sink.lines
+            sink.lines.clear()
 
-            mailinfo = []
-            # Ensure date is not None
-            if msg_date is not None:
-                mailinfo.append(format(msg_date.strftime(date_format)))
-            else:
-                mailinfo.append("")
-            
-            mailinfo.append(format(formatted_sender))
-            mailinfo.append(format(msg_subj))
-            
-            msg.close()
-            
-            return mailinfo
-        except Exception as e:
-            print(f"Error parsing MSG file: {e}")
-            # Return empty strings for all fields in case of error
-            return ["", "", ""]
+def _ole_sector_runs(ole, name):
+    """Return the ``(offset, length)`` runs of a regular OLE stream, or None for a mini stream.
+
+    The FAT sector chain is followed through olefile internals (``direntries``, ``_find``, ``fat``,
+    ``sectorsize``, ``minisectorcutoff``), written against olefile 0.46/0.47. The whole chain is
+    resolved before anything is read, so a mismatch raises here rather than halfway through a stream.
+    """
+    entry = ole.direntries[ole._find(name)]
+    if entry.size < ole.minisectorcutoff:
+        return None
+    runs = []
+    sector, remaining = entry.isectStart, entry.size
+    max_run = max(1, _ATTACH_BLOCK // ole.sectorsize)
+    while remaining > 0:
+        first, run = sector, 1
+        sector = ole.fat[sector]
+        while sector == first + run and run < max_run and run * ole.sectorsize < remaining:
+            run += 1
+            sector = ole.fat[sector]
+        length = min(run * ole.sectorsize, remaining)
+        runs.append((ole.sectorsize * (first + 1), length))
+        remaining -= length
+    return runs
+
+def _ole_stream_chunks(ole, name):
+    """Yield the content of an OLE stream in blocks of up to ``_ATTACH_BLOCK``.
+
+    olefile reads a stream into memory when it is opened, so regular streams are read along their
+    sector chain, coalescing consecutive sectors into blocks. Mini streams, and any stream whose chain
+    cannot be resolved with the installed olefile, are read through ``openstream`` instead.
+    """
+    try:
+        runs = _ole_sector_runs(ole, name)
+    except (AttributeError, LookupError, TypeError, ValueError) as e:
+        log_message(f"Reading OLE stream {name} via openstream: {e!r}", level="DEBUG")
+        runs = None
+    if runs is None:
+        with ole.openstream(name) as stream:
+            for block in iter(lambda: stream.read(_ATTACH_BLOCK), b''):
+                yield block
+        return
+    for offset, length in runs:
+        ole.fp.seek(offset)
+        block = ole.fp.read(length)
+        if len(block) != length:
+            raise OSError(f"Truncated OLE stream {name}")
+        yield block
+
+def _extract_msg_attachments(file, outdir, mailinfo, suffixes, outputs):
+    """Stream the attachments of an MSG file to outdir, see extract_attachments."""
+    if olefile is None:
+        raise RuntimeError("olefile is required for extract_attachments. Install it via 'pip install olefile'.")
+    with olefile.OleFileIO(file) as ole:
+        codepage = _msg_codepage(_msg_properties(ole))
+        storages = sorted({entry[0] for entry in ole.listdir(streams=True, storages=True)
+                           if entry[0].startswith('__attach_version1.0_#')})
+        for storage in storages:
+            data = f'{storage}/__substg1.0_{PR_ATTACH_DATA_BIN:04X}0102'
+            if not ole.exists(data):
+                continue  # embedded messages and OLE objects have no data stream
+            name = (_msg_string(ole, PR_ATTACH_LONG_FILENAME, codepage, storage + '/')
+                    or _msg_string(ole, PR_ATTACH_FILENAME, codepage, storage + '/'))
+            if not name or (suffixes and not name.lower().endswith(suffixes)):
+                continue
+            path, fhdl = _open_exclusive(outdir, _attachment_filename(mailinfo, name))
+            try:
+                for block in _ole_stream_chunks(ole, data):
+                    fhdl.write(block)
+            except Exception as e:
+                log_message(f"Error extracting {path} from {file}: {e}", level="ERROR")
+                _discard_partial(path, fhdl)
+                continue
+            fhdl.close()
+            outputs.append(path)
+
+def extract_attachments(file, outdir, suffixes=None, mailinfo=None):
+    """Write the attachments of an MSG or EML file to outdir, streaming them in blocks.
+
+    Files are named ``date_sender_filename`` from the mail metadata (see parse_mail), an existing
+    name is enumerated (``base#2.ext``) like movefile does. An attachment that cannot be decoded
+    is logged and its partial file removed, the other attachments are still written.
+
+    Args:
+        file: Path to the mail file, EML is detected by its suffix and everything else read as MSG.
+        outdir: Directory for the attachments, created if missing.
+        suffixes (tuple, optional): Lowercase file name suffixes to extract, all attachments if None.
+        mailinfo (list, optional): The parse_mail result of the mail if it was parsed before.
+
+    Returns:
+        list: Paths of the written attachments in message order.
+
+    Raises:
+        RuntimeError: If olefile is needed for an MSG file but not installed.
+    """
+    outputs = []
+    _extract_attachments(file, outdir, suffixes, mailinfo, outputs)
+    return outputs
+
+def _extract_attachments(file, outdir, suffixes, mailinfo, outputs):
+    """Extract the attachments of a mail, appending each path to outputs once it is complete."""
+    os.makedirs(outdir, exist_ok=True)
+    mailinfo = mailinfo or parse_mail(file)
+    suffixes = tuple(suffixes) if suffixes else None
+    if os.path.splitext(str(file))[1].lower() == '.eml':
+        _extract_eml_attachments(file, outdir, mailinfo, suffixes, outputs)
+    else:
+        _extract_msg_attachments(file, outdir, mailinfo, suffixes, outputs)
+
+def _extract_attachments_job(job):
+    """Process pool worker for extract_attachments_many."""
+    file, outdir, suffixes, mailinfo = job
+    outputs = []
+    try:
+        _extract_attachments(file, outdir, suffixes, mailinfo, outputs)
+    except Exception as e:
+        log_message(f"Error extracting attachments of {file}: {e}", level="ERROR")
+    return file, outputs
+
+def extract_attachments_many(paths, outdir, suffixes=None, workers=None, mailinfos=None):
+    """Extract the attachments of many mails on a process pool.
+
+    Results are yielded in input order as soon as they are ready, so the caller can sort the
+    attachments of a mail while the following mails are still being extracted.
+
+    Args:
+        paths: Paths of the MSG/EML files.
+        outdir: Directory for the attachments.
+        suffixes (tuple, optional): Lowercase file name suffixes to extract, all attachments if None.
+        workers (int, optional): Number of worker processes. Default is the number of CPUs, ``1``
+            extracts in the calling process.
+        mailinfos (dict, optional): parse_mail results by path (e.g. from parse_many), these mails
+            are not parsed again.
+
+    Yields:
+        ``(path, outputs)`` per mail, ``outputs`` holds the attachments written before an error and
+        is empty if the mail could not be read.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    mailinfos = mailinfos or {}
+    jobs = [(str(path), outdir, tuple(suffixes) if suffixes else None, mailinfos.get(str(path))) for path in paths]
+    if workers == 1 or len(jobs) < 2:
+        yield from map(_extract_attachments_job, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_extract_attachments_job, jobs)
 
 #structure mailinfo:
 # date, sender, subject
@@ -1,4 +1,4 @@
-import os, shutil
+import os, shutil, sqlite3
 from wit_pytools.sanitizers import cleanfilestring
 from stat import filemode
 
@@ -69,7 +69,14 @@ def delfile(subdir, file, dryrun=False):
             log_message(f"ERROR: Failed to delete {filepath}: {str(e)}", level="ERROR")
 
 def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryrun=False):
+    """
+    Move subdir/file to destdir/nfile, enumerating the name (base#2.ext) if the target exists.
+
+    Returns:
+        str: Final path of the moved file, or None in dryrun mode or if the move failed
+    """
     #TODO: add rights handeling before attempt (gets stuck sometimes when copy but no write access
+    final_path = None
     log_message('movefile OVERWRITE: ' + str(overwrite), level="DEBUG")
     if not dryrun:
         # Check for null bytes in arguments and remove them if found
@@ -107,6 +114,7 @@ def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryr
                     shutil.copy2(source_path, new_target)
                     os.remove(source_path)
                     log_message(f"Copied file to {new_target} and removed original", level="INFO")
+                    final_path = new_target
                 except Exception as e2:
                     log_message(f"ERROR: Could not copy to enumerated filename: {str(e2)}", level="ERROR")
             else:
@@ -115,6 +123,7 @@ def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryr
                         os.remove(target_path)
                     os.rename(source_path, target_path)
                     log_message(f"movefile win: Successfully moved file to {target_path}", level="INFO")
+                    final_path = target_path
                 elif filemode == 'nc':
                     from wit_pytools import nctools
                     src_nc = nctools.getncpath(source_path)
@@ -122,6 +131,7 @@ def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryr
                     try:
                         nctools.ncmovefile(src_nc, tgt_nc)
                         log_message(f"movefile nc: Successfully moved file to {target_path}", level="INFO")
+                        final_path = target_path
                     except Exception as e:
                         # If move fails (e.g., target exists), try enumerated filenames like base#2.ext
                         base, ext = os.path.splitext(target_path)
@@ -133,6 +143,7 @@ def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryr
                             try:
                                 nctools.ncmovefile(src_nc, new_tgt_nc)
                                 log_message(f"movefile nc: Successfully moved file to {new_target}", level="INFO")
+                                final_path = new_target
                                 break
                             except Exception as e2:
                                 i += 1
@@ -152,6 +163,7 @@ def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryr
                 shutil.copy2(source_path, target_path)
                 os.remove(source_path)
                 log_message(f"Successfully copied file to {target_path} and removed original", level="INFO")
+                final_path = target_path
             except Exception as e:
                 log_message(f"ERROR: Fallback copy failed: {str(e)}", level="ERROR")
         except OSError as e:
@@ -165,6 +177,7 @@ def movefile(subdir, file, destdir, nfile, filemode='win', overwrite=False, dryr
                 log_message(f"ERROR: Failed to move file: {str(e)}", level="ERROR")
         except Exception as e:
             log_message(f"ERROR: Unexpected error: {str(e)}", level="ERROR")
+    return final_path
 
 def copyfile(subdir, file, destdir, nfile, overwrite=False, dryrun=False):
     """
@@ -241,3 +254,47 @@ def moveallfiles(sourcedir, destdir, dryrun):
                     True
     else:
         log_message(f"Source not found - skipped: {sourcedir}")
+
+
+# Sqlite files behind the persistent caches and indexes (ImgMetaCache, DocumentIndex, MailDedupIndex)
+def sqlite_connect(dbpath, schema=()):
+    """Open a sqlite database and create its tables.
+
+    A file database gets its directory created and is switched to WAL with synchronous=NORMAL,
+    so readers do not block the writer and commits do not wait for a full fsync.
+
+    Args:
+        dbpath (str): Path of the database file or ':memory:'.
+        schema: CREATE ... IF NOT EXISTS statements run on every open.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    if dbpath != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(dbpath)), exist_ok=True)
+    conn = sqlite3.connect(dbpath)
+    if dbpath != ':memory:':
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in schema:
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+_sqlite_shared = {}
+
+def sqlite_shared(factory, dbpath=None):
+    """Return the process-wide instance of a sqlite-backed cache or index class.
+
+    Args:
+        factory: Class taking the database path, its instances need a dbpath attribute and close().
+        dbpath (str, optional): Database file. If None, the current instance is returned (an
+            in-memory one is created on first use); a different path closes the current instance.
+    """
+    current = _sqlite_shared.get(factory)
+    if dbpath is not None and current is not None and current.dbpath != dbpath:
+        current.close()
+        current = None
+    if current is None:
+        current = _sqlite_shared[factory] = factory(dbpath or ':memory:')
+    return current
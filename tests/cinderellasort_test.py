@@ -269,6 +269,373 @@ def test_gpsbowl_functionality():
             "testimage_0gps.jpg should be renamed with _nogps and stay in source directory"
 
 
+def test_gps_bowl_from_gpx_track(tmp_path):
+    from PIL import Image
+    from wit_pytools.gpstools import exif_datetime_to_epoch
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    gpx_dir = tmp_path / 'gpx'
+    for d in (source_dir, target_dir, gpx_dir):
+        d.mkdir()
+
+    # Camera image without GPS but with DateTimeOriginal (camera clock is UTC+2)
+    exif = Image.Exif()
+    exif.get_ifd(0x8769)[36867] = '2024:05:12 16:01:00'
+    Image.new('RGB', (32, 32)).save(source_dir / 'camera.jpg', exif=exif)
+    (gpx_dir / 'day.gpx').write_text(
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+        '<trkpt lat="52.1159" lon="11.6037"><time>2024-05-12T14:00:00Z</time></trkpt>'
+        '<trkpt lat="52.1161" lon="11.6039"><time>2024-05-12T14:02:00Z</time></trkpt>'
+        '</trkseg></trk></gpx>', encoding='utf-8')
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.jpg'}
+    config['SETTINGS'] = {'gpx_dir': str(gpx_dir), 'gpx_camera_offset': '+02:00'}
+    config['BOWLS_GPS'] = {'Magdeburg;2': '52.115946,11.603707'}
+    config_path = tmp_path / 'gpx-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Magdeburg' / 'camera.jpg').exists()
+
+def test_gps_segment_dated_subfolders(tmp_path):
+    from PIL import Image
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    gpx_dir = tmp_path / 'gpx'
+    for d in (source_dir, target_dir, gpx_dir):
+        d.mkdir()
+    for name, taken in (('a.jpg', '2024:05:12 16:01:00'), ('b.jpg', '2024:05:12 16:01:30'), ('c.jpg', '2024:05:13 16:01:00')):
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[36867] = taken
+        Image.new('RGB', (16, 16)).save(source_dir / name, exif=exif)
+    (gpx_dir / 'days.gpx').write_text(
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+        '<trkpt lat="52.1159" lon="11.6037"><time>2024-05-12T14:00:00Z</time></trkpt>'
+        '<trkpt lat="52.1161" lon="11.6039"><time>2024-05-12T14:02:00Z</time></trkpt>'
+        '<trkpt lat="52.1159" lon="11.6037"><time>2024-05-13T14:00:00Z</time></trkpt>'
+        '<trkpt lat="52.1161" lon="11.6039"><time>2024-05-13T14:02:00Z</time></trkpt>'
+        '</trkseg></trk></gpx>', encoding='utf-8')
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.jpg'}
+    config['SETTINGS'] = {'gpx_dir': str(gpx_dir), 'gpx_camera_offset': '+02:00', 'gps_segment': 'true', 'gps_segment_gap': '3600'}
+    config['BOWLS_GPS'] = {'Magdeburg;2': '52.115946,11.603707'}
+    config_path = tmp_path / 'segment-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Magdeburg' / '2024-05-12' / 'a.jpg').exists()
+    assert (target_dir / 'Magdeburg' / '2024-05-12' / 'b.jpg').exists()
+    assert (target_dir / 'Magdeburg' / '2024-05-13' / 'c.jpg').exists()
+
+def test_gps_segment_uses_gpx_positions(tmp_path):
+    from PIL import Image
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    gpx_dir = tmp_path / 'gpx'
+    for d in (source_dir, target_dir, gpx_dir):
+        d.mkdir()
+    # Half an hour apart, but the track moves from Magdeburg to Berlin in between
+    for name, taken in (('a.jpg', '2024:05:12 16:01:00'), ('b.jpg', '2024:05:12 16:31:00')):
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[36867] = taken
+        Image.new('RGB', (16, 16)).save(source_dir / name, exif=exif)
+    (gpx_dir / 'day.gpx').write_text(
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+        '<trkpt lat="52.1159" lon="11.6037"><time>2024-05-12T14:00:00Z</time></trkpt>'
+        '<trkpt lat="52.1161" lon="11.6039"><time>2024-05-12T14:02:00Z</time></trkpt>'
+        '</trkseg><trkseg>'
+        '<trkpt lat="52.5200" lon="13.4050"><time>2024-05-12T14:30:00Z</time></trkpt>'
+        '<trkpt lat="52.5202" lon="13.4052"><time>2024-05-12T14:32:00Z</time></trkpt>'
+        '</trkseg></trk></gpx>', encoding='utf-8')
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.jpg'}
+    config['SETTINGS'] = {'gpx_dir': str(gpx_dir), 'gpx_camera_offset': '+02:00', 'gps_segment': 'true', 'gps_segment_gap': '3600'}
+    config['BOWLS_GPS'] = {'Magdeburg;2': '52.115946,11.603707', 'Berlin;2': '52.52,13.405'}
+    config_path = tmp_path / 'segment-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Magdeburg' / '2024-05-12' / 'a.jpg').exists()
+    assert (target_dir / 'Berlin' / '2024-05-12_2' / 'b.jpg').exists()
+
+def test_gps_polygon_bowl(tmp_path):
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    test_img_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imgtools')
+    shutil.copy(os.path.join(test_img_dir, 'testimage.jpg'), source_dir / 'testimage.jpg')
+    lat, lon = img_getgps(test_img_dir, 'testimage.jpg')
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.jpg'}
+    config['SETTINGS'] = {'overwrite': 'false'}
+    config['BOWLS_GPS_POLYGONS'] = {
+        'Elsewhere': f'{lat + 1},{lon};{lat + 2},{lon};{lat + 2},{lon + 1}',
+        'Site': f'{lat - 0.01},{lon - 0.01};{lat - 0.01},{lon + 0.01};{lat + 0.01},{lon + 0.01};{lat + 0.01},{lon - 0.01}',
+    }
+    config_path = tmp_path / 'polygon-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Site' / 'testimage.jpg').exists()
+
+def test_email_bowls_use_prefetched_mails(tmp_path):
+    from wit_pytools.cinderellasort import mail_prefetch
+    from wit_pytools.tests.mailfixtures import write_eml, write_msg
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    write_msg(source_dir / 'a.msg', 'Angebot', 'info@kunde.de')
+    write_eml(source_dir / 'b.eml', ['From: Info <info@lieferant.de>', 'Subject: Rechnung',
+                                      'Date: Tue, 25 May 2021 10:30:00 +0000'])
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.msg,.eml'}
+    config['SETTINGS'] = {'mail_workers': '1'}
+    config['BOWLS_EMAIL'] = {'Kunde': 'kunde.de', 'Lieferant': 'lieferant.de'}
+    assert mail_prefetch(str(source_dir), '.msg,.eml', config) == {
+        os.path.join(str(source_dir), 'a.msg'): ['2021-05-25', 'info@kunde.de', 'Angebot'],
+        os.path.join(str(source_dir), 'b.eml'): ['2021-05-25', 'info@lieferant.de', 'Rechnung'],
+    }
+    config_path = tmp_path / 'mail-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Kunde' / '2021-05-25_info@kunde.de_target_Angebot.msg').exists()
+    assert (target_dir / 'Lieferant' / '2021-05-25_info@lieferant.de_target_Rechnung.eml').exists()
+
+def test_bowldir_email_domains():
+    from wit_pytools.cinderellasort import bowldir_email
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['BOWLS_EMAIL'] = {'Kunde': '@kunde.de', 'Projekt': 'Hyparschale', 'Rest': '!DEFAULT', 'Kaputt': '!MALFORMED'}
+    assert bowldir_email('2021-05-25_a@kunde.de_target_Hyparschale.msg', config) == '/Kunde'
+    assert bowldir_email('2021-05-25_a@other.de_target_Hyparschale.msg', config) == '/Projekt'
+    assert bowldir_email('2021-05-25_a@other.de_target_Angebot.msg', config, sender='a@kunde.de') == '/Kunde'
+    assert bowldir_email('2021-05-25_a@other.de_target_Angebot.msg', config) == '/Rest'
+    assert bowldir_email('2021-05-25__target_Angebot.msg', config) == '/Kaputt'
+
+def test_bowldir_email_dotted_criteria_are_substrings():
+    from wit_pytools.cinderellasort import bowldir_email
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['BOWLS_EMAIL'] = {'Plan': 'Plan.Rev', 'Kunde': 'kunde.de', 'Rest': '!DEFAULT'}
+    assert bowldir_email('2021-05-25_a@other.de_proj_Plan.Rev 3.msg', config) == '/Plan'
+    assert bowldir_email('2021-05-25_a@other.de_proj_Anfrage kunde.de Portal.msg', config) == '/Kunde'
+    assert bowldir_email('2021-05-25_a@mail.kunde.de_proj_Angebot.msg', config, sender='a@mail.kunde.de') == '/Kunde'
+    assert bowldir_email('2021-05-25_a@other.de_proj_Angebot.msg', config, sender='a@kunde.de') == '/Rest'
+
+def test_email_bowls_skip_duplicates(tmp_path):
+    from wit_pytools.tests.mailfixtures import write_eml
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    headers = ['From: Info <info@kunde.de>', 'Subject: Angebot', 'Date: Tue, 25 May 2021 10:30:00 +0000',
+               'Message-ID: <1@kunde.de>']
+    write_eml(source_dir / 'a.eml', headers)
+    write_eml(source_dir / 'b.eml', headers)
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.eml'}
+    config['SETTINGS'] = {'mail_dedup_index': str(tmp_path / 'mails.sqlite'), 'mail_dedup_action': 'trash'}
+    config['BOWLS_EMAIL'] = {'Kunde': 'kunde.de'}
+    config_path = tmp_path / 'dedup-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+    assert [p.name for p in (target_dir / 'Kunde').iterdir()] == ['2021-05-25_info@kunde.de_target_Angebot.eml']
+    assert not list(source_dir.iterdir())
+
+    # A later run skips the re-exported copy and leaves it in place
+    config['SETTINGS']['mail_dedup_action'] = 'skip'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+    write_eml(source_dir / 'c.eml', headers)
+    cinderellasort(str(config_path), dryrun=False)
+    assert len(list((target_dir / 'Kunde').iterdir())) == 1
+    assert (source_dir / 'c.eml').exists()
+
+def test_mail_prefetch_skips_duplicates(tmp_path, monkeypatch):
+    import wit_pytools.mailtools as mailtools
+    from wit_pytools.cinderellasort import mail_prefetch
+    from wit_pytools.mailtools import mail_dedup_index
+    from wit_pytools.tests.mailfixtures import write_eml
+
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    headers = ['From: Info <info@kunde.de>', 'Subject: Angebot', 'Date: Tue, 25 May 2021 10:30:00 +0000']
+    write_eml(source_dir / 'a.eml', headers + ['Message-ID: <1@kunde.de>'])
+    write_eml(source_dir / 'b.eml', headers + ['Message-ID: <1@kunde.de>'])
+    write_eml(source_dir / 'c.eml', headers + ['Message-ID: <2@kunde.de>'])
+    write_eml(source_dir / 'd.eml', headers + ['Message-ID: <3@kunde.de>'])
+    sorted_mail = tmp_path / 'sorted.eml'
+    sorted_mail.write_bytes(b'x')
+    mail_dedup_index(str(tmp_path / 'mails.sqlite')).add('mid:3@kunde.de', sorted_mail)
+
+    parsed = []
+    parse_many = mailtools.parse_many
+    monkeypatch.setattr(mailtools, 'parse_many', lambda paths, **kwargs: parsed.extend(paths) or parse_many(paths, **kwargs))
+    config = ConfigParser()
+    config['SETTINGS'] = {'mail_dedup_index': str(tmp_path / 'mails.sqlite'), 'mail_workers': '1'}
+    mails = mail_prefetch(str(source_dir), '.eml', config)
+    # One of the two copies of <1@kunde.de>, d.eml was sorted before
+    names = sorted(os.path.basename(path) for path in parsed)
+    assert names in (['a.eml', 'c.eml'], ['b.eml', 'c.eml'])
+    assert sorted(os.path.basename(path) for path in mails) == names
+
+def test_mail_dedup_keys_computed_once(tmp_path, monkeypatch):
+    import wit_pytools.mailtools as mailtools
+    from wit_pytools.tests.mailfixtures import write_eml
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    headers = ['From: Info <info@kunde.de>', 'Subject: Angebot', 'Date: Tue, 25 May 2021 10:30:00 +0000']
+    for name in ('a.eml', 'b.eml', 'c.eml'):
+        write_eml(source_dir / name, headers, attachment_size=1000 if name == 'c.eml' else 0)
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.eml,.bin'}
+    config['SETTINGS'] = {'mail_dedup_index': str(tmp_path / 'mails.sqlite'), 'mail_dedup_action': 'trash',
+                          'mail_attachments': 'true', 'mail_workers': '1'}
+    config['BOWLS_EMAIL'] = {'Kunde': 'kunde.de'}
+    config_path = tmp_path / 'dedup-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+    hashed = []
+    dedup_key = mailtools.mail_dedup_key
+    monkeypatch.setattr(mailtools, 'mail_dedup_key', lambda path: hashed.append(os.path.basename(path)) or dedup_key(path))
+
+    cinderellasort(str(config_path), dryrun=False)
+    assert sorted(hashed) == ['a.eml', 'b.eml', 'c.eml']
+    # a and b are the same mail without Message-ID, one copy is sorted and one trashed
+    assert len([p for p in (target_dir / 'Kunde').iterdir() if p.suffix == '.eml']) == 2
+    assert not list(source_dir.iterdir())
+
+def test_mail_attachments_sorted_into_bowls(tmp_path):
+    import base64
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    pdf = os.urandom(2000)
+    (source_dir / 'mail.eml').write_bytes(b'\r\n'.join([
+        b'From: Info <info@kunde.de>', b'Subject: Rechnung', b'Date: Tue, 25 May 2021 10:30:00 +0000',
+        b'Content-Type: multipart/mixed; boundary="XX"', b'',
+        b'--XX', b'Content-Type: text/plain', b'', b'Anbei die Rechnung', b'',
+        b'--XX', b'Content-Type: application/pdf', b'Content-Transfer-Encoding: base64',
+        b'Content-Disposition: attachment; filename="Rechnung.pdf"', b'', base64.encodebytes(pdf),
+        b'--XX', b'Content-Type: text/plain', b'Content-Disposition: attachment; filename="Lieferschein.txt"', b'',
+        b'Lieferschein 17', b'--XX--', b'']))
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.eml,.pdf,.txt'}
+    config['SETTINGS'] = {'mail_attachments': 'true', 'mail_workers': '1'}
+    config['BOWLS'] = {'Rechnungen': 'Rechnung', 'Lieferscheine': 'Lieferschein'}
+    config['BOWLS_EMAIL'] = {'Kunde': 'kunde.de'}
+    config_path = tmp_path / 'attachment-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Kunde' / '2021-05-25_info@kunde.de_target_Rechnung.eml').exists()
+    assert (target_dir / 'Rechnungen' / '2021-05-25_info@kunde.de_Rechnung.pdf').read_bytes() == pdf
+    # Attachments go to the standard bowls, not through the email bowls
+    assert (target_dir / 'Lieferscheine' / '2021-05-25_info@kunde.de_Lieferschein.txt').read_bytes() == b'Lieferschein 17'
+
+def test_email_bowls_from_mbox(tmp_path):
+    from wit_pytools.tests.mailfixtures import MBOX
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    (source_dir / 'export.mbox').write_bytes(MBOX + b'\n' + MBOX)
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.mbox'}
+    config['SETTINGS'] = {'overwrite': 'false'}
+    config['BOWLS_EMAIL'] = {'Alice': 'alice@', 'Rest': '!DEFAULT'}
+    config_path = tmp_path / 'mbox-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert (target_dir / 'Alice' / '2021-05-25_alice@example.com_target_Erste.eml').exists()
+    assert (target_dir / 'Alice' / '2021-05-25_alice@example.com_target_Erste#2.eml').exists()
+    assert len(list((target_dir / 'Rest').iterdir())) == 2
+
+def test_mailboxes_are_extracted_once(tmp_path):
+    from wit_pytools.tests.mailfixtures import MBOX
+
+    source_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+    source_dir.mkdir()
+    target_dir.mkdir()
+    (source_dir / 'export.mbox').write_bytes(MBOX)
+    maildir = source_dir / 'Maildir'
+    for sub in ('cur', 'new', 'tmp'):
+        (maildir / sub).mkdir(parents=True)
+    (maildir / 'new' / '1.host').write_bytes(b'From: Carol <carol@example.net>\nSubject: Dritte\n'
+                                             b'Date: Thu, 27 May 2021 10:30:00 +0000\n\nHallo\n')
+
+    config = ConfigParser()
+    config.optionxform = str
+    config['TABLE'] = {'sourcedir': str(source_dir), 'targetdir': str(target_dir), 'ftype_sort': '.mbox,maildir'}
+    config['SETTINGS'] = {'overwrite': 'false'}
+    config['BOWLS_EMAIL'] = {'Rest': '!DEFAULT'}
+    config_path = tmp_path / 'mailbox-sort.ini'
+    with config_path.open('w') as configfile:
+        config.write(configfile)
+
+    cinderellasort(str(config_path), dryrun=False)
+    cinderellasort(str(config_path), dryrun=False)
+
+    assert sorted(p.name for p in (target_dir / 'Rest').iterdir()) == [
+        '2021-05-25_alice@example.com_target_Erste.eml',
+        '2021-05-26_bob@example.org_target_Zweite Grüße.eml',
+        '2021-05-27_carol@example.net_target_Dritte.eml',
+    ]
+    assert sorted(p.name for p in (target_dir / '_mailboxes').iterdir()) == ['Maildir', 'export.mbox']
+    assert not (source_dir / 'export.mbox').exists() and not maildir.exists()
+
 def test_trash_nocase_removes_sample_files(tmp_path):
     source_dir = tmp_path / 'source'
     target_dir = tmp_path / 'target'
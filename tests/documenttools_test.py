@@ -7,7 +7,10 @@ import pytest
 # Allow importing wit_pytools when running tests directly
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from wit_pytools.documenttools import document_find_regex
+from wit_pytools.documenttools import document_find_regex, document_find_regex_many, document_first_match, document_contains
+from wit_pytools.documenttools import _page_order, DocumentIndex, document_iter_pages
+from wit_pytools.tests.pdffixtures import write_text_pdf
+from wit_pytools.documenttools import document_metadata, document_metadata_match, document_iter_text
 
 TEST_DOC = Path(__file__).parent / "documenttools" / "testdocument.pdf"
 
@@ -31,3 +34,267 @@ def test_document_find_regex_requires_pdfplumber(monkeypatch):
 
     with pytest.raises(RuntimeError):
         document_find_regex(TEST_DOC, "anything")
+
+
+def test_document_find_regex_max_matches():
+    results = document_find_regex(TEST_DOC, "e", max_matches=2)
+
+    assert len(results) == 2
+
+
+def test_document_find_regex_many(tmp_path):
+    import shutil
+
+    (tmp_path / "sub").mkdir()
+    for name in ("a.pdf", "b.pdf", "sub/c.pdf"):
+        shutil.copy(TEST_DOC, tmp_path / name)
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+    (tmp_path / "notes.txt").write_text("manfred@mustermann.de")
+
+    expected = document_find_regex(TEST_DOC, "manfred@mustermann.de")
+    results = dict(document_find_regex_many(tmp_path, "manfred@mustermann.de", workers=2))
+
+    assert sorted(results) == sorted(str(tmp_path / name) for name in ("a.pdf", "b.pdf", "sub/c.pdf", "broken.pdf"))
+    assert results[str(tmp_path / "broken.pdf")] is None
+    assert results[str(tmp_path / "sub" / "c.pdf")] == expected
+
+    first = dict(document_find_regex_many([tmp_path / "a.pdf"], "e", workers=1, first_hit=True))
+    assert len(first[str(tmp_path / "a.pdf")]) == 1
+
+
+def test_document_find_regex_multiple_queries():
+    queries = {"mail": r"[A-Za-z]+@mustermann\.de", "domain": r"mustermann\.com"}
+    results = document_find_regex(TEST_DOC, queries, regex=True)
+    separate = {qid: document_find_regex(TEST_DOC, q, regex=True) for qid, q in queries.items()}
+
+    for qid in queries:
+        hits = [{k: v for k, v in res.items() if k != "query"} for res in results if res["query"] == qid]
+        assert hits == separate[qid]
+    assert any(res["query"] == "mail" for res in results)
+
+    listed = document_find_regex(TEST_DOC, ["manfred@mustermann.de", "nothing-like-this"])
+    assert listed and all(res["query"] == 0 for res in listed)
+
+
+def test_document_find_regex_backreference_fallback():
+    results = document_find_regex(TEST_DOC, [r"(\w)\1", r"mustermann"], regex=True)
+
+    assert {res["query"] for res in results} == {0, 1}
+
+
+def test_page_order():
+    assert _page_order(10, 2, 1) == [0, 1, 9, 2, 3, 4, 5, 6, 7, 8]
+    assert _page_order(2, 2, 1) == [0, 1]
+    assert _page_order(3, 0, 2) == [1, 2, 0]
+
+
+def test_document_first_match_page_window_and_priority():
+    queries = ["Beschäftigung", "Manfred"]
+
+    first = document_first_match(TEST_DOC, queries)
+    assert first["page_number"] == 1 and first["query"] == 1
+
+    last_first = document_first_match(TEST_DOC, queries, first_pages=0, last_pages=1)
+    assert last_first["page_number"] == 2 and last_first["query"] == 0
+
+    ordered = document_first_match(TEST_DOC, queries, ordered=True)
+    assert ordered["query"] == 0 and ordered["match"] == "Beschäftigung"
+
+    assert document_contains(TEST_DOC, "manfred@mustermann.de")
+    assert not document_contains(TEST_DOC, "nothing-like-this")
+
+
+def test_document_contains_skips_pages_without_text(tmp_path):
+    from PIL import Image
+
+    scan = tmp_path / "scan.pdf"
+    Image.new("RGB", (64, 64), "white").save(scan)
+
+    assert document_first_match(scan, "anything") is None
+
+
+def test_document_index_incremental(tmp_path):
+    import shutil
+
+    archive = tmp_path / "archive"
+    (archive / "sub").mkdir(parents=True)
+    shutil.copy(TEST_DOC, archive / "a.pdf")
+    shutil.copy(TEST_DOC, archive / "sub" / "b.pdf")
+
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    assert index.update_dir(archive) == {"indexed": 2, "unchanged": 0, "failed": 0, "removed": 0}
+    assert index.update_dir(archive)["unchanged"] == 2
+    assert index.stats() == {"documents": 2, "pages": 4}
+
+    hits = index.search("Beschäftigung")
+    assert {hit["page_number"] for hit in hits} == {2}
+    assert "[Beschäftigung]" in hits[0]["snippet"]
+    assert index.search("manfred@mustermann.de", literal=True)
+
+    os.remove(archive / "sub" / "b.pdf")
+    assert index.update_dir(archive)["removed"] == 1
+    assert [hit["path"] for hit in index.search("Gewerbe")] == [str(archive / "a.pdf")]
+    index.remove(archive / "a.pdf")
+    assert index.stats() == {"documents": 0, "pages": 0}
+    assert index.search("Gewerbe") == []
+    index.close()
+
+
+@pytest.mark.parametrize("backend", ["pdfplumber", "pypdf", "pdfminer"])
+def test_document_iter_pages_backends(backend):
+    pages = list(document_iter_pages(TEST_DOC, backend))
+
+    assert [number for number, _ in pages] == [1, 2]
+    assert "manfred@mustermann.de" in pages[0][1]
+    assert [number for number, _ in document_iter_pages(TEST_DOC, backend, order=lambda n: reversed(range(n)))] == [2, 1]
+    assert len(list(document_iter_pages(TEST_DOC, backend, max_pages=1))) == 1
+    assert document_find_regex(TEST_DOC, "manfred@mustermann.de", backend=backend)[0]["page_number"] == 1
+
+
+@pytest.mark.parametrize("backend", ["pdfplumber", "pypdf", "pdfminer"])
+def test_document_iter_pages_nested_page_tree(tmp_path, backend):
+    path = tmp_path / "tree.pdf"
+    write_text_pdf(path, [f"Seite {i + 1} (von 20)" for i in range(20)], fanout=3)
+
+    pages = list(document_iter_pages(path, backend))
+    assert [number for number, _ in pages] == list(range(1, 21))
+    assert all(text == f"Seite {number} (von 20)" for number, text in pages)
+    # Pages are looked up in the page tree in any order
+    order = [19, 0, 7, 3, 12]
+    pages = list(document_iter_pages(path, backend, order=lambda n: order))
+    assert [text for _, text in pages] == [f"Seite {i + 1} (von 20)" for i in order]
+    # Without page counts the pages are enumerated instead
+    broken = tmp_path / "nocount.pdf"
+    broken.write_bytes(path.read_bytes().replace(b"/Count", b"/Xount"))
+    pages = list(document_iter_pages(broken, backend, order=lambda n: order))
+    assert [text for _, text in pages] == [f"Seite {i + 1} (von 20)" for i in order]
+
+
+def test_document_iter_pages_unknown_backend():
+    with pytest.raises(ValueError):
+        list(document_iter_pages(TEST_DOC, "ocr"))
+
+
+def test_document_metadata(tmp_path):
+    metadata = document_metadata(TEST_DOC)
+    assert metadata["Producer"] == "jsPDF 2.5.2"
+    assert metadata["CreationDate"].startswith("D:2026")
+
+    assert document_metadata_match(TEST_DOC, ["Scanner", "jspdf"]) == {"field": "Producer", "match": "jsPDF", "query": 1}
+    assert document_metadata_match(TEST_DOC, "manfred") is None
+
+    # Title and Author only present in XMP
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(100, 100)
+    xmp = (
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmp:CreatorTool="ScanSnap Manager">'
+        '<dc:title><rdf:Alt><rdf:li xml:lang="x-default">Rechnung 4711</rdf:li></rdf:Alt></dc:title>'
+        '<dc:creator><rdf:Seq><rdf:li>Stadtwerke</rdf:li></rdf:Seq></dc:creator>'
+        '</rdf:Description></rdf:RDF></x:xmpmeta>'
+    )
+    writer.xmp_metadata = xmp.encode("utf-8")
+    writer.add_metadata({"/Subject": "Stromabrechnung"})
+    path = tmp_path / "scan.pdf"
+    with open(path, "wb") as fp:
+        writer.write(fp)
+
+    metadata = document_metadata(path)
+    assert metadata["Title"] == "Rechnung 4711"
+    assert metadata["Author"] == "Stadtwerke"
+    assert metadata["Creator"] == "ScanSnap Manager"
+    assert metadata["Subject"] == "Stromabrechnung"
+
+
+DOCX_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:r><w:t>Rechnung</w:t></w:r><w:r><w:tab/><w:t xml:space="preserve">Nr. 4711</w:t></w:r></w:p>'
+    '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>Stadtwerke</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+    '{paragraphs}</w:body></w:document>'
+)
+ODT_XML = (
+    '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:text>'
+    '<text:h>Vertrag</text:h><text:p>Kunde<text:s text:c="2"/><text:span>Mustermann</text:span></text:p>'
+    '</office:text></office:body></office:document-content>'
+)
+
+
+def _write_zip(path, member, xml):
+    import zipfile
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(member, xml)
+
+
+def test_document_iter_text_formats(tmp_path):
+    filler = "".join(f"<w:p><w:r><w:t>Absatz {i}</w:t></w:r></w:p>" for i in range(2000))
+    docx = tmp_path / "brief.docx"
+    _write_zip(docx, "word/document.xml", DOCX_XML.format(paragraphs=filler))
+    blocks = list(document_iter_text(docx, chunk_chars=1000))
+    assert len(blocks) > 10
+    assert blocks[0].startswith("Rechnung\tNr. 4711\nStadtwerke\nAbsatz 0")
+    assert blocks[-1].endswith("Absatz 1999")
+    assert document_first_match(docx, ["Absatz 1999", "4711"])["query"] == 1
+
+    odt = tmp_path / "vertrag.odt"
+    _write_zip(odt, "content.xml", ODT_XML)
+    assert list(document_iter_text(odt)) == ["Vertrag\nKunde  Mustermann"]
+
+    txt = tmp_path / "notiz.txt"
+    txt.write_text("erste Zeile\r\nKundennummer 123\n", encoding="utf-8")
+    assert document_find_regex(txt, r"Kundennummer \d+", regex=True)[0]["match"] == "Kundennummer 123"
+
+    eml = tmp_path / "mail.eml"
+    eml.write_bytes(
+        b"From: a@example.com\r\nSubject: Hallo\r\nContent-Type: text/plain; charset=utf-8\r\n"
+        b"Content-Transfer-Encoding: quoted-printable\r\n\r\nIhre Bestellung =C3=BCber 3 Artikel\r\n"
+    )
+    assert document_contains(eml, "Bestellung über")
+
+    with pytest.raises(ValueError):
+        list(document_iter_text(tmp_path / "bild.png"))
+
+
+def test_document_iter_text_docx_text_box(tmp_path):
+    textbox = (
+        '<w:p><w:r><w:t>Anschrift</w:t></w:r><w:r><w:pict><w:txbxContent>'
+        '<w:p><w:r><w:t>Kundennummer 123</w:t></w:r></w:p></w:txbxContent></w:pict></w:r></w:p>'
+    )
+    docx = tmp_path / "textbox.docx"
+    _write_zip(docx, "word/document.xml", DOCX_XML.format(paragraphs=textbox))
+    text = "".join(document_iter_text(docx))
+    assert text.count("Kundennummer 123") == 1
+    assert text.endswith("Kundennummer 123\nAnschrift")
+
+
+def test_document_iter_text_eml_multipart(tmp_path):
+    import base64
+
+    attachment = base64.encodebytes(os.urandom(300000)).replace(b"\n", b"\r\n")
+    text = "Sehr geehrte Damen und Herren,\nanbei die Rechnung für März.\n" * 3
+    eml = tmp_path / "rechnung.eml"
+    eml.write_bytes(
+        b'From: a@example.com\r\nSubject: Rechnung\r\nMIME-Version: 1.0\r\n'
+        b'Content-Type: multipart/mixed; boundary="outer"\r\n\r\npreamble\r\n'
+        b'--outer\r\nContent-Type: multipart/alternative; boundary="inner"\r\n\r\n'
+        b'--inner\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: base64\r\n\r\n'
+        + base64.encodebytes(text.encode("utf-8")).replace(b"\n", b"\r\n")
+        + b'\r\n--inner\r\nContent-Type: text/html; charset=utf-8\r\n\r\n<p>nur html</p>\r\n'
+        b'--inner--\r\n--outer\r\nContent-Type: text/plain; name="scan.txt"\r\n'
+        b'Content-Disposition: attachment; filename="scan.txt"\r\nContent-Transfer-Encoding: base64\r\n\r\n'
+        + attachment + b'--outer--\r\n'
+    )
+    assert list(document_iter_text(eml)) == [text.rstrip("\n")]
+
+    html = tmp_path / "html.eml"
+    html.write_bytes(
+        b"From: a@example.com\r\nContent-Type: text/html; charset=iso-8859-1\r\n"
+        b"Content-Transfer-Encoding: quoted-printable\r\n\r\n<p>Betrag <b\r\n"
+        b"class=3D\"x\">12,50 EUR</b> f=FCr M=E4rz</p>\r\n"
+    )
+    assert document_contains(html, "12,50 EUR")
+    assert document_contains(html, "für März")
@@ -6,7 +6,10 @@ import math
 # Add the parent directory to the path so we can import modules from wit_pytools
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
-from gpstools import gps_distance
+from gpstools import gps_distance, gps_distance_many, nearest_within, GpsGazetteer, gps_cluster, gps_cluster_dir, gps_bowl_suggestions
+from gpstools import GpsTrack, gpx_load_tracks, exif_datetime_to_epoch, parse_time_offset
+from gpstools import GpsPolygonIndex, gps_parse_polygon, gps_polygon_index
+from gpstools import gps_segment, gps_segment_stream
 from imgtools import img_getexif, img_getgps
 
 def test_gps_distance():
@@ -107,6 +110,234 @@ def test_distance_to_magdeburg():
         print(f"Error: {e}")
         assert False, f"Test distance_to_magdeburg: FAILED - {str(e)}"
 
+def test_gps_distance_many_matches_scalar():
+    points = [(52.5200, 13.4050), (40.7128, -74.0060), (51.5074, -0.1278)]
+    centers = [(48.8566, 2.3522), (34.0522, -118.2437)]
+    matrix = gps_distance_many(points, centers)
+    assert matrix.shape == (3, 2)
+    for i, point in enumerate(points):
+        for j, center in enumerate(centers):
+            assert math.isclose(matrix[i, j], gps_distance(point, center), rel_tol=1e-9)
+
+def test_nearest_within():
+    magdeburg = (52.115946, 11.603707)
+    berlin = (52.5200, 13.4050)
+    points = [(52.12, 11.61), (52.52, 13.40), (48.8566, 2.3522)]
+    # Berlin is listed twice, the nearer centre wins
+    centers = [magdeburg, berlin, (52.53, 13.41)]
+    result = nearest_within(points, centers, [3, 5, 5])
+    assert list(result) == [0, 1, -1]
+    # Radius is exclusive like in bowldir_gps
+    assert list(nearest_within(points[:1], [magdeburg], 0.0)) == [-1]
+
+GAZETTEER_ROWS = [
+    # geonameid, name, asciiname, alternatenames, latitude, longitude, feature class, feature code, country code
+    ("2874545", "Magdeburg", "Magdeburg", "", "52.12773", "11.62916", "P", "PPLA", "DE"),
+    ("2950159", "Berlin", "Berlin", "", "52.52437", "13.41053", "P", "PPLC", "DE"),
+    ("2988507", "Paris", "Paris", "", "48.85341", "2.3488", "P", "PPLC", "FR"),
+    ("2911298", "Elbe", "Elbe", "", "52.2", "11.7", "H", "STM", "DE"),
+    ("4036284", "Alofi", "Alofi", "", "-19.05951", "-169.92086", "P", "PPLC", "NU"),
+    ("2198148", "Lambasa", "Labasa", "", "-16.41667", "179.38333", "P", "PPL", "FJ"),
+]
+
+def _write_gazetteer(path):
+    with open(path, "w", encoding="utf-8") as fh:
+        for row in GAZETTEER_ROWS:
+            fh.write("\t".join(row) + "\n")
+
+def test_gazetteer_nearest(tmp_path):
+    tsv = tmp_path / "cities.txt"
+    _write_gazetteer(tsv)
+    index_dir = str(tmp_path / "index")
+    gazetteer = GpsGazetteer.load(str(tsv), index_dir)
+    # Only populated places are kept
+    assert len(gazetteer) == 5
+    place = gazetteer.nearest((52.115946, 11.603707))
+    assert place["name"] == "Magdeburg" and place["country"] == "DE"
+    assert place["distance_km"] < 3
+    assert gazetteer.nearest((50.0, 5.0), max_km=20) is None
+    # Nearest place across the antimeridian
+    assert gazetteer.nearest((-16.4, -179.9), max_km=100)["name"] == "Lambasa"
+    # Second load memory-maps the existing index
+    reopened = GpsGazetteer.load(str(tsv), index_dir)
+    assert reopened.nearest((52.5, 13.4))["name"] == "Berlin"
+
+def test_gazetteer_nearest_many_matches_nearest(tmp_path):
+    tsv = tmp_path / "cities.txt"
+    _write_gazetteer(tsv)
+    gazetteer = GpsGazetteer.build(str(tsv), str(tmp_path / "index"))
+    points = [(52.12, 11.6), (48.9, 2.3), (0.0, 0.0), (-19.0, -169.9), (-16.4, -179.9)]
+    indices, distances = gazetteer.nearest_many(points, max_km=100)
+    for point, index, dist in zip(points, indices, distances):
+        place = gazetteer.nearest(point, max_km=100)
+        if place is None:
+            assert index == -1
+        else:
+            assert gazetteer.place(index)["name"] == place["name"]
+            assert math.isclose(dist, place["distance_km"])
+    names = [p and p["name"] for p in gazetteer.reverse_geocode_many(points, max_km=100)]
+    assert names == ["Magdeburg", "Paris", None, "Alofi", "Lambasa"]
+
+def test_gps_cluster_and_bowl_suggestions():
+    import numpy as np
+    rng = np.random.default_rng(0)
+    magdeburg = rng.normal((52.1159, 11.6037), 0.001, (40, 2))
+    berlin = rng.normal((52.5200, 13.4050), 0.001, (20, 2))
+    noise = np.array([(48.8566, 2.3522), (51.5074, -0.1278)])
+    points = np.vstack((berlin, magdeburg, noise))
+    labels = gps_cluster(points, eps_km=0.5, min_samples=5)
+    # Largest cluster first, isolated points are noise
+    assert set(labels[20:60]) == {0}
+    assert set(labels[:20]) == {1}
+    assert list(labels[60:]) == [-1, -1]
+    lines = gps_bowl_suggestions(points, labels, min_size=30)
+    assert len(lines) == 1
+    name, rest = lines[0].split(';')
+    radius, coords = rest.split('=')
+    lat, lon = map(float, coords.split(','))
+    assert name == 'Cluster 01'
+    assert 0 < float(radius) < 2
+    assert gps_distance((lat, lon), (52.1159, 11.6037)) < 0.1
+
+def test_gps_cluster_matches_brute_force():
+    import numpy as np
+    from gpstools import _gps_xyz
+    rng = np.random.default_rng(3)
+    centres = rng.uniform((52.0, 11.0), (52.2, 11.3), (6, 2))
+    points = np.vstack([rng.normal(c, rng.uniform(0.001, 0.01), (rng.integers(20, 200), 2)) for c in centres]
+                       + [rng.uniform((52.0, 11.0), (52.2, 11.3), (200, 2))])
+    xyz = _gps_xyz(points[:, 0], points[:, 1])
+    d2 = ((xyz[:, None, :] - xyz[None, :, :]) ** 2).sum(axis=2)
+    for eps_km, min_samples in ((0.5, 5), (0.3, 3), (1.0, 10)):
+        labels = gps_cluster(points, eps_km=eps_km, min_samples=min_samples)
+        within = d2 <= eps_km ** 2
+        core = within.sum(axis=1) >= min_samples
+        assert (core <= (labels >= 0)).all()
+        # Core points within eps share a cluster, core points of one cluster are connected
+        assert (labels[:, None] == labels[None, :])[within & core[:, None] & core[None, :]].all()
+        for label in set(labels[core]):
+            members = np.flatnonzero(core & (labels == label))
+            reached = {members[0]}
+            frontier = [members[0]]
+            while frontier:
+                nxt = np.flatnonzero(within[frontier.pop()] & core)
+                frontier += [q for q in nxt if q not in reached]
+                reached.update(nxt)
+            assert reached == set(members)
+        # Border points join the cluster of their nearest core point within eps
+        for p in np.flatnonzero(~core):
+            candidates = np.flatnonzero(within[p] & core)
+            expected = labels[candidates[d2[p, candidates].argmin()]] if len(candidates) else -1
+            assert labels[p] == expected
+
+def test_gps_cluster_dir():
+    test_img_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imgtools")
+    paths, points, labels = gps_cluster_dir(test_img_dir, eps_km=1.0, min_samples=1)
+    assert any(path.endswith("testimage.jpg") for path in paths)
+    assert len(paths) == len(points) == len(labels)
+    assert (labels >= 0).all()
+
+GPX_TRACK = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <trk><trkseg>
+    <trkpt lat="52.1000" lon="11.6000"><time>2024-05-12T14:00:00Z</time></trkpt>
+    <trkpt lat="52.2000" lon="11.8000"><time>2024-05-12T14:02:00Z</time></trkpt>
+    <trkpt lat="52.3000" lon="11.9000"><time>2024-05-12T18:00:00.500+02:00</time></trkpt>
+  </trkseg></trk>
+</gpx>
+"""
+
+def test_gpx_track_interpolation(tmp_path):
+    (tmp_path / "track.gpx").write_text(GPX_TRACK, encoding="utf-8")
+    track = gpx_load_tracks(str(tmp_path))
+    assert len(track) == 3
+    start = exif_datetime_to_epoch("2024:05:12 14:00:00")
+    # Halfway between the first two points
+    lat, lon = track.locate(start + 60)
+    assert math.isclose(lat, 52.15) and math.isclose(lon, 11.7)
+    # Camera clock two hours ahead of UTC
+    assert track.locate(exif_datetime_to_epoch("2024:05:12 16:02:00", parse_time_offset("+02:00"))) == (52.2, 11.8)
+    # Gap between the last points is too large, only points near a track point are located
+    assert track.locate(start + 1800) is None
+    assert track.locate(start + 300) == (52.2, 11.8)
+    assert track.locate(start - 3600) is None
+    located = track.locate_many([start, start + 60, start + 1800], max_gap=300)
+    assert located.shape == (3, 2)
+    assert math.isnan(located[2, 0])
+
+def test_gpstrack_single_point():
+    track = GpsTrack([100.0], [52.0], [11.0])
+    assert track.locate(100.0) == (52.0, 11.0)
+    assert track.locate(1000.0) is None
+    assert parse_time_offset("-01:30") == -5400
+    assert parse_time_offset("3600") == 3600
+
+def test_gps_polygon_index():
+    square = gps_parse_polygon("52.0,11.0;52.0,12.0;53.0,12.0;53.0,11.0|52.4,11.4;52.4,11.6;52.6,11.6;52.6,11.4")
+    assert len(square) == 2
+    triangle = gps_parse_polygon("52.5, 11.5; 52.9, 11.9; 52.9, 11.5")
+    index = GpsPolygonIndex([('Square', square), ('Triangle', triangle)])
+    assert index.name((52.2, 11.2)) == 'Square'
+    # Inside the hole of the square, only the triangle applies
+    assert index.name((52.55, 11.45)) is None
+    assert index.name((52.58, 11.52)) == 'Triangle'
+    # Overlap: the first polygon wins
+    assert index.name((52.8, 11.7)) == 'Square'
+    assert index.name((51.0, 11.5)) is None
+    with pytest.raises(ValueError):
+        gps_parse_polygon("52.0,11.0;52.0,12.0")
+
+def test_gps_polygon_index_locate_many(tmp_path):
+    import json
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(3)
+    features = []
+    for i in range(60):
+        lat, lon = rng.uniform(40, 60), rng.uniform(-10, 30)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 7))
+        radius = rng.uniform(0.2, 2.0, 7)
+        ring = [[lon + r * np.cos(a), lat + r * np.sin(a)] for a, r in zip(angles, radius)]
+        features.append({"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]}})
+    geojson = tmp_path / "sites.geojson"
+    geojson.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+    index = gps_polygon_index((("Sites", str(geojson)), ("Germany;tag", "47,6;47,15;55,15;55,6")))
+    assert len(index) == 61
+    points = np.column_stack([rng.uniform(39, 61, 5000), rng.uniform(-11, 31, 5000)])
+    located = index.locate_many(points)
+    assert (located >= 0).any() and (located == -1).any()
+    assert located.tolist() == [index.locate(p) for p in points]
+    assert index.names[60] == 'Germany'
+
+def test_gps_segment():
+    nan = float('nan')
+    times = [0, 60, 120, 30000, 30060, 30120, 30180]
+    lats = [52.0, 52.001, nan, 52.0, 52.0, 48.0, 48.0]
+    lons = [11.0, 11.001, nan, 11.0, 11.0, 11.0, 11.0]
+    # Split on the time gap and on the ~450 km jump, but not on missing coordinates
+    assert gps_segment(times, lats, lons, max_gap_s=3600, max_dist_km=50).tolist() == [0, 0, 0, 1, 1, 2, 2]
+    assert gps_segment([], [], []).tolist() == []
+    # A photo without coordinates does not bridge the jump between its neighbours
+    assert gps_segment([0, 60, 120, 180], [52.0, nan, 48.0, 48.0], [11.0, nan, 11.0, 11.0],
+                       max_gap_s=3600, max_dist_km=50).tolist() == [0, 0, 1, 1]
+
+def test_gps_segment_stream_matches_array():
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(5)
+    times = np.cumsum(rng.exponential(1800, 1000))
+    lats = 50 + np.cumsum(rng.normal(0, 0.05, 1000))
+    lons = 10 + np.cumsum(rng.normal(0, 0.05, 1000))
+    expected = gps_segment(times, lats, lons, max_gap_s=3600, max_dist_km=5)
+    records = list(zip(times.tolist(), lats.tolist(), lons.tolist()))
+    streamed = [segment for _, segment in gps_segment_stream(records, 3600, 5, chunk_size=97)]
+    assert streamed == expected.tolist()
+    assert expected[-1] > 10
+    # Runs of photos without coordinates across chunk borders
+    lats[rng.random(1000) < 0.6] = np.nan
+    expected = gps_segment(times, lats, lons, max_gap_s=3600, max_dist_km=5)
+    records = [(t, None if math.isnan(lat) else lat, lon) for t, lat, lon in zip(times.tolist(), lats.tolist(), lons.tolist())]
+    streamed = [segment for _, segment in gps_segment_stream(records, 3600, 5, chunk_size=7)]
+    assert streamed == expected.tolist()
+
 # Run the tests using pytest
 if __name__ == "__main__":
     pytest.main(['-v', __file__])
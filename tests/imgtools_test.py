@@ -7,7 +7,7 @@ from PIL import Image
 
 # Add the parent directory to the path so we can import modules from wit_pytools
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from wit_pytools.imgtools import jpg_compress, png2jpg, img_getexif, png_compress, avif_compress, save_img
+from wit_pytools.imgtools import jpg_compress, png2jpg, img_getexif, png_compress, avif_compress, save_img, ImgMetaCache, img_thumbnail, img_resize_batch
 
 def create_test_image(path, size=(100, 100), color=(255, 0, 0)):
     """Create a test image for testing"""
@@ -157,6 +157,87 @@ def test_save_img_choose_format():
     finally:
         shutil.rmtree(temp_dir)
 
+def test_imgmetacache_hits_after_rename(tmp_path):
+    test_img = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imgtools", "testimage.jpg")
+    image = tmp_path / "testimage.jpg"
+    shutil.copy2(test_img, image)
+    cache = ImgMetaCache()
+    meta = cache.getmeta(str(image))
+    assert abs(meta['gps'][0] - 51.0) < 1.0
+    assert meta['datetime_original'] == '2024:05:12 16:05:39'
+    assert meta['width'] > 0 and meta['height'] > 0
+    # Renaming keeps inode, size and mtime, so the entry is still valid
+    renamed = tmp_path / "testimage_nogps.jpg"
+    os.rename(image, renamed)
+    assert cache.getmeta(str(renamed)) == meta
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+    cache.close()
+
+def test_imgmetacache_persists_and_detects_changes(tmp_path):
+    image = tmp_path / "test.jpg"
+    create_test_image(str(image))
+    dbpath = str(tmp_path / "cache" / "imgmeta.sqlite")
+    cache = ImgMetaCache(dbpath)
+    assert cache.getmeta(str(image))['gps'] is None
+    cache.close()
+    cache = ImgMetaCache(dbpath)
+    cache.getmeta(str(image))
+    assert cache.stats()['hits'] == 1
+    # A modified file must be read again
+    create_test_image(str(image), size=(50, 40))
+    os.utime(image, ns=(0, 10**9))
+    assert cache.getmeta(str(image))['width'] == 50
+    assert cache.stats()['misses'] == 1
+    cache.close()
+
+def test_img_thumbnail_draft_and_up_to_date(tmp_path):
+    source = str(tmp_path / 'large.jpg')
+    create_test_image(source, size=(1600, 1200))
+    target = str(tmp_path / 'thumbs' / 'large.jpg')
+    out_path, written = img_thumbnail(source, target, size=(200, 200))
+    assert written and out_path == target
+    with Image.open(target) as thumb:
+        assert max(thumb.size) == 200
+    # Target is newer than the source, so it is skipped
+    assert img_thumbnail(source, target, size=(200, 200)) == (target, False)
+    assert not [f for f in os.listdir(tmp_path / 'thumbs') if f.startswith('.tmp_')]
+    # Created with the default file mode, not the 0600 of the temporary file
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(target).st_mode & 0o777 == 0o666 & ~umask
+    # Other settings recreate the thumbnail
+    assert img_thumbnail(source, target, size=(100, 100)) == (target, True)
+    with Image.open(target) as thumb:
+        assert max(thumb.size) == 100
+    assert img_thumbnail(source, target, size=(100, 100), quality=60) == (target, True)
+    assert img_thumbnail(source, target, size=(100, 100), quality=60) == (target, False)
+    png_target = str(tmp_path / 'thumbs' / 'large.png')
+    assert img_thumbnail(source, png_target, size=(100, 100)) == (png_target, True)
+    assert img_thumbnail(source, png_target, size=(100, 100), quality=60) == (png_target, False)
+    assert img_thumbnail(source, png_target, size=(120, 120)) == (png_target, True)
+
+def test_img_resize_batch(tmp_path):
+    sources = []
+    for i in range(3):
+        sources.append(str(tmp_path / f'img{i}.jpg'))
+        create_test_image(sources[-1], size=(400, 300))
+    outdir = str(tmp_path / 'previews')
+    results = img_resize_batch(sources + [str(tmp_path / 'missing.jpg')], outdir, size=(100, 100), workers=2)
+    assert [status for _, status in results[:3]] == ['created'] * 3
+    assert results[3][1].startswith('error')
+    results = img_resize_batch(sources, outdir, size=(100, 100), workers=2)
+    assert [status for _, status in results] == ['skipped'] * 3
+    # Another size or quality recreates the thumbnails
+    results = img_resize_batch(sources, outdir, size=(300, 300), workers=2)
+    assert [status for _, status in results] == ['created'] * 3
+    with Image.open(results[0][0]) as thumb:
+        assert thumb.size == (300, 225)
+    results = img_resize_batch(sources, outdir, size=(300, 300), quality=60, workers=1)
+    assert [status for _, status in results] == ['created'] * 3
+    assert [status for _, status in img_resize_batch(sources, outdir, size=(300, 300), quality=60)] == ['skipped'] * 3
+
 # Run the tests using pytest
 if __name__ == "__main__":
     pytest.main(['-v', __file__])
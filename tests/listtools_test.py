@@ -0,0 +1,113 @@
+import os, pytest
+import sys
+from decimal import Decimal
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wit_pytools.listtools import (read_csv_to_list, read_csv_iter, read_csv_chunks, write_csv_rows,
+                                   format_finance_rows, iter_finance_rows, format_finance_columns,
+                                   format_finance_csv)
+
+PRESET = {
+    "field_map": {"date": 0, "Text": 1, "amount": 2},
+    "date_format": "%d.%m.%Y",
+    "decimal_separator": ",",
+    "thousands_separator": ".",
+    "currency": "EUR",
+}
+
+def _bank_csv(tmp_path, rows=5):
+    lines = ["Datum;Text;Betrag"]
+    lines += [f"{i % 28 + 1:02d}.05.2021; Buchung {i} ;-1.234,{i % 100:02d}" for i in range(rows)]
+    (tmp_path / "bank.csv").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(tmp_path), "bank.csv"
+
+def test_read_csv_iter_matches_list(tmp_path):
+    sourcedir, filename = _bank_csv(tmp_path)
+    settings = {"delimiter": ";"}
+    rows = read_csv_iter(sourcedir, filename, settings)
+    assert not isinstance(rows, list)
+    assert next(rows) == ["01.05.2021", "Buchung 0", "-1.234,00"]
+    assert [["01.05.2021", "Buchung 0", "-1.234,00"]] + list(rows) == read_csv_to_list(sourcedir, filename, settings)
+    with pytest.raises(FileNotFoundError):
+        read_csv_iter(sourcedir, "missing.csv")
+
+def test_read_csv_chunks(tmp_path):
+    sourcedir, filename = _bank_csv(tmp_path, rows=7)
+    chunks = list(read_csv_chunks(sourcedir, filename, {"delimiter": ";"}, size=3))
+    assert [len(c) for c in chunks] == [3, 3, 1]
+    assert sum(chunks, []) == read_csv_to_list(sourcedir, filename, {"delimiter": ";"})
+
+def test_finance_pipeline(tmp_path):
+    sourcedir, filename = _bank_csv(tmp_path)
+    formatted = iter_finance_rows(read_csv_iter(sourcedir, filename, {"delimiter": ";"}), PRESET)
+    assert write_csv_rows(str(tmp_path), "out.csv", formatted, {"delimiter": ";"}) == 5
+    out = read_csv_to_list(str(tmp_path), "out.csv", {"delimiter": ";", "skip_header": False})
+    assert out[0] == ["date", "Text", "amount", "currency"]
+    assert out[1] == ["01.05.2021", "Buchung 0", "-1234.00", "EUR"]
+    # The list API accepts any iterable and gives the same rows
+    rows = format_finance_rows(iter(read_csv_to_list(sourcedir, filename, {"delimiter": ";"})), PRESET)
+    assert rows[1] == {"date": "02.05.2021", "Text": "Buchung 1", "amount": Decimal("-1234.01"), "currency": "EUR"}
+
+def test_finance_columns_match_rows(tmp_path):
+    sourcedir, filename = _bank_csv(tmp_path, rows=60)
+    rows = read_csv_to_list(sourcedir, filename, {"delimiter": ";"})
+    rows += [["31.02.2021", "invalid", "n/a"], ["", "short"], [" 01.06.2021 ", None, " 1.000.000 "]]
+    expected = format_finance_rows(rows, PRESET)
+    columns = format_finance_columns(rows, PRESET)
+    assert list(columns) == ["date", "Text", "amount", "currency"]
+    assert [dict(zip(columns, values)) for values in zip(*columns.values())] == expected
+    # Dict rows with name mapping and non-string values take the per-value path
+    preset = {"field_map": {"booking_date": "d", "amount": "a"}, "date_format": "%Y-%m-%d", "decimal_separator": "."}
+    dict_rows = [{"d": "2021-05-01", "a": 1}, {"d": "2021-13-01", "a": True}, {"a": "2.50"}, {"d": "2021-05-01", "a": 1.0}]
+    columns = format_finance_columns(dict_rows, preset)
+    assert [dict(zip(columns, values)) for values in zip(*columns.values())] == format_finance_rows(dict_rows, preset)
+    assert columns["amount"] == [Decimal("1"), None, Decimal("2.50"), Decimal("1.0")]
+
+def test_finance_columns_without_field_map():
+    preset = {"amount_field": "Betrag", "decimal_separator": ",", "currency": "EUR"}
+    rows = [{"Betrag": "1,50", "Text": "a"}, {"Betrag": "2,00", "Extra": 1}]
+    columns = format_finance_columns(rows, preset)
+    assert columns == {"Betrag": [Decimal("1.50"), Decimal("2.00")], "Text": ["a", None],
+                       "currency": ["EUR", "EUR"], "Extra": [None, 1]}
+    with pytest.raises(ValueError):
+        format_finance_columns(rows, preset, output="arrow")
+
+def test_finance_columns_numpy():
+    np = pytest.importorskip("numpy")
+    rows = [["01.05.2021", "a", "1.234,50"], ["02.05.2021", "b", "kaputt"]]
+    arrays = format_finance_columns(rows, PRESET, output="numpy")
+    assert arrays["amount"].dtype == np.float64
+    assert arrays["amount"][0] == 1234.5 and np.isnan(arrays["amount"][1])
+    assert arrays["date"].dtype == object and list(arrays["Text"]) == ["a", "b"]
+
+def test_format_finance_csv_quoted_newlines(tmp_path):
+    lines = ['Datum;"Buchungs\ntext";Betrag']
+    for i in range(200):
+        text = f'"Zeile {i}\nmit ""Zitat""; und\r\nUmbruch"' if i % 3 == 0 else f"Buchung {i}"
+        lines.append(f"{i % 28 + 1:02d}.05.2021;{text};{i},{i % 100:02d}")
+    (tmp_path / "bank.csv").write_text("\r\n".join(lines), encoding="utf-8", newline="")
+    settings = {"delimiter": ";"}
+    expected = list(iter_finance_rows(read_csv_iter(str(tmp_path), "bank.csv", settings), PRESET))
+    assert expected[0]["Text"] == 'Zeile 0\nmit "Zitat"; und\r\nUmbruch' and len(expected) == 200
+    for workers in (1, 2):
+        rows = format_finance_csv(str(tmp_path), "bank.csv", PRESET, settings, workers=workers, chunk_bytes=97)
+        assert list(rows) == expected
+    assert list(format_finance_csv(str(tmp_path), "bank.csv", PRESET, settings)) == expected
+    with pytest.raises(FileNotFoundError):
+        format_finance_csv(str(tmp_path), "missing.csv", PRESET)
+
+def test_format_finance_csv_stray_quote(tmp_path):
+    # A quote inside an unquoted field is literal and must not shift the row boundaries
+    lines = ["Datum;Text;Betrag", '01.05.2021;27" Monitor;1,00']
+    for i in range(300):
+        text = f'"Zeile {i}\nUmbruch"' if i % 7 == 0 else f'Buchung "{i}'
+        lines.append(f"{i % 28 + 1:02d}.05.2021;{text};{i},00")
+    (tmp_path / "bank.csv").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    settings = {"delimiter": ";"}
+    expected = list(iter_finance_rows(read_csv_iter(str(tmp_path), "bank.csv", settings), PRESET))
+    assert len(expected) == 301 and expected[0]["Text"] == '27" Monitor'
+    rows = format_finance_csv(str(tmp_path), "bank.csv", PRESET, settings, workers=1, chunk_bytes=200)
+    assert list(rows) == expected
+
+# Run the tests using pytest
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
@@ -0,0 +1,126 @@
+"""Synthetic MSG, EML and mbox files for the mailtools and cinderellasort tests and benchmarks."""
+import base64
+import math
+import os
+import struct
+from datetime import datetime, timezone
+
+
+def write_cfb(path, streams):
+    """Write a minimal OLE compound file (v3) holding ``{'storage/stream': bytes}``."""
+    ENDOFCHAIN, FREESECT, FATSECT, NOSTREAM = 0xFFFFFFFE, 0xFFFFFFFF, 0xFFFFFFFD, 0xFFFFFFFF
+    root = {'name': 'Root Entry', 'type': 5, 'children': {}, 'data': b''}
+    for full, data in streams.items():
+        node = root
+        parts = full.split('/')
+        for part in parts[:-1]:
+            node = node['children'].setdefault(part, {'name': part, 'type': 1, 'children': {}, 'data': b''})
+        node['children'][parts[-1]] = {'name': parts[-1], 'type': 2, 'children': {}, 'data': data}
+    entries = []
+    def flatten(node):
+        node['id'] = len(entries)
+        entries.append(node)
+        for child in node['children'].values():
+            flatten(child)
+    flatten(root)
+    # Streams below the cutoff live in the mini stream, the rest in regular sectors
+    ministream, minifat, large = bytearray(), [], []
+    for e in entries:
+        if e['type'] != 2:
+            continue
+        if len(e['data']) >= 4096:
+            large.append(e)
+            continue
+        count = math.ceil(len(e['data']) / 64)
+        e['start'] = len(minifat) if count else ENDOFCHAIN
+        minifat.extend(list(range(len(minifat) + 1, len(minifat) + count)) + [ENDOFCHAIN] * bool(count))
+        ministream += e['data'] + b'\0' * (count * 64 - len(e['data']))
+    n_dir = math.ceil(len(entries) / 4)
+    n_minifat = math.ceil(len(minifat) / 128)
+    n_mini = math.ceil(len(ministream) / 512)
+    n_large = [math.ceil(len(e['data']) / 512) for e in large]
+    n_fat = 1
+    while n_fat * 128 < n_dir + n_minifat + n_mini + sum(n_large) + n_fat:
+        n_fat += 1
+    fat = [FATSECT] * n_fat
+    def chain(count):
+        if not count:
+            return ENDOFCHAIN
+        start = len(fat)
+        fat.extend(list(range(start + 1, start + count)) + [ENDOFCHAIN])
+        return start
+    dir_start, minifat_start, mini_start = chain(n_dir), chain(n_minifat), chain(n_mini)
+    for e, count in zip(large, n_large):
+        e['start'] = chain(count)
+    fat += [FREESECT] * (n_fat * 128 - len(fat))
+    root['start'], root['size'] = mini_start, len(ministream)
+    # Siblings are linked as a right-leaning chain, which readers accept as a valid tree
+    directory = bytearray()
+    for e in entries:
+        kids = list(e['children'].values())
+        for a, b in zip(kids, kids[1:]):
+            a['right'] = b['id']
+        name = e['name'].encode('utf-16-le') + b'\0\0'
+        directory += struct.pack('<64sHBBIII16sIQQIQ', name, len(name), e['type'], 1, NOSTREAM,
+                                 e.get('right', NOSTREAM), kids[0]['id'] if kids else NOSTREAM, b'\0' * 16, 0, 0, 0,
+                                 e.get('start', 0), e.get('size', len(e['data'])))
+    header = struct.pack('<8s16sHHHHH6sIIIIIIIII', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', b'\0' * 16, 0x3E, 3, 0xFFFE,
+                         9, 6, b'\0' * 6, 0, n_fat, dir_start, 0, 4096, minifat_start, n_minifat, ENDOFCHAIN, 0)
+    header += struct.pack('<109I', *(list(range(n_fat)) + [FREESECT] * (109 - n_fat)))
+    minifat_bytes = struct.pack(f'<{len(minifat)}I', *minifat)
+    with open(path, 'wb') as f:
+        f.write(header + struct.pack(f'<{len(fat)}I', *fat))
+        f.write(directory + b'\0' * (n_dir * 512 - len(directory)))
+        f.write(minifat_bytes + b'\xff' * (n_minifat * 512 - len(minifat_bytes)))
+        f.write(bytes(ministream) + b'\0' * (n_mini * 512 - len(ministream)))
+        for e, count in zip(large, n_large):
+            f.write(e['data'] + b'\0' * (count * 512 - len(e['data'])))
+
+
+def write_msg(path, subject, sender, body='', sent=datetime(2021, 5, 25, 10, 30, tzinfo=timezone.utc),
+               attachment=None, unicode=True, message_id=None, attachment_name=None):
+    """Write an MSG file with the properties parse_msg reads and an optional attachment."""
+    ticks = int((sent - datetime(1601, 1, 1, tzinfo=timezone.utc)).total_seconds() * 10**7)
+    props = b'\0' * 32 + struct.pack('<IIQ', 0x00390040, 6, ticks) + struct.pack('<IIQ', 0x3FFD0003, 6, 1252)
+    ptype, encoding = ('001F', 'utf-16-le') if unicode else ('001E', 'cp1252')
+    string = lambda prop, text: {f'__substg1.0_{prop}{ptype}': text.encode(encoding)}
+    streams = {'__properties_version1.0': props,
+               '__nameid_version1.0/__substg1.0_00020102': b'',
+               '__nameid_version1.0/__substg1.0_00030102': b'',
+               '__nameid_version1.0/__substg1.0_00040102': b''}
+    streams.update(string('001A', 'IPM.Note'))
+    streams.update(string('0037', subject))
+    streams.update(string('0C1A', sender.split('@')[0]))
+    streams.update(string('5D01', sender))
+    if body:
+        streams.update(string('1000', body))
+    if message_id:
+        streams.update(string('1035', message_id))
+    if attachment is not None:
+        streams['__attach_version1.0_#00000000/__properties_version1.0'] = b'\0' * 8
+        streams['__attach_version1.0_#00000000/__substg1.0_37010102'] = attachment
+        if attachment_name:
+            streams[f'__attach_version1.0_#00000000/__substg1.0_3707{ptype}'] = attachment_name.encode(encoding)
+    write_cfb(path, streams)
+    return path
+
+
+def write_eml(path, headers, attachment_size=0):
+    """Write a multipart EML file with the given header lines and an optional base64 attachment."""
+    parts = [*headers, 'MIME-Version: 1.0', 'Content-Type: multipart/mixed; boundary="XX"', '',
+             '--XX', 'Content-Type: text/plain; charset=utf-8', '', 'Hallo', '']
+    if attachment_size:
+        data = base64.encodebytes(os.urandom(attachment_size)).decode()
+        parts += ['--XX', 'Content-Type: application/octet-stream', 'Content-Transfer-Encoding: base64',
+                  'Content-Disposition: attachment; filename="plan.bin"', '', data]
+    parts += ['--XX--', '']
+    path.write_bytes('\r\n'.join(parts).encode())
+    return path
+
+
+MBOX = (b'From alice@example.com Tue May 25 10:30:00 2021\n'
+        b'From: Alice <alice@example.com>\nSubject: Erste\nDate: Tue, 25 May 2021 10:30:00 +0000\n\n'
+        b'Hallo\n>From the archive\n>>From quoted\n\n'
+        b'From bob@example.org Wed May 26 10:30:00 2021\n'
+        b'From: bob@example.org\nSubject: =?utf-8?q?Zweite_Gr=C3=BC=C3=9Fe?=\nDate: Wed, 26 May 2021 10:30:00 +0000\n\n'
+        b'Body\n')
@@ -1,7 +1,10 @@
 import os, pytest
 import sys
+from datetime import datetime, timezone
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from mailtools import parse_msg
+import mailtools
+from wit_pytools.tests.mailfixtures import MBOX, write_eml, write_msg
+from mailtools import MailBowlIndex, MailDedupIndex, extract_attachments, extract_attachments_many, iter_mailbox, mail_dedup_key, parse_eml, parse_mail, parse_many, parse_msg, parse_msg_headers
 
 # requirements
 # pip install pytest
@@ -39,6 +42,213 @@ def test_parse_msg_invalid():
     assert len(result) == 0
     print("Test parse_msg_invalid: PASSED")
 
+def test_parse_msg_headers(tmp_path):
+    path = write_msg(tmp_path / 'mail.msg', 'Hyparschale', 'F.Germo@haupt-ig.de',
+                      body='Hallo\r\n' * 2000, attachment=os.urandom(200_000))
+    assert parse_msg_headers(path) == ['2021-05-25', 'F.Germo@haupt-ig.de', 'Hyparschale']
+    assert parse_msg(str(path), True) == ['2021-05-25', 'F.Germo@haupt-ig.de', 'Hyparschale']
+
+def test_parse_msg_headers_string8(tmp_path):
+    path = write_msg(tmp_path / 'mail.msg', 'Grüße', 'a@example.com', unicode=False)
+    assert parse_msg_headers(path) == ['2021-05-25', 'a@example.com', 'Grüße']
+
+def test_parse_msg_headers_matches_full(tmp_path):
+    if mailtools.extract_msg is None:
+        pytest.skip("extract-msg not installed")
+    path = str(write_msg(tmp_path / 'mail.msg', 'Angebot', 'info@example.com', body='Guten Tag'))
+    assert parse_msg(path, True, headers_only=False) == parse_msg(path, True)
+
+def test_parse_msg_headers_forward(tmp_path):
+    body = 'Siehe unten\r\n\r\nVon: Jane Doe <jane@kunde.de>\r\nBetreff: Anfrage\r\n'
+    path = write_msg(tmp_path / 'fwd.msg', 'WG: Anfrage', 'me@firma.de', body=body)
+    assert parse_msg_headers(path)[1] == 'jane@kunde.de'
+    # Same domain is a reply chain, not a forward
+    path = write_msg(tmp_path / 'aw.msg', 'WG: Anfrage', 'me@kunde.de', body=body)
+    assert parse_msg_headers(path)[1] == 'me@kunde.de'
+    # Forward without a plain-text body has to be parsed in full
+    path = write_msg(tmp_path / 'html.msg', 'Fwd: Anfrage', 'me@firma.de')
+    assert parse_msg_headers(path) is None
+
+def test_parse_eml_headers(tmp_path):
+    path = write_eml(tmp_path / 'mail.eml', ['From: =?utf-8?q?J=C3=BCrgen_M=C3=BCller?= <Juergen.Mueller@Example.COM>',
+                                              'Subject: =?utf-8?q?Gr=C3=BC=C3=9Fe?= aus', ' Berlin',
+                                              'Date: Tue, 25 May 2021 10:30:00 +0200'], attachment_size=100_000)
+    date, sender, subject = parse_eml(path)
+    assert date.isoformat() == '2021-05-25T10:30:00+02:00'
+    assert sender == 'juergen.mueller@example.com'
+    assert subject == 'Grüße aus Berlin'
+    if mailtools.eml_parser is not None:
+        assert parse_eml(path, headers_only=False) == [date, sender, subject]
+
+def test_parse_eml_headers_missing_date(tmp_path):
+    path = write_eml(tmp_path / 'mail.eml', ['From: bob@example.com', 'Date: not a date'])
+    assert parse_eml(path) == [datetime(1970, 1, 1, tzinfo=timezone.utc), 'bob@example.com', '']
+
+def test_parse_many_keeps_input_order(tmp_path, monkeypatch):
+    paths = []
+    for i in range(12):
+        if i % 2:
+            paths.append(write_msg(tmp_path / f'{i}.msg', f'Betreff {i}', f'user{i}@example.com'))
+        else:
+            paths.append(write_eml(tmp_path / f'{i}.eml', [f'From: User <user{i}@example.com>', f'Subject: Betreff {i}',
+                                                             'Date: Tue, 25 May 2021 10:30:00 +0000']))
+    paths.append(tmp_path / 'missing.msg')
+    expected = [parse_mail(path) for path in paths]
+    assert expected[3] == ['2021-05-25', 'user3@example.com', 'Betreff 3']
+    assert expected[4] == ['2021-05-25', 'user4@example.com', 'Betreff 4']
+    assert expected[-1] == []
+    # Force the process pool for the small batch
+    monkeypatch.setattr(mailtools, 'PARSE_MANY_MIN_BATCH', 0)
+    assert parse_many(paths, workers=2) == expected
+
+def test_iter_mailbox_mbox(tmp_path):
+    path = tmp_path / 'export.mbox'
+    path.write_bytes(MBOX)
+    messages = list(iter_mailbox(str(path)))
+    assert [info for info, _ in messages] == [['2021-05-25', 'alice@example.com', 'Erste'],
+                                              ['2021-05-26', 'bob@example.org', 'Zweite Grüße']]
+    first = messages[0][1](str(tmp_path / 'first.eml'))
+    with open(first, 'rb') as f:
+        assert f.read() == (b'From: Alice <alice@example.com>\nSubject: Erste\nDate: Tue, 25 May 2021 10:30:00 +0000\n\n'
+                            b'Hallo\nFrom the archive\n>From quoted\n')
+    messages[1][1](str(tmp_path / 'second.eml'))
+    assert (tmp_path / 'second.eml').read_bytes().endswith(b'\n\nBody\n')
+
+def test_iter_mailbox_maildir(tmp_path):
+    for sub in ('cur', 'new', 'tmp'):
+        (tmp_path / sub).mkdir()
+    (tmp_path / 'new' / '1.host').write_bytes(b'From: a@example.com\nSubject: Neu\nDate: Tue, 25 May 2021 10:30:00 +0000\n\nx\n')
+    (tmp_path / 'cur' / '2.host:2,S').write_bytes(b'From: b@example.com\nSubject: Alt\n\ny\n')
+    messages = list(iter_mailbox(str(tmp_path)))
+    assert [info for info, _ in messages] == [['2021-05-25', 'a@example.com', 'Neu'], ['', 'b@example.com', 'Alt']]
+    messages[1][1](str(tmp_path / 'out.eml'))
+    assert (tmp_path / 'out.eml').read_bytes().endswith(b'\n\ny\n')
+
+def test_mail_dedup_key(tmp_path):
+    headers = ['From: a@example.com', 'Subject: Angebot', 'Date: Tue, 25 May 2021 10:30:00 +0000']
+    with_id = write_eml(tmp_path / 'id.eml', headers + ['Message-ID: <abc@example.com>'])
+    msg = write_msg(tmp_path / 'id.msg', 'Angebot', 'a@example.com', message_id='<abc@example.com>')
+    assert mail_dedup_key(with_id) == mail_dedup_key(msg) == 'mid:abc@example.com'
+    # Without Message-ID the key hashes headers and body, line endings do not matter
+    crlf = write_eml(tmp_path / 'crlf.eml', headers)
+    lf = tmp_path / 'lf.eml'
+    lf.write_bytes(crlf.read_bytes().replace(b'\r\n', b'\n'))
+    assert mail_dedup_key(crlf) == mail_dedup_key(lf)
+    assert mail_dedup_key(crlf).startswith('sha256:')
+    other = write_eml(tmp_path / 'other.eml', headers, attachment_size=10)
+    assert mail_dedup_key(other) != mail_dedup_key(crlf)
+    assert mail_dedup_key(write_msg(tmp_path / 'a.msg', 'x', 'a@example.com', body='eins')) != \
+        mail_dedup_key(write_msg(tmp_path / 'b.msg', 'x', 'a@example.com', body='zwei'))
+
+def test_mail_dedup_index(tmp_path):
+    sorted_mail = tmp_path / 'sorted.eml'
+    sorted_mail.write_bytes(b'x')
+    index = MailDedupIndex(str(tmp_path / 'index' / 'mails.sqlite'))
+    index.add('mid:abc', sorted_mail)
+    assert index.duplicate_of('mid:abc', tmp_path / 'copy.eml') == str(sorted_mail)
+    assert index.duplicate_of('mid:abc', sorted_mail) is None
+    assert index.duplicate_of('mid:other') is None
+    index.close()
+    # Persistent across instances, entries of deleted files are dropped
+    index = MailDedupIndex(str(tmp_path / 'index' / 'mails.sqlite'))
+    assert index.lookup('mid:abc') == str(sorted_mail)
+    sorted_mail.unlink()
+    assert index.duplicate_of('mid:abc') is None
+    assert len(index) == 0
+    index.close()
+
+def test_mail_dedup_index_shared(tmp_path):
+    from mailtools import mail_dedup_index
+
+    first = mail_dedup_index(str(tmp_path / 'a.sqlite'))
+    assert mail_dedup_index() is first
+    assert mail_dedup_index(str(tmp_path / 'a.sqlite')) is first
+    # Another path closes the open index and switches to the new file
+    second = mail_dedup_index(str(tmp_path / 'b.sqlite'))
+    assert second is not first and second.dbpath == str(tmp_path / 'b.sqlite')
+    assert mail_dedup_index() is second
+
+def test_mail_bowl_index():
+    index = MailBowlIndex([('Urgent', 'DRINGEND'), ('Kunde', '@kunde.de, kunden-portal.com'), ('Gruppe', 'gruppe.de'),
+                           ('Rest', '!DEFAULT'), ('Kaputt', '!MALFORMED'), ('Later', '@kunde.de')])
+    assert index.match('2021-05-25_info@kunde.de_x_Angebot.msg') == 'Kunde'
+    # '@domain' matches the sender domain exactly, bare domains are substrings of the file name
+    assert index.match('x.msg', sender='info@mail.kunde.de') == ''
+    assert index.match('x.msg', sender='Info@Kunde.de') == 'Kunde'
+    assert index.match('x.msg', sender='a@b.gruppe.de') == ''
+    assert index.match('2021_a@b.gruppe.de_x_Angebot.msg') == 'Gruppe'
+    assert index.match('2021_a@other.de_x_Anfrage kunden-portal.com.msg') == 'Kunde'
+    # Earlier bowls win, whether their criteria are substrings or domains
+    assert index.match('2021_info@kunde.de_x_DRINGEND.msg', sender='info@kunde.de') == 'Urgent'
+    assert index.match('2021_a@gruppe.de_x_Angebot.msg') == 'Gruppe'
+    assert (index.default, index.malformed) == ('Rest', 'Kaputt')
+
+def test_extract_attachments_eml(tmp_path):
+    import base64
+    pdf = os.urandom(5000)
+    path = tmp_path / 'mail.eml'
+    path.write_bytes(b'\r\n'.join([
+        b'From: Info <info@kunde.de>', b'Subject: Rechnung', b'Date: Tue, 25 May 2021 10:30:00 +0000',
+        b'Content-Type: multipart/mixed; boundary="outer"', b'',
+        b'--outer', b'Content-Type: multipart/alternative; boundary="inner"', b'',
+        b'--inner', b'Content-Type: text/plain', b'', b'Hallo', b'--inner--', b'',
+        b'--outer', b'Content-Type: application/pdf; name="Rechnung 1.pdf"', b'Content-Transfer-Encoding: base64',
+        b'Content-Disposition: attachment; filename="Rechnung 1.pdf"', b'', base64.encodebytes(pdf).replace(b'\n', b'\r\n'),
+        b'--outer', b'Content-Type: text/plain; name="notiz.txt"', b'Content-Transfer-Encoding: quoted-printable', b'',
+        b'Gr=C3=BC=C3=9Fe, sehr lange Zeile =', b'fortgesetzt', b'zweite Zeile', b'--outer--', b'']))
+    outputs = extract_attachments(str(path), str(tmp_path / 'out'))
+    assert [os.path.basename(p) for p in outputs] == ['2021-05-25_info@kunde.de_Rechnung 1.pdf',
+                                                      '2021-05-25_info@kunde.de_notiz.txt']
+    with open(outputs[0], 'rb') as f:
+        assert f.read() == pdf
+    with open(outputs[1], 'rb') as f:
+        assert f.read() == 'Grüße, sehr lange Zeile fortgesetzt\r\nzweite Zeile'.encode()
+    # Only the requested types, existing names are enumerated
+    outputs = extract_attachments(str(path), str(tmp_path / 'out'), suffixes=('.pdf',))
+    assert [os.path.basename(p) for p in outputs] == ['2021-05-25_info@kunde.de_Rechnung 1#2.pdf']
+
+def test_extract_attachments_partial_failure(tmp_path, monkeypatch):
+    path = tmp_path / 'mail.eml'
+    path.write_bytes(b'\r\n'.join([
+        b'From: Info <info@kunde.de>', b'Subject: Rechnung', b'Date: Tue, 25 May 2021 10:30:00 +0000',
+        b'Content-Type: multipart/mixed; boundary="XX"', b'',
+        b'--XX', b'Content-Transfer-Encoding: base64', b'Content-Disposition: attachment; filename="kaputt.pdf"', b'',
+        b'QUJD', b'Q',
+        b'--XX', b'Content-Disposition: attachment; filename="notiz.txt"', b'', b'Hallo',
+        b'--XX--', b'']))
+    results = list(extract_attachments_many([path], str(tmp_path / 'out'), workers=1))
+    assert [os.path.basename(p) for p in results[0][1]] == ['2021-05-25_info@kunde.de_notiz.txt']
+    assert os.listdir(tmp_path / 'out') == ['2021-05-25_info@kunde.de_notiz.txt']
+    # Mail data parsed up front is used as is
+    monkeypatch.setattr(mailtools, 'parse_mail', lambda file: pytest.fail('parsed again'))
+    results = list(extract_attachments_many([path], str(tmp_path / 'pre'), workers=1,
+                                            mailinfos={str(path): ['2020-01-01', 'a@b.de', 'x']}))
+    assert [os.path.basename(p) for p in results[0][1]] == ['2020-01-01_a@b.de_notiz.txt']
+
+def test_extract_attachments_msg(tmp_path):
+    data = os.urandom(300_000)
+    paths = [write_msg(tmp_path / f'{i}.msg', 'Fotos', f'user{i}@example.com', attachment=data,
+                        attachment_name='IMG_0001.jpg') for i in range(3)]
+    write_msg(tmp_path / 'none.msg', 'Ohne', 'x@example.com')
+    results = list(extract_attachments_many(paths + [tmp_path / 'none.msg'], str(tmp_path / 'out'), workers=2))
+    assert [os.path.basename(r[0]) for r in results] == ['0.msg', '1.msg', '2.msg', 'none.msg']
+    assert results[3][1] == []
+    for i, (_, outputs) in enumerate(results[:3]):
+        assert [os.path.basename(p) for p in outputs] == [f'2021-05-25_user{i}@example.com_IMG_0001.jpg']
+        with open(outputs[0], 'rb') as f:
+            assert f.read() == data
+
+def test_extract_attachments_msg_openstream_fallback(tmp_path, monkeypatch):
+    data = os.urandom(300_000)
+    path = write_msg(tmp_path / 'a.msg', 'Fotos', 'a@example.com', attachment=data, attachment_name='IMG_0001.jpg')
+    def unresolvable(ole, name):
+        raise AttributeError("'OleFileIO' object has no attribute 'fat'")
+    monkeypatch.setattr(mailtools, '_ole_sector_runs', unresolvable)
+    outputs = extract_attachments(path, str(tmp_path / 'out'))
+    assert [os.path.basename(p) for p in outputs] == ['2021-05-25_a@example.com_IMG_0001.jpg']
+    with open(outputs[0], 'rb') as f:
+        assert f.read() == data
+
 # Run the tests using pytest
 if __name__ == "__main__":
     pytest.main(['-v', __file__])
@@ -0,0 +1,57 @@
+"""Synthetic PDF files for the documenttools tests and benchmarks."""
+import zlib
+
+
+def _pdf_string(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path, texts, fanout=8):
+    """
+    Write a PDF with one page per text (lines in Helvetica) and a nested page tree.
+
+    Resources and MediaBox are only set on the root of the page tree, so the pages inherit
+    them. Each page tree node holds at most fanout kids.
+    """
+    objects = [None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+
+    def reserve():
+        objects.append(None)
+        return len(objects)
+
+    def page(text, parent):
+        lines = text.split("\n")
+        stream = "".join(f"BT /F1 11 Tf 50 {800 - 14 * i} Td ({_pdf_string(line)}) Tj ET\n" for i, line in enumerate(lines))
+        data = zlib.compress(stream.encode("latin-1"))
+        content = reserve()
+        objects[content - 1] = b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(data), data)
+        objid = reserve()
+        objects[objid - 1] = b"<< /Type /Page /Parent %d 0 R /Contents %d 0 R >>" % (parent, content)
+        return objid
+
+    def node(items, parent):
+        objid = reserve()
+        if len(items) <= fanout:
+            kids = [page(text, objid) for text in items]
+        else:
+            size = -(-len(items) // fanout)
+            kids = [node(items[i:i + size], objid) for i in range(0, len(items), size)]
+        extra = b" /Parent %d 0 R" % parent if parent else (
+            b" /Resources << /Font << /F1 2 0 R >> >> /MediaBox [0 0 595 842]")
+        refs = b" ".join(b"%d 0 R" % kid for kid in kids)
+        objects[objid - 1] = b"<< /Type /Pages /Kids [%s] /Count %d%s >>" % (refs, len(items), extra)
+        return objid
+
+    root = node(list(texts), None)
+    objects[0] = b"<< /Type /Catalog /Pages %d 0 R >>" % root
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as fp:
+        fp.write(out)
@@ -26,6 +26,55 @@ def test_bowldir_checks_document_content(tmp_path):
     assert result == "/Rechnungen"
 
 
+def test_bowldir_content_keeps_bowl_order(tmp_path):
+    config = ConfigParser()
+    config.optionxform = str
+    config.add_section("BOWLS")
+    # Criterion of the first bowl is only on the last page
+    config.set("BOWLS", "Personal", "Lohnabrechnung, Beschäftigung")
+    config.set("BOWLS", "Rechnungen", "manfred@mustermann.de")
+
+    pdf_path = tmp_path / "testdocument.pdf"
+    shutil.copy(TEST_PDF, pdf_path)
+
+    assert bowldir("testdocument.pdf", config, file_path=pdf_path, check_content=True) == "/Personal"
+
+
+def test_bowldir_checks_document_metadata(tmp_path):
+    config = ConfigParser()
+    config.optionxform = str
+    config.add_section("BOWLS")
+    config.set("BOWLS", "Formulare", "jsPDF")
+    config.set("BOWLS", "Rechnungen", "manfred@mustermann.de")
+
+    pdf_path = tmp_path / "testdocument.pdf"
+    shutil.copy(TEST_PDF, pdf_path)
+
+    assert bowldir("testdocument.pdf", config, file_path=pdf_path, check_metadata=True) == "/Formulare"
+    # Page text is not searched without check_content
+    config.remove_option("BOWLS", "Formulare")
+    assert bowldir("testdocument.pdf", config, file_path=pdf_path, check_metadata=True) == ""
+
+
+def test_bowldir_checks_docx_content(tmp_path):
+    import zipfile
+
+    docx_path = tmp_path / "scan.docx"
+    with zipfile.ZipFile(docx_path, "w") as archive:
+        archive.writestr(
+            "word/document.xml",
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:t>Kontakt: manfred@mustermann.de</w:t></w:r></w:p></w:body></w:document>',
+        )
+    config = ConfigParser()
+    config.optionxform = str
+    config.add_section("BOWLS")
+    config.set("BOWLS", "Rechnungen", "manfred@mustermann.de")
+
+    assert bowldir("scan.docx", config, file_path=docx_path, check_content=True) == "/Rechnungen"
+    assert bowldir("scan.docx", config, file_path=docx_path, check_content=False) == ""
+
+
 def test_cinderellasort_moves_pdf_based_on_content(tmp_path):
     source_dir = tmp_path / "source"
     target_dir = tmp_path / "target"
@@ -66,3 +115,46 @@ def test_cinderellasort_moves_pdf_based_on_content(tmp_path):
 
     expected_path = target_dir / "Rechnungen" / "testdocument.pdf"
     assert expected_path.exists()
+
+
+def test_cinderellasort_indexes_moved_pdfs(tmp_path):
+    from wit_pytools.documenttools import DocumentIndex
+
+    source_dir = tmp_path / "source"
+    target_dir = tmp_path / "target"
+    source_dir.mkdir()
+    target_dir.mkdir()
+    shutil.copy(TEST_PDF, source_dir / "Rechnung 2034.pdf")
+
+    config = ConfigParser()
+    config.optionxform = str
+    config["TABLE"] = {"sourcedir": str(source_dir), "targetdir": str(target_dir), "ftype_sort": ".pdf"}
+    config["SETTINGS"] = {"document_index": str(tmp_path / "index.db")}
+    config["BOWLS"] = {"Rechnungen": "Rechnung"}
+    config_path = tmp_path / "config.ini"
+    with config_path.open("w", encoding="utf-8") as fp:
+        config.write(fp)
+
+    cinderellasort(str(config_path), dryrun=False)
+
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    hits = index.search("manfred")
+    index.close()
+    assert hits and hits[0]["path"] == str(target_dir / "Rechnungen" / "Rechnung 2034.pdf")
+
+
+def test_bowldir_content_unknown_backend_is_logged(tmp_path, monkeypatch):
+    import wit_pytools.cinderellasort as module
+
+    config = ConfigParser()
+    config.optionxform = str
+    config["SETTINGS"] = {"content_backend": "pdftotext"}
+    config["BOWLS"] = {"Rechnungen": "manfred@mustermann.de", "Fallback": "!DEFAULT"}
+
+    pdf_path = tmp_path / "testdocument.pdf"
+    shutil.copy(TEST_PDF, pdf_path)
+    logged = []
+    monkeypatch.setattr(module, "log_message", lambda message, level=None: logged.append((message, level)))
+
+    assert bowldir("testdocument.pdf", config, file_path=pdf_path, check_content=True) == "/Fallback"
+    assert len(logged) == 1 and "pdftotext" in logged[0][0] and logged[0][1] == "WARNING"